@@ -1,13 +1,27 @@
-from nicegui import ui
+import os
+
+from nicegui import ui, app
 
 #各頁面、db管理、跳轉函式的import
 #確保各頁面都被導入
-import login, staff, manage_meal, manager, manage_order, state, order, update_password
-import database
+import login, staff, manage_meal, manager, manage_order, state, order, update_password, report, order_search
+import database, async_db, archiver, metrics, change_feed, export
 from navigate import navigate_to
 
+#資料庫與頁面的效能指標(/metrics)
+metrics.install(app)
+
+#管理者匯出訂單明細(/export/orders)
+export.install(app)
+
 ui.run.title = '點餐系統' #NiceGUI 啟動時的視窗標題(網頁名稱)
 
+#多worker模式(serve.py)會設定WORKER_ID、各自的PORT與共用的STORAGE_SECRET(登入cookie的簽章金鑰)
+#單一程序時使用存在資料庫旁的金鑰，重新啟動或自動重新載入後仍維持登入
+WORKER_MODE = 'WORKER_ID' in os.environ
+PORT = int(os.environ.get('PORT', '8080'))
+STORAGE_SECRET = database.get_storage_secret()
+
 #主頁面(只有兩個大按鈕)
 @ui.page('/')
 def index_page():
@@ -32,5 +46,13 @@ def index_page():
 if __name__ in {"__main__", "__mp_main__"}:
     #確保資料庫已經建立(初始化)
     database.initialize_database()
-    #啟動NiceGUI應用程式，設為深色主題
-    ui.run(title=ui.run.title, dark=True)
\ No newline at end of file
+    #關閉時釋放連線池中的所有連線
+    app.on_shutdown(async_db.shutdown)
+    app.on_shutdown(database.close_pool)
+    #定期封存已完成的舊訂單
+    app.on_startup(archiver.start)
+    #接收其他worker的訂單/菜單/登入變更(只有多worker模式)
+    app.on_startup(change_feed.start)
+    #啟動NiceGUI應用程式，設為深色主題(worker由serve.py管理，不自動重新載入也不開瀏覽器)
+    ui.run(title=ui.run.title, dark=True, port=PORT, storage_secret=STORAGE_SECRET,
+           reload=not WORKER_MODE, show=not WORKER_MODE)
\ No newline at end of file
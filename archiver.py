@@ -0,0 +1,38 @@
+import asyncio
+import os
+
+from nicegui import background_tasks
+
+import async_db
+
+#背景封存：定期把已完成、且下單超過ARCHIVE_AFTER_DAYS天的訂單搬到封存表
+#每次只搬一批(一個短交易)，批次之間暫停一下，讓點餐與廚房的寫入可以插隊
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))    #下單多久後封存已完成的訂單(天)，0或以下為停用
+ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL', '3600'))      #每隔多久檢查一次(秒)
+ARCHIVE_CHUNK_SIZE = int(os.environ.get('ARCHIVE_CHUNK_SIZE', '500'))     #每批搬移的訂單數
+ARCHIVE_CHUNK_PAUSE = float(os.environ.get('ARCHIVE_CHUNK_PAUSE', '0.05'))  #批次之間暫停的秒數
+
+#封存目前所有符合條件的訂單，回傳搬移筆數
+async def archive_once() -> int:
+    total = 0
+    while True:
+        moved = await async_db.archive_completed_orders(ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_SIZE, max_chunks=1)
+        if not moved:
+            break
+        total += moved
+        if moved < ARCHIVE_CHUNK_SIZE:
+            break
+        await asyncio.sleep(ARCHIVE_CHUNK_PAUSE)
+    if total:
+        print(f"已封存 {total} 筆下單超過 {ARCHIVE_AFTER_DAYS:g} 天的已完成訂單")
+    return total
+
+async def _archive_loop():
+    while True:
+        await archive_once()
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+#啟動背景封存(app啟動時呼叫)
+def start():
+    if ARCHIVE_AFTER_DAYS > 0:
+        background_tasks.create(_archive_loop(), name='order-archiver')
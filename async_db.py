@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+import database
+
+#非同步版本的資料庫API
+#sqlite呼叫會阻塞，因此全部丟到有上限的執行緒池執行，NiceGUI的event loop只負責await結果
+#執行緒數量與連線池大小相同，避免執行緒卡在等待連線
+DB_EXECUTOR_WORKERS = int(os.environ.get('DB_EXECUTOR_WORKERS', str(database.POOL_SIZE)))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+#在資料庫執行緒池中執行任意同步函式並回傳awaitable
+async def run_db(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+#把database.py中的同步函式包成async版本
+def _async_version(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+#訂單寫入交給database的group commit寫入佇列，直接await它的future，不佔用資料庫執行緒池
+#(DB_GROUP_COMMIT=0時寫入會在呼叫端執行緒進行，改回丟到執行緒池)
+def _queued_version(queue_func: Callable[..., Future], func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if database.GROUP_COMMIT:
+            return await asyncio.wrap_future(queue_func(*args, **kwargs))
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+#關閉執行緒池(程式結束時呼叫)
+def shutdown():
+    _executor.shutdown(wait=False)
+
+#員工
+login = _async_version(database.login)
+insert_staff = _async_version(database.insert_staff)
+update_password = _async_version(database.update_password)
+delete_staff = _async_version(database.delete_staff)
+get_all_staff = _async_version(database.get_all_staff)
+get_staff_page = _async_version(database.get_staff_page)
+create_session = _async_version(database.create_session)
+get_session = _async_version(database.get_session)
+delete_session = _async_version(database.delete_session)
+
+#餐點
+insert_meal = _async_version(database.insert_meal)
+update_meal = _async_version(database.update_meal)
+delete_meal = _async_version(database.delete_meal)
+get_all_meals = _async_version(database.get_all_meals)
+get_available_meals = _async_version(database.get_available_meals)
+get_menu_categories = _async_version(database.get_menu_categories)
+get_menu_page = _async_version(database.get_menu_page)
+get_meals_page = _async_version(database.get_meals_page)
+
+#訂單
+submit_full_order = _queued_version(database.queue_order, database.submit_full_order)
+submit_orders_bulk = _async_version(database.submit_orders_bulk)
+reprice_cart = _async_version(database.reprice_cart)
+get_all_orders = _async_version(database.get_all_orders)
+get_orders_page = _async_version(database.get_orders_page)
+get_order_details = _async_version(database.get_order_details)
+get_order_details_many = _async_version(database.get_order_details_many)
+get_pending_order_lines = _async_version(database.get_pending_order_lines)
+update_order_status = _queued_version(database.queue_order_status, database.update_order_status)
+update_order_status_many = _queued_version(database.queue_order_status_many, database.update_order_status_many)
+archive_completed_orders = _async_version(database.archive_completed_orders)
+get_order_history = _async_version(database.get_order_history)
+get_history_order = _async_version(database.get_history_order)
+search_orders = _async_version(database.search_orders)
+search_meals = _async_version(database.search_meals)
+
+#銷售報表
+get_sales_report = _async_version(database.get_sales_report)
+rebuild_sales_aggregates = _async_version(database.rebuild_sales_aggregates)
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import database
+import data_generator
+
+#資料庫效能量測
+#在暫存資料庫上建立指定筆數的歷史訂單，量測各個公開函式在不同執行緒數下的吞吐量與延遲
+#結果輸出為JSON，可用--compare與之前的結果比較，超過門檻的退步會被標示出來
+#
+#用法:
+#  python benchmark.py --sizes 1000,100000 --threads 1,4 --output bench.json
+#  python benchmark.py --sizes 1000 --compare bench.json
+
+#依序執行；submit_full_order會新增「準備中」訂單，放在最後才不會影響get_all_orders的結果
+WORKLOADS = [
+    'get_all_orders',
+    'get_order_details',
+    'get_all_meals',
+    'login',
+    'update_order_status',
+    'submit_full_order',
+]
+
+PENDING_ORDERS = 50   #歷史資料中保持「準備中」的訂單數(廚房畫面的實際大小)
+
+#建立某個工作負載的單次操作函式
+def make_operation(name: str, orders: int, rng: random.Random) -> Callable[[], Any]:
+    meals = database.get_all_meals()
+
+    if name == 'submit_full_order':
+        def op():
+            items = []
+            for meal in rng.sample(meals, rng.randint(1, 5)):
+                quantity = rng.randint(1, 3)
+                items.append({'mid': meal['MID'], 'name': meal['Name'], 'quantity': quantity,
+                              'price': meal['Price'], 'total': meal['Price'] * quantity})
+            return database.submit_full_order(items, rng.choice(('DineIn', 'TakeOut')))
+    elif name == 'get_all_orders':
+        op = database.get_all_orders
+    elif name == 'get_order_details':
+        op = lambda: database.get_order_details(rng.randint(1, orders))
+    elif name == 'get_all_meals':
+        op = database.get_all_meals
+    elif name == 'login':
+        op = lambda: database.login(f'staff{rng.randint(1, 20):03d}', 'password')
+    elif name == 'update_order_status':
+        #只更新已完成的歷史訂單，避免改變「準備中」訂單的數量
+        op = lambda: database.update_order_status(rng.randint(1, max(orders - PENDING_ORDERS, 1)), 'Completed')
+    else:
+        raise ValueError(f'未知的工作負載: {name}')
+    return op
+
+#百分位數(最近排名法)
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+#以多個執行緒執行同一個工作負載，回傳統計結果
+def run_workload(name: str, orders: int, threads: int, ops: int, seed: int) -> Dict[str, Any]:
+    per_thread = max(1, ops // threads)
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    errors = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        op = make_operation(name, orders, rng)
+        samples = latencies[index]
+        barrier.wait()
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            try:
+                result = op()
+                if result is None or result is False:
+                    errors[index] += 1
+            except Exception:
+                errors[index] += 1
+            samples.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    wall_start = time.perf_counter()
+    for t in workers:
+        t.join()
+    wall = time.perf_counter() - wall_start
+
+    samples = sorted(s for thread_samples in latencies for s in thread_samples)
+    return {
+        'workload': name,
+        'orders': orders,
+        'threads': threads,
+        'ops': len(samples),
+        'errors': sum(errors),
+        'seconds': wall,
+        'throughput': len(samples) / wall if wall else 0.0,
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': samples[-1] * 1000 if samples else 0.0,
+    }
+
+#量測一種資料量下的所有工作負載
+def run_size(orders: int, thread_counts: List[int], workloads: List[str], ops: int, seed: int) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix='ordering-bench-') as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        database.configure_pool(db_path, max(thread_counts))
+        database.initialize_database()
+        print(f'建立 {orders:,} 筆歷史訂單...', flush=True)
+        seed_start = time.perf_counter()
+        data_generator.generate(db_path, orders, days=365, seed=seed, meals=40, staff=20, pending=PENDING_ORDERS)
+        print(f'  完成 ({time.perf_counter() - seed_start:.1f}s)', flush=True)
+
+        for name in workloads:
+            for threads in thread_counts:
+                result = run_workload(name, orders, threads, ops, seed)
+                results.append(result)
+                print(f"  {name:<22} orders={orders:<10,} threads={threads:<3} "
+                      f"{result['throughput']:>10.1f} ops/s  p50={result['p50_ms']:.3f}ms  "
+                      f"p99={result['p99_ms']:.3f}ms  errors={result['errors']}", flush=True)
+        database.close_pool()
+    return results
+
+#目前的git commit(方便比較不同版本的結果)
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#與之前的結果比較，回傳退步超過門檻的項目
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    previous = {(r['workload'], r['orders'], r['threads']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['workload'], result['orders'], result['threads']))
+        if not old:
+            continue
+        throughput_change = (result['throughput'] - old['throughput']) / old['throughput'] if old['throughput'] else 0.0
+        p99_change = (result['p99_ms'] - old['p99_ms']) / old['p99_ms'] if old['p99_ms'] else 0.0
+        result['baseline_throughput'] = old['throughput']
+        result['baseline_p99_ms'] = old['p99_ms']
+        if throughput_change < -threshold or p99_change > threshold:
+            regressions.append({
+                'workload': result['workload'],
+                'orders': result['orders'],
+                'threads': result['threads'],
+                'throughput_change': throughput_change,
+                'p99_change': p99_change,
+            })
+    return regressions
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='點餐系統資料庫效能量測')
+    parser.add_argument('--sizes', type=parse_int_list, default=[1000, 100000, 10000000],
+                        help='歷史訂單筆數，以逗號分隔 (預設: 1000,100000,10000000)')
+    parser.add_argument('--threads', type=parse_int_list, default=[1, 4, 8],
+                        help='執行緒數，以逗號分隔 (預設: 1,4,8)')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS),
+                        help='要量測的函式，以逗號分隔 (預設: 全部)')
+    parser.add_argument('--ops', type=int, default=2000, help='每個組合執行的操作次數 (預設: 2000)')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子 (預設: 42)')
+    parser.add_argument('--output', default='benchmark_results.json', help='結果JSON檔 (預設: benchmark_results.json)')
+    parser.add_argument('--compare', help='要比較的先前結果JSON檔')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='吞吐量下降或p99上升超過此比例視為退步 (預設: 0.15)')
+    args = parser.parse_args(argv)
+
+    workloads = [w for w in args.workloads.split(',') if w]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f'未知的工作負載: {", ".join(sorted(unknown))}')
+
+    results = []
+    for orders in args.sizes:
+        results.extend(run_size(orders, args.threads, workloads, args.ops, args.seed))
+
+    report: Dict[str, Any] = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        report['baseline'] = {'file': args.compare, 'git_revision': baseline.get('meta', {}).get('git_revision')}
+        report['regressions'] = regressions
+        for r in regressions:
+            print(f"退步: {r['workload']} orders={r['orders']} threads={r['threads']} "
+                  f"吞吐量 {r['throughput_change']:+.1%} p99 {r['p99_change']:+.1%}")
+        if regressions:
+            exit_code = 1
+        else:
+            print('與先前結果相比沒有明顯退步。')
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'結果已寫入 {args.output}')
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
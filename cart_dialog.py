@@ -0,0 +1,132 @@
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+from nicegui import ui
+
+from cart_store import cart_store, CartLine
+import metrics
+
+#點餐頁的確認點餐清單對話框
+#每個頁面只建立一次，之後開啟時只同步有變動的品項；調整數量時直接修改該列的數量與小計、總計，
+#不關閉也不重建對話框。數量用+/-按鈕調整，每次點擊的處理時間記錄在
+#ui_event_duration_seconds{event="cart_step"}
+
+MAX_QUANTITY = 99   #每個品項最多幾份
+
+class CartDialog:
+    def __init__(self, cart_key: str, on_change: Callable[[], None],
+                 on_submit: Callable[[str], Awaitable[None]]):
+        self.cart_key = cart_key
+        self._on_change = on_change   #購物車變動時通知頁面(更新頁面底部的總結)
+        self._on_submit = on_submit   #送出訂單，參數為取餐方式
+        #MID -> (列, 數量標籤, 小計標籤)
+        self._rows: Dict[int, Tuple[ui.row, ui.label, ui.label]] = {}
+
+        with ui.dialog() as self.dialog, ui.card().classes('w-full max-w-lg'):
+            ui.label('確認您的訂單清單').classes('text-2xl font-bold mb-4')
+
+            #訂單明細
+            self._lines = ui.column().classes('w-full border p-3 rounded-lg bg-primary max-h-80 overflow-y-auto')
+
+            #底部總結與操作按鈕
+            self._total_label = ui.label().classes('text-2xl font-extrabold text-red-600 mt-4 w-full text-right')
+
+            #取餐方式選擇
+            self.serving_select = ui.select(['DineIn', 'TakeOut'],
+                                            value='DineIn',
+                                            label='取餐方式').classes('w-32 mt-4')
+
+            with ui.row().classes('w-full justify-between mt-4'):
+                #繼續點餐按鈕
+                ui.button('繼續點餐', on_click=self.dialog.close).props('flat')
+
+                #送出訂單按鈕
+                self._submit_button = ui.button('送出訂單', icon='send', color='primary',
+                                                on_click=self._submit).classes('bg-positive')
+
+    #開啟對話框(先把畫面同步成購物車目前的內容)
+    def open(self):
+        if not cart_store.get(self.cart_key):
+            ui.notify('購物車是空的，請先點餐。', color='warning')
+            return
+        self.sync()
+        self.dialog.open()
+
+    def close(self):
+        self.dialog.close()
+
+    #讓畫面與購物車一致：新增/移除有變動的品項並更新數量與小計，沒變的列不會送出更新
+    def sync(self):
+        cart = cart_store.get(self.cart_key)
+        for mid in [mid for mid in self._rows if mid not in cart]:
+            self._remove_row(mid)
+        for mid, line in cart.lines.items():
+            if mid in self._rows:
+                self._update_row(line)
+            else:
+                self._add_row(line)
+        self._update_total()
+
+    def _add_row(self, line: CartLine):
+        mid = line.mid
+        with self._lines:
+            with ui.row().classes('w-full items-center justify-between py-2 border-b last:border-b-0 no-wrap') as row:
+                #名稱
+                ui.label(line.name).classes('w-1/3 text-lg font-semibold')
+
+                #數量調整
+                with ui.row().classes('items-center gap-1 no-wrap'):
+                    ui.button(icon='remove', on_click=lambda: self.step(mid, -1)).props('flat round dense')
+                    quantity_label = ui.label().classes('w-8 text-center text-lg')
+                    ui.button(icon='add', on_click=lambda: self.step(mid, 1)).props('flat round dense')
+
+                #顯示小計
+                subtotal_label = ui.label().classes('text-lg font-bold w-1/4 text-right')
+                ui.button(icon='delete', on_click=lambda: self.step(mid, -MAX_QUANTITY)).props('flat round dense color=negative')
+        self._rows[mid] = (row, quantity_label, subtotal_label)
+        self._update_row(line)
+
+    def _update_row(self, line: CartLine):
+        _, quantity_label, subtotal_label = self._rows[line.mid]
+        #set_text在內容相同時不會送出更新
+        quantity_label.set_text(str(line.quantity))
+        subtotal_label.set_text(f"NT$ {line.total:.0f}")
+
+    def _remove_row(self, mid: int):
+        row, _, _ = self._rows.pop(mid)
+        row.delete()
+
+    def _update_total(self):
+        self._total_label.set_text(f"總計: NT$ {cart_store.get(self.cart_key).total:.0f}")
+
+    #+/-按鈕：調整一個品項的數量，只更新這一列與總計
+    def step(self, mid: int, delta: int):
+        started = time.perf_counter()
+        cart = cart_store.get(self.cart_key)
+        line = cart.get(mid)
+        if line is None:
+            self.sync()
+            return
+
+        quantity = min(line.quantity + delta, MAX_QUANTITY)
+        cart.set_quantity(mid, quantity)
+        if quantity <= 0:
+            self._remove_row(mid)
+            ui.notify(f'已移除 {line.name}', color='negative', timeout=1000)
+        else:
+            self._update_row(line)
+        self._update_total()
+        self._on_change()
+
+        if not cart:
+            self.close()
+        if metrics.is_enabled():
+            metrics.observe('ui_event_duration_seconds', {'event': 'cart_step'}, time.perf_counter() - started)
+
+    #送出訂單(處理期間停用按鈕，避免重複送出)
+    async def _submit(self):
+        self._submit_button.disable()
+        try:
+            await self._on_submit(self.serving_select.value)
+        finally:
+            self._submit_button.enable()
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+#每個點餐頁面(NiceGUI client)各自的購物車
+#總金額與份數在每次變更時以O(1)更新，閒置超過CART_TTL秒的購物車會被回收
+CART_TTL = float(os.environ.get('CART_TTL', '1800'))
+
+#購物車中的一個品項(用__slots__減少記憶體)
+class CartLine:
+    __slots__ = ('mid', 'name', 'price', 'picname', 'quantity')
+
+    def __init__(self, mid: int, name: str, price: int, picname: Optional[str]):
+        self.mid = mid
+        self.name = name
+        self.price = price
+        self.picname = picname
+        self.quantity = 0
+
+    @property
+    def total(self) -> int:
+        return self.price * self.quantity
+
+class Cart:
+    __slots__ = ('lines', 'total', 'count', 'last_seen')
+
+    def __init__(self):
+        self.lines: Dict[int, CartLine] = {}
+        self.total = 0   #總金額
+        self.count = 0   #總份數
+        self.last_seen = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __contains__(self, mid: int) -> bool:
+        return mid in self.lines
+
+    def get(self, mid: int) -> Optional[CartLine]:
+        return self.lines.get(mid)
+
+    #加入餐點(數量累加)
+    def add(self, mid: int, name: str, price: int, quantity: int, picname: Optional[str] = None) -> CartLine:
+        line = self.lines.get(mid)
+        if line is None:
+            line = self.lines[mid] = CartLine(mid, name, price, picname)
+        self._change(line, line.quantity + quantity)
+        return line
+
+    #直接設定數量，0或以下則移除，回傳是否有此品項
+    def set_quantity(self, mid: int, quantity: int) -> bool:
+        line = self.lines.get(mid)
+        if line is None:
+            return False
+        self._change(line, max(quantity, 0))
+        if line.quantity == 0:
+            del self.lines[mid]
+        return True
+
+    #修改單價(例如伺服器重新計價後)
+    def set_price(self, mid: int, price: int):
+        line = self.lines.get(mid)
+        if line is not None:
+            self.total += (price - line.price) * line.quantity
+            line.price = price
+
+    #只調整差額，不重新加總整個購物車
+    def _change(self, line: CartLine, quantity: int):
+        delta = quantity - line.quantity
+        self.count += delta
+        self.total += delta * line.price
+        line.quantity = quantity
+
+    def clear(self):
+        self.lines.clear()
+        self.total = 0
+        self.count = 0
+
+    #轉成submit_full_order使用的格式
+    def items(self) -> List[Dict[str, Any]]:
+        return [{
+            'mid': line.mid,
+            'name': line.name,
+            'price': line.price,
+            'picname': line.picname,
+            'quantity': line.quantity,
+            'total': line.total,
+        } for line in self.lines.values()]
+
+class CartStore:
+    def __init__(self, ttl: float = CART_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        #依最後使用時間排序，最久沒用的在最前面，回收時只需從前面檢查
+        self._carts: 'OrderedDict[str, Cart]' = OrderedDict()
+
+    #取得(必要時建立)某個client的購物車，同時回收閒置的購物車
+    def get(self, key: str) -> Cart:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            cart = self._carts.get(key)
+            if cart is None:
+                cart = self._carts[key] = Cart()
+            else:
+                self._carts.move_to_end(key)
+            cart.last_seen = now
+            return cart
+
+    #移除購物車(client關閉時呼叫)
+    def discard(self, key: str):
+        with self._lock:
+            self._carts.pop(key, None)
+
+    def _expire(self, now: float):
+        while self._carts:
+            key, cart = next(iter(self._carts.items()))
+            if now - cart.last_seen < self.ttl:
+                break
+            del self._carts[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._carts)
+
+#全域的購物車儲存區
+cart_store = CartStore()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List
+
+from nicegui import background_tasks
+
+import async_db
+import database
+from order_events import order_bus
+
+#多worker模式的跨程序變更通知
+#每個worker定期讀取ChangeLog中其他worker寫入的變更：訂單事件重新發布到本程序的order_bus，
+#菜單變更清除菜單快取，登入狀態變更交給state.py註冊的處理函式
+#只有DB_CHANGE_LOG=1(serve.py啟動的worker)時才會啟動
+
+CHANGE_POLL_INTERVAL = float(os.environ.get('CHANGE_POLL_INTERVAL', '0.25'))   #輪詢間隔(秒)
+CHANGE_LOG_RETENTION = float(os.environ.get('CHANGE_LOG_RETENTION', '3600'))  #變更紀錄保留的秒數
+PRUNE_INTERVAL = 600                                                           #每隔多少秒清理一次
+CHANGE_BATCH = 500                                                             #每次最多讀取的變更筆數
+
+#變更種類 -> 處理函式(參數為Payload)
+_handlers: Dict[str, List[Callable[[Any], None]]] = {
+    'order': [order_bus.publish],
+    'menu': [lambda payload: database.invalidate_menu_cache()],
+}
+_last_seq = 0
+
+#註冊某種變更的處理函式(例如state.py清除登入狀態快取)
+def register(kind: str, handler: Callable[[Any], None]):
+    _handlers.setdefault(kind, []).append(handler)
+
+#讀取並套用一批新的變更，回傳讀到的筆數
+async def poll_once() -> int:
+    global _last_seq
+    changes = await async_db.run_db(database.read_changes, _last_seq, CHANGE_BATCH)
+    for change in changes:
+        _last_seq = change['Seq']
+        #自己發出的變更在寫入時已經發布過
+        if change['Origin'] == database.WORKER_ID:
+            continue
+        for handler in _handlers.get(change['Kind'], []):
+            try:
+                handler(change['Payload'])
+            except Exception as e:
+                print(f"處理變更 {change['Seq']} 時發生錯誤: {e}")
+    return len(changes)
+
+async def _poll_loop():
+    global _last_seq
+    _last_seq = await async_db.run_db(database.get_change_seq)
+    print(f"worker {database.WORKER_ID} 開始接收其他worker的變更 (從序號 {_last_seq})")
+    last_prune = 0.0
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            #一次讀滿時代表還有，立刻繼續讀
+            while await poll_once() >= CHANGE_BATCH:
+                pass
+            if loop.time() - last_prune >= PRUNE_INTERVAL:
+                last_prune = loop.time()
+                await async_db.run_db(database.prune_change_log, CHANGE_LOG_RETENTION)
+        except Exception as e:
+            print(f"讀取變更紀錄時發生錯誤: {e}")
+        await asyncio.sleep(CHANGE_POLL_INTERVAL)
+
+#啟動變更輪詢(app.on_startup呼叫)
+def start():
+    if not database.CHANGE_LOG:
+        return
+    background_tasks.create(_poll_loop(), name='change-feed')
@@ -0,0 +1,233 @@
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import database
+
+#大量假資料產生器
+#以固定亂數種子產生菜單、員工與數百萬筆Order/OrderDetail(含午餐、晚餐尖峰時段)，
+#在單一交易中用executemany寫入，寫入期間放寬pragma並暫時移除索引與觸發器，結束後再重建
+#
+#用法:
+#  python data_generator.py --db ordering_system.db --orders 1000000 --days 365 --seed 42
+
+#菜單組成(分類, 基本品項, 價格範圍)
+_MENU_BASE: List[Tuple[str, List[str], Tuple[int, int]]] = [
+    ('主餐', ['義大利麵', '燉飯', '牛排', '雞腿排', '豬排', '漢堡', '咖哩飯', '炒飯', '拉麵', '焗烤'], (120, 380)),
+    ('湯品', ['玉米濃湯', '南瓜湯', '洋蔥湯', '蘑菇濃湯', '羅宋湯'], (40, 90)),
+    ('飲料', ['紅茶', '綠茶', '奶茶', '咖啡', '拿鐵', '檸檬汁', '柳橙汁', '可樂'], (30, 120)),
+    ('甜點', ['提拉米蘇', '布丁', '鬆餅', '起司蛋糕', '冰淇淋', '巧克力蛋糕'], (60, 160)),
+]
+_STYLES = ['', '招牌', '經典', '香煎', '奶油', '番茄', '青醬', '辣味', '日式', '泰式', '冰', '熱', '特大']
+
+#一天中各小時的來客權重(11-13點午餐、17-19點晚餐尖峰)
+HOURLY_WEIGHTS = [0, 0, 0, 0, 0, 0, 0, 2, 4, 4, 6, 20, 26, 14, 5, 4, 6, 16, 22, 12, 6, 3, 1, 0]
+#星期一到星期日的來客倍率(週末較多)
+WEEKDAY_FACTORS = [0.85, 0.9, 0.9, 0.95, 1.1, 1.35, 1.25]
+#每筆訂單的品項數與每個品項數量的權重
+LINES_WEIGHTS = [45, 30, 17, 8]        #1~4項
+QUANTITY_WEIGHTS = [70, 22, 8]         #1~3份
+
+#預先產生一天中每一秒的時間字串，避免每筆訂單都呼叫strftime
+_TIME_OF_DAY = [f'{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}' for s in range(86400)]
+
+#產生不重複的餐點清單 [(名稱, 價格, 分類), ...]
+def generate_menu(count: int, rng: random.Random) -> List[Tuple[str, int, str]]:
+    candidates = [(f'{style}{base}', category, price_range)
+                  for category, bases, price_range in _MENU_BASE
+                  for base in bases for style in _STYLES]
+    rng.shuffle(candidates)
+    menu = []
+    for i in range(count):
+        name, category, (low, high) = candidates[i % len(candidates)]
+        if i >= len(candidates):
+            name = f'{name}{i // len(candidates) + 1}號'
+        #價格取整到5元
+        menu.append((name, rng.randrange(low, high + 1, 5), category))
+    return menu
+
+#補足餐點與員工數量，回傳 [(MID, 價格), ...]
+def ensure_menu_and_staff(conn: sqlite3.Connection, meals: int, staff: int, rng: random.Random) -> List[Tuple[int, int]]:
+    existing_meals = conn.execute("SELECT COUNT(*) FROM Meal").fetchone()[0]
+    if existing_meals < meals:
+        taken = {row[0] for row in conn.execute("SELECT Name FROM Meal")}
+        new_meals = [meal for meal in generate_menu(meals * 2, rng) if meal[0] not in taken]
+        conn.executemany("INSERT INTO Meal (Name, Price, PicName, IsAvailable, Category) VALUES (?, ?, NULL, 1, ?)",
+                         new_meals[:meals - existing_meals])
+
+    existing_staff = conn.execute("SELECT COUNT(*) FROM Staff").fetchone()[0]
+    if existing_staff < staff:
+        taken = {row[0] for row in conn.execute("SELECT Account FROM Staff")}
+        accounts = [f'staff{i:03d}' for i in range(1, staff * 2 + 1) if f'staff{i:03d}' not in taken]
+        conn.executemany("INSERT INTO Staff (Account, Password, Class) VALUES (?, 'password', ?)",
+                         [(account, 'Manager' if i % 10 == 0 else 'Staff')
+                          for i, account in enumerate(accounts[:staff - existing_staff])])
+
+    return conn.execute("SELECT MID, Price FROM Meal WHERE IsAvailable = 1 ORDER BY MID").fetchall()
+
+#把訂單數分配到每一天(週末較多)
+def _orders_per_day(orders: int, days: int, start: date) -> List[int]:
+    weights = [WEEKDAY_FACTORS[(start + timedelta(days=d)).weekday()] for d in range(days)]
+    scale = orders / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    #捨去的部分補到最後幾天
+    for d in range(orders - sum(counts)):
+        counts[-1 - d % days] += 1
+    return counts
+
+#下一個可用的OID：已封存的訂單與曾經用過的OID(sqlite_sequence)都不能重複使用，
+#否則同一個OID會同時對應到現行與封存的兩筆不同訂單
+SQL_NEXT_OID = """
+SELECT MAX(
+    COALESCE((SELECT MAX(OID) FROM "Order"), 0),
+    COALESCE((SELECT MAX(OID) FROM OrderArchive), 0),
+    COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'Order'), 0)
+) + 1
+"""
+
+def _next_oid(conn: sqlite3.Connection) -> int:
+    return conn.execute(SQL_NEXT_OID).fetchone()[0]
+
+#產生某一天的訂單與明細資料列
+def _generate_day(day: date, count: int, first_oid: int, menu: List[Tuple[int, int]],
+                  meal_weights: List[float], rng: random.Random) -> Tuple[list, list]:
+    prefix = day.isoformat() + ' '
+    hour_weights = list(_accumulate(HOURLY_WEIGHTS))
+    hours = rng.choices(range(24), cum_weights=hour_weights, k=count)
+    seconds = sorted(h * 3600 + rng.randrange(3600) for h in hours)
+
+    line_counts = rng.choices((1, 2, 3, 4), cum_weights=list(_accumulate(LINES_WEIGHTS)), k=count)
+    picks = iter(rng.choices(menu, cum_weights=meal_weights, k=sum(line_counts)))
+    quantities = iter(rng.choices((1, 2, 3), cum_weights=list(_accumulate(QUANTITY_WEIGHTS)), k=sum(line_counts)))
+    methods = rng.choices(('DineIn', 'TakeOut'), weights=(60, 40), k=count)
+
+    order_rows = []
+    detail_rows = []
+    oid = first_oid
+    for i in range(count):
+        lines: Dict[int, List[int]] = {}
+        for _ in range(line_counts[i]):
+            mid, price = next(picks)
+            quantity = next(quantities)
+            if mid in lines:
+                lines[mid][1] += quantity
+            else:
+                lines[mid] = [price, quantity]
+        total = 0
+        for mid, (price, quantity) in lines.items():
+            subtotal = price * quantity
+            total += subtotal
+            detail_rows.append((oid, mid, quantity, price, subtotal))
+        order_rows.append((oid, prefix + _TIME_OF_DAY[seconds[i]], total, 'Completed', methods[i]))
+        oid += 1
+    return order_rows, detail_rows
+
+def _accumulate(weights):
+    total = 0
+    for w in weights:
+        total += w
+        yield total
+
+#產生假資料並寫入資料庫，回傳統計資訊
+def generate(db_path: str, orders: int, days: int = 365, seed: int = 42,
+             meals: int = 40, staff: int = 20, pending: int = 30,
+             end_day: Optional[date] = None) -> Dict[str, float]:
+    rng = random.Random(seed)
+    end_day = end_day or date.today()
+    start_day = end_day - timedelta(days=days - 1)
+
+    #使用專用連線(不經過連線池)，並確保資料表為最新版本
+    conn = database.get_db_connection(db_path)
+    if conn is None:
+        raise sqlite3.OperationalError(f'無法開啟資料庫 {db_path}')
+    database.migrate(conn)
+
+    #寫入期間放寬pragma(當機時資料可能不完整，只適合產生測試資料)
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-262144')   #256MB
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+    started = time.perf_counter()
+    order_count = detail_count = 0
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        menu = ensure_menu_and_staff(conn, meals, staff, rng)
+        if not menu:
+            raise ValueError('沒有可販售的餐點，無法產生訂單。')
+        #熱門程度近似Zipf分布：少數餐點賣得特別好
+        popularity = list(range(len(menu)))
+        rng.shuffle(popularity)
+        meal_weights = list(_accumulate(1 / (rank + 1) for rank in popularity))
+
+        #暫時移除訂單相關的索引與觸發器，寫入完成後一次重建比逐筆維護快很多
+        schema = conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND tbl_name IN ('Order', 'OrderDetail') AND sql IS NOT NULL
+        """).fetchall()
+        for kind, name, _ in schema:
+            conn.execute(f'DROP {kind.upper()} "{name}"')
+
+        first_oid = next_oid = _next_oid(conn)
+        for offset, count in enumerate(_orders_per_day(orders, days, start_day)):
+            if not count:
+                continue
+            order_rows, detail_rows = _generate_day(start_day + timedelta(days=offset), count,
+                                                    next_oid, menu, meal_weights, rng)
+            conn.executemany('INSERT INTO "Order" (OID, Time, TotalAmount, Status, ServingMethod) VALUES (?, ?, ?, ?, ?)',
+                             order_rows)
+            conn.executemany("INSERT INTO OrderDetail (Order_ID, Meal_ID, Quantity, PriceAtOrder, Total) VALUES (?, ?, ?, ?, ?)",
+                             detail_rows)
+            next_oid += count
+            order_count += count
+            detail_count += len(detail_rows)
+
+        #最新的幾筆訂單仍在準備中，讓廚房畫面有資料
+        if pending:
+            conn.execute('UPDATE "Order" SET Status = \'Preparing\' WHERE OID >= ?', (max(next_oid - pending, first_oid),))
+
+        for _, _, sql in schema:
+            conn.execute(sql)
+        #觸發器停用期間沒有累加銷售統計，一次重新計算
+        database.fill_sales_aggregates(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('PRAGMA optimize')
+        conn.close()
+
+    #菜單可能已改變
+    database.invalidate_menu_cache()
+
+    elapsed = time.perf_counter() - started
+    rows = order_count + detail_count
+    return {
+        'orders': order_count,
+        'details': detail_count,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else 0.0,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='產生點餐系統的大量假資料')
+    parser.add_argument('--db', default=database.DB, help=f'資料庫檔案 (預設: {database.DB})')
+    parser.add_argument('--orders', type=int, default=100000, help='訂單筆數 (預設: 100000)')
+    parser.add_argument('--days', type=int, default=365, help='分布在最近幾天 (預設: 365)')
+    parser.add_argument('--meals', type=int, default=40, help='至少要有幾種餐點 (預設: 40)')
+    parser.add_argument('--staff', type=int, default=20, help='至少要有幾位員工 (預設: 20)')
+    parser.add_argument('--pending', type=int, default=30, help='保持準備中的最新訂單數 (預設: 30)')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子 (預設: 42)')
+    args = parser.parse_args(argv)
+
+    stats = generate(args.db, args.orders, args.days, args.seed, args.meals, args.staff, args.pending)
+    print(f"已產生 {stats['orders']:,} 筆訂單、{stats['details']:,} 筆明細，"
+          f"耗時 {stats['seconds']:.1f} 秒 ({stats['rows_per_second']:,.0f} 筆/秒)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
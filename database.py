@@ -1,22 +1,253 @@
 import sqlite3
+import json
 import os
-from typing import List, Dict, Optional, Any
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Tuple, Union
+
+from order_events import OrderEvent, order_bus
+from group_commit import GroupCommitWriter, Operation
+import metrics
 
 #建立資料庫，檔案名稱和路徑
 DB='ordering_system.db'
 
-#建立並return資料庫連線物件
-def get_db_connection():
+#餐點分類：點餐頁依這個順序顯示分類分頁，不在清單中的分類排在後面
+MEAL_CATEGORIES = ('主餐', '湯品', '飲料', '甜點', '其他')
+DEFAULT_MEAL_CATEGORY = '其他'
+
+#連線池設定(可用環境變數調整)
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))           #連線池最多保留的連線數
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))  #連線池用盡時最多等待秒數
+BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', '5000'))  #遇到寫入鎖時sqlite等待的毫秒數
+STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE', '256'))  #每條連線的prepared statement快取數量
+
+#group commit寫入佇列設定(訂單與訂單狀態的寫入)
+GROUP_COMMIT = os.environ.get('DB_GROUP_COMMIT', '1') != '0'                  #0為每筆寫入各自commit
+WRITE_BATCH_MAX = int(os.environ.get('DB_WRITE_BATCH_MAX', '64'))             #每個交易最多合併幾筆寫入
+WRITE_BATCH_DELAY_MS = float(os.environ.get('DB_WRITE_BATCH_DELAY_MS', '0'))  #收集同一批寫入最多再等待的毫秒數(0為只合併已在排隊的寫入)
+
+#多worker模式設定(serve.py會替每個worker設定)
+WORKER_ID = os.environ.get('WORKER_ID') or str(os.getpid())        #寫入ChangeLog的來源，worker用來略過自己發出的變更
+CHANGE_LOG = os.environ.get('DB_CHANGE_LOG', '0') != '0'           #是否把訂單/菜單/登入變更寫入ChangeLog通知其他worker
+SESSION_TTL_HOURS = float(os.environ.get('SESSION_TTL_HOURS', '12'))  #登入狀態保留的小時數
+
+#印出資料庫錯誤並計入目前資料庫函式(或指定函式)的錯誤次數(metrics)
+def _log_error(message: str, function: Optional[str] = None):
+    print(message)
+    metrics.record_error(function)
+
+#建立並return資料庫連線物件(已設定WAL、busy_timeout與statement快取)
+def get_db_connection(db_path: Optional[str] = None):
     try:
-        conn = sqlite3.connect(DB)
+        conn = sqlite3.connect(db_path or DB,
+                               timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=STATEMENT_CACHE_SIZE,
+                               check_same_thread=False)  #連線會在不同執行緒之間借出
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous=NORMAL')  #WAL模式下NORMAL即可保證一致性
         return conn
     
     except sqlite3.Error as e:
-        print(f"資料庫連線錯誤: {e}")
+        _log_error(f"資料庫連線錯誤: {e}")
         return None
 
-#建立所有需要的資料表
-def create_tables(conn):
+#長期保留的連線池，借出/歸還連線並記錄等待時間與使用狀況
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        #統計資料
+        self._checkouts = 0
+        self._waits = 0          #連線池用盡而必須等待的次數(飽和)
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._peak_in_use = 0
+
+    #借出一條連線，必要時建立新連線或等待其他人歸還
+    def acquire(self) -> sqlite3.Connection:
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.OperationalError('連線池已關閉')
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    conn = get_db_connection(self.db_path)
+                    if conn is None:
+                        raise sqlite3.OperationalError(f'無法開啟資料庫 {self.db_path}')
+                    self._created += 1
+                    break
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._created >= self.size:
+                        self._timeouts += 1
+                        raise sqlite3.OperationalError('等待資料庫連線逾時(連線池已滿)')
+
+            elapsed = time.perf_counter() - start
+            self._checkouts += 1
+            self._waits += waited
+            self._wait_total += elapsed
+            self._wait_max = max(self._wait_max, elapsed)
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            return conn
+
+    #歸還連線，未結束的交易一律rollback
+    def release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            #連線已損壞，丟棄並允許重新建立
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            conn.close()
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                conn.close()
+                self._created -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    #關閉所有閒置連線，借出中的連線會在歸還時關閉
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._created -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    #回傳連線池統計(借出延遲、飽和程度)
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'saturation': self._in_use / self.size,
+                'avg_checkout_ms': (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                'max_checkout_ms': self._wait_max * 1000,
+            }
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+#取得(必要時建立)全域連線池
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB, POOL_SIZE)
+    return _pool
+
+_writer: Optional[GroupCommitWriter] = None
+
+#取得(必要時建立)group commit寫入佇列
+def get_writer() -> GroupCommitWriter:
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter(write_transaction, order_bus.publish,
+                                            WRITE_BATCH_MAX, WRITE_BATCH_DELAY_MS / 1000)
+    return _writer
+
+#寫完佇列中剩下的寫入並停止寫入執行緒
+def close_writer():
+    global _writer
+    with _pool_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+#回傳寫入佇列統計資料(還沒有寫入時為空dict)
+def get_writer_stats() -> Dict[str, Any]:
+    return _writer.stats() if _writer is not None else {}
+
+#重新設定資料庫路徑或連線池大小(例如測試、效能量測時使用暫存資料庫)
+def configure_pool(db_path: Optional[str] = None, pool_size: Optional[int] = None):
+    global _pool, DB, POOL_SIZE
+    #排隊中的寫入要寫進原本的資料庫
+    close_writer()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if db_path is not None:
+            DB = db_path
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+    #換了資料庫，記憶體中的菜單也不再有效
+    invalidate_menu_cache()
+    _reset_meal_fts()
+
+#寫完排隊中的寫入並關閉連線池(程式結束時呼叫)
+def close_pool():
+    configure_pool()
+
+#回傳連線池統計資料
+def get_pool_stats() -> Dict[str, Any]:
+    return get_pool().stats()
+
+#從連線池借出連線的context manager，所有資料庫函式都透過它取得連線
+@contextmanager
+def db_connection():
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+#寫入用交易：BEGIN IMMEDIATE先取得寫入鎖，成功commit，發生例外則整筆rollback
+@contextmanager
+def write_transaction():
+    with db_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+#資料庫版本遷移：以PRAGMA user_version記錄目前版本，依序套用尚未執行的遷移
+#新的遷移請加在MIGRATIONS最後面(版本號 = 在串列中的位置 + 1)，不要修改已發布的遷移
+
+#版本1: 建立所有需要的資料表(舊的ordering_system.db版本為0，表格已存在時會略過)
+def _migration_1_create_tables(conn: sqlite3.Connection):
     cursor = conn.cursor()
 
     #餐點: Meal(MID, Name, Price, PicName, IsAvailable)
@@ -65,22 +296,552 @@ def create_tables(conn):
     );
     """)
 
-    conn.commit()
-    print("所有資料表已成功建立或已存在。")
+#版本2: 熱門訂單查詢用的覆蓋索引
+def _migration_2_order_indexes(conn: sqlite3.Connection):
+    #get_all_orders: WHERE Status = ? ORDER BY Time，欄位都在索引內不需回表
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_order_status_time
+    ON "Order" (Status, Time, TotalAmount, ServingMethod)
+    """)
+    #get_order_details: WHERE Order_ID = ?，明細欄位都在索引內
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_orderdetail_order
+    ON OrderDetail (Order_ID, Meal_ID, Quantity, PriceAtOrder, Total)
+    """)
+
+#版本3: 銷售統計表(每日、每小時、每餐點、每種取餐方式)，由觸發器在新增訂單的同一個交易中累加
+#報表只讀取這些統計表，查詢時間只與查詢的天數有關，不會隨歷史訂單增加而變慢
+def _migration_3_sales_aggregates(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS SalesDaily (
+        Day TEXT PRIMARY KEY,               --YYYY-MM-DD
+        Orders INTEGER NOT NULL DEFAULT 0,
+        Revenue INTEGER NOT NULL DEFAULT 0,
+        Items INTEGER NOT NULL DEFAULT 0    --售出餐點份數
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS SalesHourly (
+        Day TEXT NOT NULL,
+        Hour INTEGER NOT NULL,
+        Orders INTEGER NOT NULL DEFAULT 0,
+        Revenue INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (Day, Hour)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS SalesByMeal (
+        Day TEXT NOT NULL,
+        Meal_ID INTEGER NOT NULL,
+        Quantity INTEGER NOT NULL DEFAULT 0,
+        Revenue INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (Day, Meal_ID)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS SalesByServingMethod (
+        Day TEXT NOT NULL,
+        ServingMethod TEXT NOT NULL,
+        Orders INTEGER NOT NULL DEFAULT 0,
+        Revenue INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (Day, ServingMethod)
+    ) WITHOUT ROWID
+    """)
+
+    #新增訂單時累加每日/每小時/取餐方式的訂單數與營收
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_order_sales AFTER INSERT ON "Order"
+    BEGIN
+        INSERT INTO SalesDaily (Day, Orders, Revenue)
+        VALUES (substr(NEW.Time, 1, 10), 1, NEW.TotalAmount)
+        ON CONFLICT (Day) DO UPDATE SET
+            Orders = Orders + 1, Revenue = Revenue + excluded.Revenue;
+
+        INSERT INTO SalesHourly (Day, Hour, Orders, Revenue)
+        VALUES (substr(NEW.Time, 1, 10), CAST(substr(NEW.Time, 12, 2) AS INTEGER), 1, NEW.TotalAmount)
+        ON CONFLICT (Day, Hour) DO UPDATE SET
+            Orders = Orders + 1, Revenue = Revenue + excluded.Revenue;
+
+        INSERT INTO SalesByServingMethod (Day, ServingMethod, Orders, Revenue)
+        VALUES (substr(NEW.Time, 1, 10), NEW.ServingMethod, 1, NEW.TotalAmount)
+        ON CONFLICT (Day, ServingMethod) DO UPDATE SET
+            Orders = Orders + 1, Revenue = Revenue + excluded.Revenue;
+    END
+    """)
+    #新增明細時累加每個餐點的份數與營收(日期取自所屬訂單，以主鍵查詢)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_orderdetail_sales AFTER INSERT ON OrderDetail
+    BEGIN
+        INSERT INTO SalesByMeal (Day, Meal_ID, Quantity, Revenue)
+        SELECT substr(Time, 1, 10), NEW.Meal_ID, NEW.Quantity, NEW.Total
+        FROM "Order" WHERE OID = NEW.Order_ID
+        ON CONFLICT (Day, Meal_ID) DO UPDATE SET
+            Quantity = Quantity + excluded.Quantity, Revenue = Revenue + excluded.Revenue;
+
+        UPDATE SalesDaily SET Items = Items + NEW.Quantity
+        WHERE Day = (SELECT substr(Time, 1, 10) FROM "Order" WHERE OID = NEW.Order_ID);
+    END
+    """)
+
+    #從既有的訂單回填
+    fill_sales_aggregates(conn)
+
+#版本4: 已完成舊訂單的封存表，以及同時涵蓋現行與封存資料的歷史檢視
+#封存後現行的Order/OrderDetail只保留準備中與近期的訂單，廚房查詢與索引維持在小範圍
+def _migration_4_order_archive(conn: sqlite3.Connection):
+    #欄位與Order/OrderDetail相同，OID/ODID沿用原本的值(不使用AUTOINCREMENT)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS OrderArchive (
+        OID INTEGER PRIMARY KEY,
+        Time TEXT NOT NULL,
+        TotalAmount INTEGER NOT NULL,
+        Status TEXT NOT NULL,
+        ServingMethod TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS OrderDetailArchive (
+        ODID INTEGER PRIMARY KEY,
+        Order_ID INTEGER NOT NULL,
+        Meal_ID INTEGER NOT NULL,
+        Quantity INTEGER NOT NULL,
+        PriceAtOrder INTEGER NOT NULL,
+        Total INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orderarchive_time ON OrderArchive (Time)")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_orderdetailarchive_order
+    ON OrderDetailArchive (Order_ID, Meal_ID, Quantity, PriceAtOrder, Total)
+    """)
+
+    #歷史查詢與重建統計使用的檢視(Archived: 0為現行資料，1為封存資料)
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS OrderHistory AS
+    SELECT OID, Time, TotalAmount, Status, ServingMethod, 0 AS Archived FROM "Order"
+    UNION ALL
+    SELECT OID, Time, TotalAmount, Status, ServingMethod, 1 AS Archived FROM OrderArchive
+    """)
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS OrderDetailHistory AS
+    SELECT ODID, Order_ID, Meal_ID, Quantity, PriceAtOrder, Total FROM OrderDetail
+    UNION ALL
+    SELECT ODID, Order_ID, Meal_ID, Quantity, PriceAtOrder, Total FROM OrderDetailArchive
+    """)
+
+#版本5: 多worker共用的登入狀態表(Session)與跨程序變更通知表(ChangeLog)
+def _migration_5_worker_sync(conn: sqlite3.Connection):
+    #登入狀態(以瀏覽器session id為鍵)，所有worker程序共用
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS Session (
+        SessionID TEXT PRIMARY KEY,
+        SID INTEGER NOT NULL,
+        Account TEXT NOT NULL,
+        Class TEXT NOT NULL,
+        Created TEXT NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_account ON Session (Account)")
+
+    #跨程序的變更通知：寫入端在同一個交易中新增一列，每個worker輪詢Seq大於上次讀到的資料列
+    #Seq在寫入鎖內遞增，commit順序與Seq順序一致，輪詢不會漏掉資料列
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        Time TEXT NOT NULL,
+        Origin TEXT NOT NULL,
+        Kind TEXT NOT NULL,
+        Payload TEXT
+    )
+    """)
+
+#版本6: 搜尋用的索引
+#餐點名稱的FTS5全文索引(trigram分詞，可搜尋名稱中任意3個字以上的片段)，由觸發器與Meal同步；
+#sqlite沒有編入FTS5或trigram分詞器時略過，搜尋改用LIKE(餐點數量少，影響不大)
+#訂單依時間、依餐點查詢的索引(現行與封存的表都要建)
+def _migration_6_search_indexes(conn: sqlite3.Connection):
+    conn.execute('SAVEPOINT meal_fts')
+    try:
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS MealFTS
+        USING fts5(Name, content='Meal', content_rowid='MID', tokenize='trigram')
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_meal_fts_insert AFTER INSERT ON Meal
+        BEGIN
+            INSERT INTO MealFTS (rowid, Name) VALUES (NEW.MID, NEW.Name);
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_meal_fts_delete AFTER DELETE ON Meal
+        BEGIN
+            INSERT INTO MealFTS (MealFTS, rowid, Name) VALUES ('delete', OLD.MID, OLD.Name);
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_meal_fts_update AFTER UPDATE OF Name ON Meal
+        BEGIN
+            INSERT INTO MealFTS (MealFTS, rowid, Name) VALUES ('delete', OLD.MID, OLD.Name);
+            INSERT INTO MealFTS (rowid, Name) VALUES (NEW.MID, NEW.Name);
+        END
+        """)
+        #為既有的餐點建立索引
+        conn.execute("INSERT INTO MealFTS (MealFTS) VALUES ('rebuild')")
+        conn.execute('RELEASE meal_fts')
+    except sqlite3.OperationalError as e:
+        conn.execute('ROLLBACK TO meal_fts')
+        conn.execute('RELEASE meal_fts')
+        print(f"sqlite不支援FTS5 trigram，餐點搜尋改用LIKE: {e}")
+
+    #依時間範圍查詢訂單(idx_order_status_time以Status開頭，不能用在不分狀態的查詢)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_order_time ON "Order" (Time)')
+    #依餐點查詢訂單：取出某個餐點的所有明細
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orderdetail_meal ON OrderDetail (Meal_ID, Order_ID)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orderdetailarchive_meal ON OrderDetailArchive (Meal_ID, Order_ID)")
+
+#版本7: 餐點分類(既有的餐點歸到「其他」)
+def _migration_7_meal_category(conn: sqlite3.Connection):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Meal)")]
+    if 'Category' not in columns:
+        conn.execute("ALTER TABLE Meal ADD COLUMN Category TEXT NOT NULL DEFAULT '其他'")
+
+MIGRATIONS = [
+    _migration_1_create_tables,
+    _migration_2_order_indexes,
+    _migration_3_sales_aggregates,
+    _migration_4_order_archive,
+    _migration_5_worker_sync,
+    _migration_6_search_indexes,
+    _migration_7_meal_category,
+]
+
+#回傳資料庫目前的schema版本
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+#將資料庫升級到最新版本，每個遷移在自己的交易中執行，回傳升級後的版本
+def migrate(conn: sqlite3.Connection) -> int:
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            #取得寫入鎖後再確認版本，避免多個程序同時啟動時重複升級
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+            _reset_meal_fts()
+            print(f"資料庫已升級到版本 {version}: {migration.__name__}")
+        except BaseException:
+            conn.rollback()
+            raise
+    return get_schema_version(conn)
+
+#公開查詢使用的SQL(集中在此，方便用EXPLAIN QUERY PLAN檢查是否走索引)
+SQL_LOGIN = "SELECT SID, Account, Class FROM Staff WHERE Account = ? AND Password = ?"
+
+SQL_ALL_STAFF = "SELECT SID, Account, Class FROM Staff ORDER BY SID ASC"
+
+SQL_ALL_MEALS = "SELECT MID, Name, Price, PicName, IsAvailable, Category FROM Meal ORDER BY MID ASC"
+
+SQL_PENDING_ORDERS = """
+SELECT OID, Time, TotalAmount, Status, ServingMethod 
+FROM "Order" 
+WHERE Status = 'Preparing'  --只顯示準備中的訂單
+ORDER BY Time ASC           --依時間從舊到新排序
+"""
+
+#廚房彙總：所有準備中訂單的品項(依訂單時間從舊到新，只在啟動或重新同步時查詢一次)
+SQL_PENDING_ORDER_LINES = """
+SELECT O.OID, O.Time, OD.Meal_ID, M.Name AS MealName, OD.Quantity
+FROM "Order" O
+JOIN OrderDetail OD ON OD.Order_ID = O.OID
+LEFT JOIN Meal M ON M.MID = OD.Meal_ID
+WHERE O.Status = 'Preparing'
+ORDER BY O.Time ASC, O.OID ASC
+"""
+
+SQL_ORDER_DETAILS = """
+SELECT 
+    OD.Quantity, OD.Total, OD.PriceAtOrder, 
+    M.Name AS MealName
+FROM OrderDetail OD
+JOIN Meal M ON OD.Meal_ID = M.MID
+WHERE OD.Order_ID = ?
+"""
+
+SQL_ORDER_DETAILS_MANY = """
+SELECT 
+    OD.Order_ID, OD.Quantity, OD.Total, OD.PriceAtOrder, 
+    M.Name AS MealName
+FROM OrderDetail OD
+JOIN Meal M ON OD.Meal_ID = M.MID
+WHERE OD.Order_ID IN ({placeholders})
+"""
+
+SQL_UPDATE_ORDER_STATUS = "UPDATE \"Order\" SET Status = ? WHERE OID = ?"
+
+#批次更新訂單狀態：先在同一個交易中找出狀態真的會改變的OID，再用一個UPDATE一次更新
+SQL_ORDERS_TO_CHANGE = "SELECT OID FROM \"Order\" WHERE OID IN ({placeholders}) AND Status <> ?"
+SQL_UPDATE_ORDER_STATUS_MANY = "UPDATE \"Order\" SET Status = ? WHERE OID IN ({placeholders})"
+
+#多worker：變更通知與登入狀態
+SQL_LOG_CHANGE = "INSERT INTO ChangeLog (Time, Origin, Kind, Payload) VALUES (?, ?, ?, ?)"
+SQL_READ_CHANGES = "SELECT Seq, Origin, Kind, Payload FROM ChangeLog WHERE Seq > ? ORDER BY Seq ASC LIMIT ?"
+SQL_GET_SESSION = "SELECT SID, Account, Class, Created FROM Session WHERE SessionID = ? AND Created >= ?"
+
+#送出訂單時重新計價：一次查出訂單中所有餐點目前的價格與販售狀態(走MID主鍵)
+SQL_MEAL_PRICES = "SELECT MID, Name, Price, IsAvailable FROM Meal WHERE MID IN ({placeholders})"
+
+#封存：找出下單時間早於cutoff的已完成訂單(走idx_order_status_time)
+SQL_ARCHIVABLE_ORDERS = """
+SELECT OID FROM "Order"
+WHERE Status = 'Completed' AND Time < ?
+ORDER BY Time ASC
+LIMIT ?
+"""
+
+#歷史訂單(現行+封存)
+SQL_ORDER_HISTORY = """
+SELECT OID, Time, TotalAmount, Status, ServingMethod, Archived
+FROM OrderHistory
+WHERE Time >= ? AND Time < ?
+ORDER BY Time DESC
+LIMIT ?
+"""
+
+SQL_HISTORY_ORDER = """
+SELECT OID, Time, TotalAmount, Status, ServingMethod, Archived
+FROM OrderHistory
+WHERE OID = ?
+"""
+
+SQL_HISTORY_ORDER_DETAILS = """
+SELECT 
+    OD.Quantity, OD.Total, OD.PriceAtOrder, 
+    M.Name AS MealName
+FROM OrderDetailHistory OD
+JOIN Meal M ON OD.Meal_ID = M.MID
+WHERE OD.Order_ID = ?
+"""
+
+#搜尋(見search_meals/search_orders)
+#餐點名稱：FTS5 trigram索引；搜尋字串少於3個字或沒有FTS5時用LIKE
+SQL_SEARCH_MEALS_FTS = """
+SELECT MID, Name, Price, PicName, IsAvailable, Category FROM Meal
+WHERE MID IN (SELECT rowid FROM MealFTS WHERE MealFTS MATCH ?)
+ORDER BY MID ASC LIMIT ?
+"""
+SQL_SEARCH_MEALS_LIKE = """
+SELECT MID, Name, Price, PicName, IsAvailable, Category FROM Meal
+WHERE Name LIKE ? ESCAPE '\\'
+ORDER BY MID ASC LIMIT ?
+"""
+
+#訂單搜尋分別查詢現行與封存的表再合併(OrderHistory檢視無法對兩邊各自用索引排序)
+#OID不一定依訂單時間遞增(例如補登或產生的歷史訂單)，時間條件一律直接比對Time
+SEARCH_ORDER_TABLES = (('"Order"', 'OrderDetail', 0), ('OrderArchive', 'OrderDetailArchive', 1))
+
+SQL_SEARCH_ORDERS_BY_TIME = """
+SELECT OID, Time, TotalAmount, Status, ServingMethod, {archived} AS Archived FROM {orders}
+WHERE Time >= ? AND Time < ?
+ORDER BY Time DESC, OID DESC LIMIT ?
+"""
+#依餐點搜尋：從idx_order_time由新到舊走訪時間範圍內的訂單，以(Order_ID, Meal_ID)索引確認有符合的餐點
+SQL_SEARCH_ORDERS_BY_TIME_AND_MEALS = """
+SELECT OID, Time, TotalAmount, Status, ServingMethod, {archived} AS Archived FROM {orders} O
+WHERE Time >= ? AND Time < ?
+  AND EXISTS (SELECT 1 FROM {details} OD WHERE OD.Order_ID = O.OID AND OD.Meal_ID IN ({placeholders}))
+ORDER BY Time DESC, OID DESC LIMIT ?
+"""
+#依餐點搜尋：餐點的明細不多時改由(Meal_ID, Order_ID)索引取出全部明細，再以OID讀取訂單比對時間
+SQL_SEARCH_ORDERS_BY_MEAL_LINES = """
+SELECT DISTINCT O.OID, O.Time, O.TotalAmount, O.Status, O.ServingMethod, {archived} AS Archived
+FROM {details} OD CROSS JOIN {orders} O ON O.OID = OD.Order_ID
+WHERE OD.Meal_ID IN ({placeholders}) AND O.Time >= ? AND O.Time < ?
+ORDER BY O.Time DESC, O.OID DESC LIMIT ?
+"""
+#符合的餐點明細數(最多數到limit)
+SQL_COUNT_MEAL_LINES = "SELECT COUNT(*) FROM (SELECT 1 FROM {details} WHERE Meal_ID IN ({placeholders}) LIMIT ?)"
+SQL_SEARCH_ORDERS_BY_ID = """
+SELECT OID, Time, TotalAmount, Status, ServingMethod, {archived} AS Archived FROM {orders}
+WHERE OID IN ({placeholders})
+"""
+SQL_ORDER_HAS_MEALS = "SELECT 1 FROM {details} WHERE Order_ID = ? AND Meal_ID IN ({placeholders}) LIMIT 1"
+
+#銷售報表(只讀取統計表，依Day主鍵範圍查詢)
+SQL_SALES_DAILY = """
+SELECT Day, Orders, Revenue, Items FROM SalesDaily
+WHERE Day BETWEEN ? AND ?
+ORDER BY Day ASC
+"""
+
+SQL_SALES_HOURLY = """
+SELECT Hour, SUM(Orders) AS Orders, SUM(Revenue) AS Revenue FROM SalesHourly
+WHERE Day BETWEEN ? AND ?
+GROUP BY Hour ORDER BY Hour ASC
+"""
+
+SQL_SALES_BY_MEAL = """
+SELECT S.Meal_ID, COALESCE(M.Name, '(已刪除的餐點)') AS MealName,
+       SUM(S.Quantity) AS Quantity, SUM(S.Revenue) AS Revenue
+FROM SalesByMeal S
+LEFT JOIN Meal M ON M.MID = S.Meal_ID
+WHERE S.Day BETWEEN ? AND ?
+GROUP BY S.Meal_ID
+ORDER BY Revenue DESC
+"""
+
+SQL_SALES_BY_SERVING_METHOD = """
+SELECT ServingMethod, SUM(Orders) AS Orders, SUM(Revenue) AS Revenue FROM SalesByServingMethod
+WHERE Day BETWEEN ? AND ?
+GROUP BY ServingMethod ORDER BY ServingMethod ASC
+"""
+
+#分頁查詢(keyset/seek分頁)
+#記住上一頁最後一列的(排序欄位, 主鍵)當作游標，下一頁直接從索引中該位置往後找，不使用OFFSET，
+#因此翻到第幾頁的成本都一樣。排序欄位只接受白名單內的欄位，其他一律改用主鍵排序
+MAX_PAGE_SIZE = 200
+
+SQL_ORDERS_PAGE = 'SELECT OID, Time, TotalAmount, Status, ServingMethod FROM "Order"'
+ORDER_SORT_COLUMNS = ('OID', 'Time', 'TotalAmount')
+
+SQL_MEALS_PAGE = 'SELECT MID, Name, Price, PicName, IsAvailable, Category FROM Meal'
+MEAL_SORT_COLUMNS = ('MID', 'Name', 'Price')
+
+SQL_STAFF_PAGE = 'SELECT SID, Account, Class FROM Staff'
+STAFF_SORT_COLUMNS = ('SID', 'Account', 'Class')
+
+#組出一頁的查詢，回傳(SQL, 參數)；多查一筆用來判斷是否還有下一頁
+#after為上一頁的游標[排序欄位的值, 主鍵]
+def _keyset_query(select_sql: str, key: str, sort_by: str, descending: bool,
+                  conditions: List[str], params: List[Any],
+                  after: Optional[List[Any]], limit: int) -> Tuple[str, List[Any]]:
+    conditions = list(conditions)
+    params = list(params)
+    op = '<' if descending else '>'
+    direction = 'DESC' if descending else 'ASC'
+    if after is not None:
+        if sort_by == key:
+            conditions.append(f'{key} {op} ?')
+            params.append(after[1])
+        else:
+            #寫成 sort >= ? AND (...) 讓sqlite可以用排序欄位的索引做範圍搜尋
+            conditions.append(f'{sort_by} {op}= ? AND ({sort_by} {op} ? OR {key} {op} ?)')
+            params.extend([after[0], after[0], after[1]])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    order_by = f'{key} {direction}' if sort_by == key else f'{sort_by} {direction}, {key} {direction}'
+    params.append(limit + 1)
+    return f'{select_sql}{where} ORDER BY {order_by} LIMIT ?', params
+
+#執行分頁查詢，回傳 {'rows': [...], 'next': 下一頁游標或None}
+def _fetch_page(conn: sqlite3.Connection, select_sql: str, key: str, sort_by: str, descending: bool,
+                conditions: List[str], params: List[Any],
+                after: Optional[List[Any]], limit: int) -> Dict[str, Any]:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    sql, params = _keyset_query(select_sql, key, sort_by, descending, conditions, params, after, limit)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute(sql, params)]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = [rows[-1][sort_by], rows[-1][key]] if has_more else None
+    return {'rows': rows, 'next': next_cursor}
+
+#LIKE搜尋用：跳脫萬用字元
+def _like_pattern(text: str) -> str:
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+#資料庫是否有MealFTS(沒有編入FTS5的sqlite不會建立)，第一次搜尋時查詢一次
+_meal_fts: Optional[bool] = None
+
+def _reset_meal_fts():
+    global _meal_fts
+    _meal_fts = None
+
+def _has_meal_fts(conn: sqlite3.Connection) -> bool:
+    global _meal_fts
+    if _meal_fts is None:
+        _meal_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MealFTS'").fetchone() is not None
+    return _meal_fts
+
+#trigram索引只能搜尋3個字以上的片段
+FTS_MIN_LENGTH = 3
+
+#餐點名稱的搜尋條件(給Meal的WHERE使用)，回傳(條件, 參數)
+def _meal_search_condition(conn: sqlite3.Connection, text: str) -> Tuple[str, List[Any]]:
+    if len(text) >= FTS_MIN_LENGTH and _has_meal_fts(conn):
+        #整段當成一個片語，避免搜尋字串中的FTS語法字元
+        return 'MID IN (SELECT rowid FROM MealFTS WHERE MealFTS MATCH ?)', ['"' + text.replace('"', '""') + '"']
+    return "Name LIKE ? ESCAPE '\\'", [_like_pattern(text)]
+
+#公開查詢與EXPLAIN時使用的範例參數
+QUERY_PLAN_CHECKS: Dict[str, Tuple[str, tuple]] = {
+    'login': (SQL_LOGIN, ('demo', 'demo')),
+    'get_all_staff': (SQL_ALL_STAFF, ()),
+    'get_all_meals': (SQL_ALL_MEALS, ()),
+    'get_all_orders': (SQL_PENDING_ORDERS, ()),
+    'get_order_details': (SQL_ORDER_DETAILS, (1,)),
+    'get_pending_order_lines': (SQL_PENDING_ORDER_LINES, ()),
+    'get_order_details_many': (SQL_ORDER_DETAILS_MANY.format(placeholders='?,?,?'), (1, 2, 3)),
+    'update_order_status': (SQL_UPDATE_ORDER_STATUS, ('Completed', 1)),
+    'update_order_status_many': (SQL_ORDERS_TO_CHANGE.format(placeholders='?,?,?'), (1, 2, 3, 'Completed')),
+    'read_changes': (SQL_READ_CHANGES, (0, 500)),
+    'get_session': (SQL_GET_SESSION, ('session', '2024-01-01 00:00:00')),
+    'submit_full_order_prices': (SQL_MEAL_PRICES.format(placeholders='?,?,?'), (1, 2, 3)),
+    'archive_completed_orders': (SQL_ARCHIVABLE_ORDERS, ('2024-01-01 00:00:00', 500)),
+    'get_order_history': (SQL_ORDER_HISTORY, ('2024-01-01 00:00:00', '2024-02-01 00:00:00', 200)),
+    'get_history_order': (SQL_HISTORY_ORDER, (1,)),
+    'get_history_order_details': (SQL_HISTORY_ORDER_DETAILS, (1,)),
+    'search_orders_by_time': (SQL_SEARCH_ORDERS_BY_TIME.format(orders='"Order"', archived=0),
+                              ('2024-01-01 00:00:00', '2024-02-01 00:00:00', 50)),
+    'search_orders_by_time_and_meals': (SQL_SEARCH_ORDERS_BY_TIME_AND_MEALS.format(
+        orders='"Order"', details='OrderDetail', archived=0, placeholders='?,?'),
+        ('2024-01-01 00:00:00', '2024-02-01 00:00:00', 1, 2, 50)),
+    'search_orders_by_meal_lines': (SQL_SEARCH_ORDERS_BY_MEAL_LINES.format(
+        orders='"Order"', details='OrderDetail', archived=0, placeholders='?,?'),
+        (1, 2, '2024-01-01 00:00:00', '2024-02-01 00:00:00', 50)),
+    'search_orders_by_meal_lines_archive': (SQL_SEARCH_ORDERS_BY_MEAL_LINES.format(
+        orders='OrderArchive', details='OrderDetailArchive', archived=1, placeholders='?,?'),
+        (1, 2, '2024-01-01 00:00:00', '2024-02-01 00:00:00', 50)),
+    'count_meal_lines': (SQL_COUNT_MEAL_LINES.format(details='OrderDetail', placeholders='?,?'), (1, 2, 5000)),
+    'get_orders_page': _keyset_query(SQL_ORDERS_PAGE, 'OID', 'Time', False, ['Status = ?'], ['Preparing'],
+                                     ['2024-01-01 00:00:00', 1], 20),
+    'get_meals_page': _keyset_query(SQL_MEALS_PAGE, 'MID', 'Name', False, [], [], ['a', 1], 20),
+    'get_staff_page': _keyset_query(SQL_STAFF_PAGE, 'SID', 'Account', False, [], [], ['a', 1], 20),
+    'sales_daily': (SQL_SALES_DAILY, ('2024-01-01', '2024-01-31')),
+    'sales_hourly': (SQL_SALES_HOURLY, ('2024-01-01', '2024-01-31')),
+    'sales_by_meal': (SQL_SALES_BY_MEAL, ('2024-01-01', '2024-01-31')),
+    'sales_by_serving_method': (SQL_SALES_BY_SERVING_METHOD, ('2024-01-01', '2024-01-31')),
+}
+
+#回傳每個公開查詢的EXPLAIN QUERY PLAN結果 {查詢名稱: [計畫說明, ...]}
+#本來就要回傳整張表的查詢(全部員工/餐點)會是SCAN，其餘應該都是SEARCH
+def explain_query_plans() -> Dict[str, List[str]]:
+    plans: Dict[str, List[str]] = {}
+    with db_connection() as conn:
+        for name, (sql, params) in QUERY_PLAN_CHECKS.items():
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plans[name] = [row[3] for row in rows]
+    return plans
+
+#建立所有需要的資料表(執行所有尚未套用的遷移)
+def create_tables(conn):
+    version = migrate(conn)
+    print(f"所有資料表已成功建立或已存在。(schema版本 {version})")
 
 #核心初始化函式
 def initialize_database():
     """
     初始化資料庫：連線、建表、插入預設資料。
     """
-    conn = get_db_connection()
-    if conn:
-        create_tables(conn)         # 使用連線物件建表
-        #insert_default_data(conn)   # 使用連線物件插入資料
-        conn.close()
+    try:
+        with db_connection() as conn:
+            create_tables(conn)         # 使用連線物件建表
+            #insert_default_data(conn)   # 使用連線物件插入資料
         print(f"資料庫初始化完成，檔案名: {DB}")
-    else:
-        print("無法建立資料庫連線，初始化失敗。")
+    except sqlite3.Error as e:
+        _log_error(f"無法建立資料庫連線，初始化失敗: {e}")
 
 #員工登入驗證
 def login(account: str, password: str) -> Optional[tuple]:
@@ -88,385 +849,1111 @@ def login(account: str, password: str) -> Optional[tuple]:
     透過帳號和密碼驗證員工，成功則回傳員工資料 (SID, Account, Class)。
     如果失敗或發生錯誤，返回 None。
     """
-    conn = get_db_connection()
-    if conn is None:
-        return None
-        
     try:
-        query = "SELECT SID, Account, Class FROM Staff WHERE Account = ? AND Password = ?"
-        cursor = conn.execute(query, (account, password))
+        with db_connection() as conn:
+            cursor = conn.execute(SQL_LOGIN, (account, password))
 
-        #獲取單一結果，因為是Unique
-        staff_data = cursor.fetchone()
-        
-        if staff_data:
-            return staff_data
-        
-        return None
+            #獲取單一結果，因為是Unique
+            staff_data = cursor.fetchone()
+            
+            if staff_data:
+                return staff_data
+            
+            return None
     
     except sqlite3.Error as e:
-        print(f"查詢 Staff 資料時發生錯誤: {e}")
+        _log_error(f"查詢 Staff 資料時發生錯誤: {e}")
         return None
-    
-    finally:
-        conn.close()
 
 #新增員工用
 def insert_staff(account: str, password: str, staff_class: str):
-    conn = get_db_connection()
-    if conn is None:
-        return 
-
     try:
-        #檢查帳號是否已存在，避免重複插入導致錯誤
-        check_query = "SELECT COUNT(*) FROM Staff WHERE Account = ?"
-        cursor = conn.execute(check_query, (account,))
-        if cursor.fetchone()[0] > 0:
-            print(f"員工帳號 '{account}' 已存在，跳過新增。")
-            return
-            
-        #插入資料
-        insert_query = """
-        INSERT INTO Staff (Account, Password, Class) 
-        VALUES (?, ?, ?)
-        """
-        conn.execute(insert_query, (account, password, staff_class))
-        conn.commit()
-        print(f"成功新增帳號：{account}")
-        return True
-
-    except sqlite3.Error as e:
-        print(f"新增員工資料時發生錯誤: {e}")
-        return
+        with db_connection() as conn:
+            #檢查帳號是否已存在，避免重複插入導致錯誤
+            check_query = "SELECT COUNT(*) FROM Staff WHERE Account = ?"
+            cursor = conn.execute(check_query, (account,))
+            if cursor.fetchone()[0] > 0:
+                print(f"員工帳號 '{account}' 已存在，跳過新增。")
+                return
+                
+            #插入資料
+            insert_query = """
+            INSERT INTO Staff (Account, Password, Class) 
+            VALUES (?, ?, ?)
+            """
+            conn.execute(insert_query, (account, password, staff_class))
+            conn.commit()
+            print(f"成功新增帳號：{account}")
+            return True
 
-    finally:
-        if conn:
-            conn.close()
+    except sqlite3.Error as e:
+        _log_error(f"新增員工資料時發生錯誤: {e}")
+        return
 
 #修改員工密碼用
 def update_password(account: str, new_password: str) -> bool:
-    conn = get_db_connection()
-    if conn is None:
-        return False
-    
     try:
-        query = """
-        UPDATE Staff SET Password = ?
-        WHERE Account = ?
-        """
-        cursor = conn.execute(query, (new_password, account))
-        conn.commit()
-        
-        #檢查是否有行被更新(Row count > 0)
-        return cursor.rowcount > 0 
+        with db_connection() as conn:
+            query = """
+            UPDATE Staff SET Password = ?
+            WHERE Account = ?
+            """
+            cursor = conn.execute(query, (new_password, account))
+            conn.commit()
+            
+            #檢查是否有行被更新(Row count > 0)
+            return cursor.rowcount > 0 
         
     except sqlite3.Error as e:
-        print(f"更新員工 {account} 密碼時發生錯誤: {e}")
+        _log_error(f"更新員工 {account} 密碼時發生錯誤: {e}")
         return False
-        
-    finally:
-        if conn:
-            conn.close()
 
 #刪除員工用
 def delete_staff(account: str) -> bool:
-    conn = get_db_connection()
-    if conn is None:
-        return False
-    
     try:
-        query = "DELETE FROM Staff WHERE Account = ?"
-        cursor = conn.execute(query, (account,))
-        conn.commit()
-        
-        #檢查是否有行被刪除
-        return cursor.rowcount > 0 
+        with db_connection() as conn:
+            query = "DELETE FROM Staff WHERE Account = ?"
+            cursor = conn.execute(query, (account,))
+            #被刪除的帳號同時登出(所有worker)
+            conn.execute("DELETE FROM Session WHERE Account = ?", (account,))
+            _log_change(conn, 'session', {'account': account})
+            conn.commit()
+            
+            #檢查是否有行被刪除
+            return cursor.rowcount > 0 
         
     except sqlite3.Error as e:
-        print(f"刪除員工帳號 {account} 時發生錯誤: {e}")
+        _log_error(f"刪除員工帳號 {account} 時發生錯誤: {e}")
         return False
-        
-    finally:
-        if conn:
-            conn.close()
 
 #查詢所有員工的清單並回傳
 def get_all_staff() -> List[Dict]:
-    conn = get_db_connection()
-    if conn is None: return []
-    #設置row_factory確保返回字典格式，方便NiceGUI表格使用
-    conn.row_factory = sqlite3.Row 
-    try:
-        #查詢不包括密碼
-        query = "SELECT SID, Account, Class FROM Staff ORDER BY SID ASC"
-        cursor = conn.execute(query)
-        return [dict(row) for row in cursor.fetchall()]
+    try:
+        with db_connection() as conn:
+            #設置row_factory確保返回字典格式，方便NiceGUI表格使用
+            conn.row_factory = sqlite3.Row 
+            #查詢不包括密碼
+            cursor = conn.execute(SQL_ALL_STAFF)
+            return [dict(row) for row in cursor.fetchall()]
     
     except sqlite3.Error as e:
-        print(f"查詢所有員工時發生錯誤: {e}")
+        _log_error(f"查詢所有員工時發生錯誤: {e}")
         return []
-    
-    finally: 
-        if conn: 
-            conn.close()
+
+#分頁查詢員工，search為帳號關鍵字，staff_class為'Manager'/'Staff'(None為全部)
+def get_staff_page(sort_by: str = 'SID', descending: bool = False, after: Optional[List[Any]] = None,
+                   limit: int = 20, search: Optional[str] = None, staff_class: Optional[str] = None) -> Dict[str, Any]:
+    if sort_by not in STAFF_SORT_COLUMNS:
+        sort_by = 'SID'
+    conditions: List[str] = []
+    params: List[Any] = []
+    if search:
+        conditions.append("Account LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(search))
+    if staff_class:
+        conditions.append('Class = ?')
+        params.append(staff_class)
+    try:
+        with db_connection() as conn:
+            return _fetch_page(conn, SQL_STAFF_PAGE, 'SID', sort_by, descending, conditions, params, after, limit)
+
+    except sqlite3.Error as e:
+        _log_error(f"分頁查詢員工時發生錯誤: {e}")
+        return {'rows': [], 'next': None}
 
 #新增餐點用
-def insert_meal(name: str, price: int, picname: str, is_available: bool) -> Optional[int]:
-    conn = get_db_connection()
-    if conn is None: 
-        return None
-    
+def insert_meal(name: str, price: int, picname: str, is_available: bool,
+                category: str = DEFAULT_MEAL_CATEGORY) -> Optional[int]:
     #將Python bool轉換為SQL的0或1
     sql_is_available = 1 if is_available else 0
     
     try:
-        #檢查餐點名稱是否重複
-        check_query = "SELECT COUNT(*) FROM Meal WHERE Name = ?"
-        if conn.execute(check_query, (name,)).fetchone()[0] > 0:
-            print(f"餐點名稱 '{name}' 已存在，新增失敗。")
-            return None
+        with db_connection() as conn:
+            #檢查餐點名稱是否重複
+            check_query = "SELECT COUNT(*) FROM Meal WHERE Name = ?"
+            if conn.execute(check_query, (name,)).fetchone()[0] > 0:
+                print(f"餐點名稱 '{name}' 已存在，新增失敗。")
+                return None
 
-        #插入新的餐點
-        query = "INSERT INTO Meal (Name, Price, Picname, IsAvailable) VALUES (?, ?, ?, ?)"
-        cursor = conn.execute(query, (name, price, picname, sql_is_available))
-        conn.commit()
-        return cursor.lastrowid
+            #插入新的餐點
+            query = "INSERT INTO Meal (Name, Price, Picname, IsAvailable, Category) VALUES (?, ?, ?, ?, ?)"
+            cursor = conn.execute(query, (name, price, picname, sql_is_available, category or DEFAULT_MEAL_CATEGORY))
+            _log_change(conn, 'menu')
+            conn.commit()
+            _menu_cache.invalidate()
+            return cursor.lastrowid
         
     except sqlite3.Error as e:
-        print(f"新增餐點 {name} 時發生錯誤: {e}")
+        _log_error(f"新增餐點 {name} 時發生錯誤: {e}")
         return None
-        
-    finally:
-        if conn: 
-            conn.close()
 
 #修改餐點用
-def update_meal(mid: int, name: str, price: int, picname: str, is_available: bool) -> bool:
-    conn = get_db_connection()
-    if conn is None: 
-        return False
-    
+#category為None時不修改分類
+def update_meal(mid: int, name: str, price: int, picname: str, is_available: bool,
+                category: Optional[str] = None) -> bool:
     #將Python bool轉換為SQL的0或1
     sql_is_available = 1 if is_available else 0
     
     try:
-        query = """
-        UPDATE Meal SET Name = ?, Price = ?, Picname = ?, IsAvailable = ?
-        WHERE MID = ?
-        """
-        cursor = conn.execute(query, (name, price, picname, sql_is_available, mid))
-        conn.commit()
+        with db_connection() as conn:
+            query = """
+            UPDATE Meal SET Name = ?, Price = ?, Picname = ?, IsAvailable = ?, Category = COALESCE(?, Category)
+            WHERE MID = ?
+            """
+            cursor = conn.execute(query, (name, price, picname, sql_is_available, category or None, mid))
+            _log_change(conn, 'menu')
+            conn.commit()
+            _menu_cache.invalidate()
 
-        #檢查是否有行被更新(Row count > 0)
-        return cursor.rowcount > 0
+            #檢查是否有行被更新(Row count > 0)
+            return cursor.rowcount > 0
         
     except sqlite3.Error as e:
-        print(f"更新餐點 ID {mid} 時發生錯誤: {e}")
+        _log_error(f"更新餐點 ID {mid} 時發生錯誤: {e}")
         return False
-        
-    finally:
-        if conn: 
-            conn.close()
 
 #刪除餐點用
 def delete_meal(mid: int) -> bool:
-    conn = get_db_connection()
-    if conn is None: 
-        return False
-    
     try:
-        query = "DELETE FROM Meal WHERE MID = ?"
-        cursor = conn.execute(query, (mid,))
-        conn.commit()
+        with db_connection() as conn:
+            query = "DELETE FROM Meal WHERE MID = ?"
+            cursor = conn.execute(query, (mid,))
+            _log_change(conn, 'menu')
+            conn.commit()
+            _menu_cache.invalidate()
 
-        #檢查是否有行被刪除
-        return cursor.rowcount > 0
+            #檢查是否有行被刪除
+            return cursor.rowcount > 0
         
     except sqlite3.Error as e:
-        print(f"刪除餐點 ID {mid} 時發生錯誤: {e}")
+        _log_error(f"刪除餐點 ID {mid} 時發生錯誤: {e}")
         return False
+
+#從資料庫讀取所有餐點(不經過快取)，失敗時回傳None
+def _load_all_meals() -> Optional[List[Dict]]:
+    try:
+        with db_connection() as conn:
+            #設置row_factory確保返回字典格式，方便NiceGUI表格使用
+            conn.row_factory = sqlite3.Row 
+            #查詢所有欄位
+            cursor = conn.execute(SQL_ALL_MEALS)
+            meal_list = [dict(row) for row in cursor.fetchall()]
+            for meal in meal_list:
+                #將0/1轉換為True/False
+                meal['IsAvailable'] = bool(meal['IsAvailable'])
+            return meal_list
         
-    finally:
-        if conn: 
-            conn.close()
+    except sqlite3.Error as e:
+        _log_error(f"查詢所有餐點時發生錯誤: {e}")
+        return None
+
+#菜單快取：菜單很少變動，讀取時直接回傳記憶體中的資料
+#每次invalidate都會讓版本號+1，查詢期間版本變了就不寫回快取，避免舊資料蓋掉新資料
+class MenuCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._meals: Optional[List[Dict]] = None
+        self._available: Optional[List[Dict]] = None
+        #可販售餐點依分類分組 {分類: [餐點, ...]}，依MEAL_CATEGORIES排序，第一次用到時才建立
+        self._by_category: Optional[Dict[str, List[Dict]]] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    #取得(全部餐點, 可販售餐點)，快取失效時才查詢資料庫
+    def get(self) -> Tuple[List[Dict], List[Dict]]:
+        with self._lock:
+            if self._meals is not None:
+                self.hits += 1
+                return self._meals, self._available
+            self.misses += 1
+            version = self._version
+
+        meals = _load_all_meals()
+        if meals is None:
+            return [], []
+        available = [meal for meal in meals if meal['IsAvailable']]
+
+        with self._lock:
+            if self._version == version:
+                self._meals, self._available = meals, available
+        return meals, available
+
+    #取得依分類分組的可販售餐點
+    def get_by_category(self) -> Dict[str, List[Dict]]:
+        _, available = self.get()
+        with self._lock:
+            if self._by_category is not None and self._available is available:
+                return self._by_category
+
+        grouped: Dict[str, List[Dict]] = {}
+        for meal in available:
+            grouped.setdefault(meal['Category'] or DEFAULT_MEAL_CATEGORY, []).append(meal)
+        order = {category: i for i, category in enumerate(MEAL_CATEGORIES)}
+        by_category = {category: grouped[category]
+                       for category in sorted(grouped, key=lambda c: (order.get(c, len(order)), c))}
+
+        with self._lock:
+            if self._available is available:
+                self._by_category = by_category
+        return by_category
+
+    #餐點被新增/修改/刪除後呼叫
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._meals = None
+            self._available = None
+            self._by_category = None
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self._version,
+                'cached': self._meals is not None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
 
-#查詢所有餐點的清單並回傳
+_menu_cache = MenuCache()
+
+#清除菜單快取(餐點資料在其他地方被修改時使用)
+def invalidate_menu_cache():
+    _menu_cache.invalidate()
+
+#回傳菜單快取的命中/未命中統計
+def get_menu_cache_stats() -> Dict[str, Any]:
+    return _menu_cache.stats()
+
+#查詢所有餐點的清單並回傳(回傳複本，呼叫端可自由修改)
 def get_all_meals() -> List[Dict]:
-    conn = get_db_connection()
-    if conn is None: return []
-    #設置row_factory確保返回字典格式，方便NiceGUI表格使用
-    conn.row_factory = sqlite3.Row 
-    
+    meals, _ = _menu_cache.get()
+    return [dict(meal) for meal in meals]
+
+#查詢可販售(IsAvailable)的餐點清單並回傳
+def get_available_meals() -> List[Dict]:
+    _, available = _menu_cache.get()
+    return [dict(meal) for meal in available]
+
+#點餐頁的分類清單 [{'Category': 分類, 'Count': 可販售餐點數}, ...]
+def get_menu_categories() -> List[Dict]:
+    return [{'Category': category, 'Count': len(meals)}
+            for category, meals in _menu_cache.get_by_category().items()]
+
+#點餐頁一次顯示的餐點數
+MENU_PAGE_SIZE = 12
+
+#點餐頁的一頁餐點(從菜單快取切出，不查詢資料庫)，category為None時為全部分類
+#回傳 {'meals': [...], 'page': 頁碼, 'pages': 總頁數, 'total': 餐點數}
+def get_menu_page(category: Optional[str] = None, page: int = 1, page_size: int = MENU_PAGE_SIZE) -> Dict[str, Any]:
+    if category is None:
+        _, meals = _menu_cache.get()
+    else:
+        meals = _menu_cache.get_by_category().get(category, [])
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    pages = max(1, -(-len(meals) // page_size))
+    page = max(1, min(page, pages))
+    start = (page - 1) * page_size
+    return {
+        'meals': [dict(meal) for meal in meals[start:start + page_size]],
+        'page': page,
+        'pages': pages,
+        'total': len(meals),
+    }
+
+#分頁查詢餐點，search為名稱關鍵字，available_only只列出販售中的餐點
+def get_meals_page(sort_by: str = 'MID', descending: bool = False, after: Optional[List[Any]] = None,
+                   limit: int = 20, search: Optional[str] = None, available_only: bool = False) -> Dict[str, Any]:
+    if sort_by not in MEAL_SORT_COLUMNS:
+        sort_by = 'MID'
+    conditions: List[str] = []
+    params: List[Any] = []
+    if available_only:
+        conditions.append('IsAvailable = 1')
     try:
-        #查詢所有欄位
-        query = "SELECT MID, Name, Price, PicName, IsAvailable FROM Meal ORDER BY MID ASC"
-        cursor = conn.execute(query)
-        meal_list = [dict(row) for row in cursor.fetchall()]
-        for meal in meal_list:
-            #將0/1轉換為True/False
+        with db_connection() as conn:
+            if search:
+                condition, search_params = _meal_search_condition(conn, search)
+                conditions.append(condition)
+                params.extend(search_params)
+            page = _fetch_page(conn, SQL_MEALS_PAGE, 'MID', sort_by, descending, conditions, params, after, limit)
+        for meal in page['rows']:
+            #與get_all_meals一致，將0/1轉換為True/False
             meal['IsAvailable'] = bool(meal['IsAvailable'])
-        return meal_list
-        
+        return page
+
     except sqlite3.Error as e:
-        print(f"查詢所有餐點時發生錯誤: {e}")
-        return []
-        
-    finally:
-        if conn: conn.close()
+        _log_error(f"分頁查詢餐點時發生錯誤: {e}")
+        return {'rows': [], 'next': None}
 
 #建立訂單
 def create_order(total_amount: int, serving_method: str, status: str = 'Preparing') -> Optional[int]:
-    conn = get_db_connection()
-    if conn is None: return None
-    
     #確保金額為整數
     total_amount_int = int(round(total_amount)) 
     
     try:
-        query = """
-        INSERT INTO "Order" (Time, TotalAmount, Status, ServingMethod) 
-        VALUES (DATETIME('now', 'localtime'), ?, ?, ?)
-        """
-        cursor = conn.execute(query, (total_amount_int, status, serving_method))
-        conn.commit()
-        return cursor.lastrowid
+        with db_connection() as conn:
+            query = """
+            INSERT INTO "Order" (Time, TotalAmount, Status, ServingMethod) 
+            VALUES (DATETIME('now', 'localtime'), ?, ?, ?)
+            """
+            cursor = conn.execute(query, (total_amount_int, status, serving_method))
+            conn.commit()
+            return cursor.lastrowid
         
     except sqlite3.Error as e:
-        print(f"建立訂單時發生錯誤: {e}")
+        _log_error(f"建立訂單時發生錯誤: {e}")
         return None
-        
-    finally:
-        if conn: 
-            conn.close()
 
 #新增訂單明細，成功時回傳True，失敗False
 def insert_order_detail(oid: int, mid: int, quantity: int, price_at_order: int, total: int) -> bool:
-    conn = get_db_connection()
-    if conn is None: return False
-    
     try:
-        query = """
-        INSERT INTO OrderDetail (Order_ID, Meal_ID, Quantity, PriceAtOrder, Total) 
-        VALUES (?, ?, ?, ?, ?)
-        """
-        conn.execute(query, (oid, mid, quantity, price_at_order, total))
-        conn.commit()
-        return True
+        with db_connection() as conn:
+            query = """
+            INSERT INTO OrderDetail (Order_ID, Meal_ID, Quantity, PriceAtOrder, Total) 
+            VALUES (?, ?, ?, ?, ?)
+            """
+            conn.execute(query, (oid, mid, quantity, price_at_order, total))
+            conn.commit()
+            return True
         
     except sqlite3.Error as e:
-        print(f"新增訂單明細 OID:{oid}, MID:{mid} 時發生錯誤: {e}")
+        _log_error(f"新增訂單明細 OID:{oid}, MID:{mid} 時發生錯誤: {e}")
         return False
-        
-    finally:
-        if conn: 
-            conn.close()
 
-#執行完整交易
-def submit_full_order(items: List[Dict[str, Any]], serving_method: str) -> Optional[int]:
+#送出的價格與資料庫目前的價格不同，或有餐點已停售時由_price_items拋出，訂單不會寫入
+#check與reprice_cart的回傳值格式相同，queue_order/submit_full_order直接把它當成結果回傳給呼叫端
+class PriceChangedError(ValueError):
+    def __init__(self, check: Dict[str, Any]):
+        super().__init__(f"有 {len(check['changes'])} 項餐點價格變動、{len(check['removed'])} 項已停售，取消提交。")
+        self.check = check
+
+#依prices({MID: 目前單價}，不含已停售的餐點)比對購物車中的價格
+#回傳 {'items': 以目前價格重算的品項, 'changes': [價格有變動的品項], 'removed': [已停售的品項], 'total': 總金額}
+def _compare_prices(items: List[Dict[str, Any]], prices: Dict[int, int]) -> Dict[str, Any]:
+    repriced: List[Dict[str, Any]] = []
+    changes: List[Dict[str, Any]] = []
+    removed: List[Dict[str, Any]] = []
+    for item in items:
+        price = prices.get(item['mid'])
+        if price is None:
+            removed.append({'mid': item['mid'], 'name': item.get('name')})
+            continue
+        #沒有帶價格的品項(例如內部批次寫入)直接使用目前價格
+        old_price = int(round(item['price'])) if item.get('price') is not None else price
+        if price != old_price:
+            changes.append({'mid': item['mid'], 'name': item.get('name'),
+                            'old_price': old_price, 'new_price': price})
+        repriced.append({**item, 'price': price, 'total': price * item['quantity']})
+    return {
+        'items': repriced,
+        'changes': changes,
+        'removed': removed,
+        'total': sum(item['total'] for item in repriced),
+    }
+
+#依資料庫中目前的價格計價(不使用前端送來的total)
+#回傳 [(mid, 餐點名稱, 數量, 單價, 小計), ...]
+#送出的價格與資料庫不同或餐點不存在、停售時raise PriceChangedError，數量無效時raise ValueError
+def _price_items(conn: sqlite3.Connection, items: List[Dict[str, Any]]) -> List[Tuple[int, str, int, int, int]]:
+    mids = list(dict.fromkeys(item['mid'] for item in items))
+    placeholders = ','.join('?' * len(mids))
+    meals = {row[0]: row for row in conn.execute(SQL_MEAL_PRICES.format(placeholders=placeholders), mids)}
+
+    for item in items:
+        if int(item['quantity']) <= 0:
+            raise ValueError(f"餐點 {item.get('name') or item['mid']} 的數量無效，取消提交。")
+    check = _compare_prices(items, {mid: int(round(meal[2])) for mid, meal in meals.items() if meal[3]})
+    if check['changes'] or check['removed']:
+        raise PriceChangedError(check)
+
+    lines = []
+    for item in items:
+        meal = meals[item['mid']]
+        quantity = int(item['quantity'])
+        price = int(round(meal[2]))
+        lines.append((meal[0], meal[1], quantity, price, price * quantity))
+    return lines
+
+#在既有交易中寫入一筆訂單(Order + 全部OrderDetail)，不自行commit
+#每個品項都在同一個交易中與資料庫價格比對，TotalAmount由伺服器計算
+#回傳commit後要發布的'created'事件(內含OID)
+def _insert_order(conn: sqlite3.Connection, items: List[Dict[str, Any]], serving_method: str) -> OrderEvent:
+    lines = _price_items(conn, items)
     #計算總金額
-    total_amount = sum(item['total'] for item in items)
+    total_amount = sum(line[4] for line in lines)
     if total_amount <= 0:
-        print("訂單總金額為零或負數，取消提交。")
-        return None
-        
+        raise ValueError("訂單總金額為零或負數，取消提交。")
+
+    #與DATETIME('now', 'localtime')相同格式，在Python端產生才能直接放進事件
+    order_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
     #建立Order的紀錄
-    oid = create_order(total_amount, serving_method)
-    if oid is None:
-        return None 
+    cursor = conn.execute("""
+    INSERT INTO "Order" (Time, TotalAmount, Status, ServingMethod) 
+    VALUES (?, ?, 'Preparing', ?)
+    """, (order_time, total_amount, serving_method))
+    oid = cursor.lastrowid
 
-    #建立OrderDetail的記錄
-    details_success = True
-    for item in items:
-        #(oid, mid, quantity, price_at_order, total)，參數對應要看一下
-        if not insert_order_detail(
-            oid,                #Order_ID
-            item['mid'],        #Meal_ID
-            item['quantity'],   #Quantity
-            item['price'],      #PriceAtOrder
-            item['total']       #Total
-        ):
-            details_success = False
-            
-    if not details_success:
-        print(f"WARNING: OID {oid} 明細部分寫入失敗。")
-        
-    return oid
+    #一次executemany寫入所有OrderDetail
+    #(oid, mid, quantity, price_at_order, total)
+    conn.executemany("""
+    INSERT INTO OrderDetail (Order_ID, Meal_ID, Quantity, PriceAtOrder, Total) 
+    VALUES (?, ?, ?, ?, ?)
+    """, [(oid, mid, quantity, price, total) for mid, _, quantity, price, total in lines])
+
+    event: OrderEvent = {
+        'type': 'created',
+        'order': {
+            'OID': oid,
+            'Time': order_time,
+            'TotalAmount': total_amount,
+            'Status': 'Preparing',
+            'ServingMethod': serving_method,
+        },
+        'details': [{
+            'Meal_ID': mid,
+            'MealName': name,
+            'Quantity': quantity,
+            'PriceAtOrder': price,
+            'Total': total,
+        } for mid, name, quantity, price, total in lines],
+    }
+    _log_change(conn, 'order', event)
+    return event
+
+#結帳前用記憶體中的菜單重新計價購物車(不查詢資料庫)，讓畫面在送出前顯示價格變動
+#回傳 {'items': 以目前價格重算的品項, 'changes': [價格有變動的品項], 'removed': [已停售的品項], 'total': 總金額}
+#送出時_insert_order仍會在交易中再次與資料庫價格比對
+def reprice_cart(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    _, available = _menu_cache.get()
+    return _compare_prices(items, {meal['MID']: int(round(meal['Price'])) for meal in available})
+
+#寫入佇列的operation：寫入一筆訂單，回傳(OID, 'created'事件)
+def _order_operation(conn: sqlite3.Connection, items: List[Dict[str, Any]], serving_method: str) -> Tuple[int, OrderEvent]:
+    event = _insert_order(conn, items, serving_method)
+    return event['order']['OID'], event
+
+#寫入佇列的operation：更新訂單狀態，回傳(是否有變更, 'status'事件或None)
+def _status_operation(conn: sqlite3.Connection, oid: int, new_status: str) -> Tuple[bool, Optional[OrderEvent]]:
+    if conn.execute(SQL_UPDATE_ORDER_STATUS, (new_status, oid)).rowcount == 0:
+        return False, None
+    event: OrderEvent = {'type': 'status', 'oids': [oid], 'status': new_status}
+    _log_change(conn, 'order', event)
+    return True, event
+
+#寫入佇列的operation：批次更新訂單狀態，回傳(實際變更的OID清單, 一個包含所有OID的'status'事件或None)
+#OID超過STATUS_BATCH_SIZE筆時分段查詢/更新，但都在同一個交易中
+STATUS_BATCH_SIZE = 500
+
+def _status_many_operation(conn: sqlite3.Connection, oids: List[int], new_status: str) -> Tuple[List[int], Optional[OrderEvent]]:
+    changed: List[int] = []
+    for start in range(0, len(oids), STATUS_BATCH_SIZE):
+        batch = oids[start:start + STATUS_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        targets = [row[0] for row in conn.execute(SQL_ORDERS_TO_CHANGE.format(placeholders=placeholders),
+                                                  (*batch, new_status))]
+        if targets:
+            conn.execute(SQL_UPDATE_ORDER_STATUS_MANY.format(placeholders=','.join('?' * len(targets))),
+                         (new_status, *targets))
+            changed.extend(targets)
+    if not changed:
+        return [], None
+    event: OrderEvent = {'type': 'status', 'oids': changed, 'status': new_status}
+    _log_change(conn, 'order', event)
+    return changed, event
+
+#把寫入交給group commit寫入佇列；DB_GROUP_COMMIT=0時在目前執行緒以獨立交易寫入
+def _submit_write(operation: Operation, *args: Any) -> Future:
+    if GROUP_COMMIT:
+        return get_writer().submit(operation, *args)
+    future: Future = Future()
+    try:
+        with write_transaction() as conn:
+            result, event = operation(conn, *args)
+    except Exception as e:
+        future.set_exception(e)
+        return future
+    if event is not None:
+        order_bus.publish(event)
+    future.set_result(result)
+    return future
+
+#提交寫入並把寫入佇列的future轉成本模組慣用的回傳值：成功時為結果，失敗時印出錯誤並回傳failed
+#價格變動(PriceChangedError)時的結果為比對結果check，讓呼叫端顯示給客人確認
+#效能指標以function(呼叫端看到的函式名稱)記錄，時間從提交到future完成(包含排隊與commit)
+def _resolve_write(failed: Any, message: str, function: str, operation: Operation, *args: Any) -> Future:
+    resolved: Future = Future()
+    start = time.perf_counter()
+    write = _submit_write(operation, *args)
+
+    def done(future: Future):
+        result = failed
+        try:
+            result = future.result()
+            resolved.set_result(result)
+        except PriceChangedError as e:
+            result = e.check
+            resolved.set_result(result)
+        except ValueError as e:
+            print(e)
+            resolved.set_result(failed)
+        except sqlite3.Error as e:
+            _log_error(f"{message}: {e}", function)
+            resolved.set_result(failed)
+        except Exception as e:
+            if metrics.is_enabled():
+                metrics.record_call(function, time.perf_counter() - start, failed=True)
+            resolved.set_exception(e)
+            return
+        if metrics.is_enabled():
+            metrics.record_call(function, time.perf_counter() - start, result=result)
+
+    write.add_done_callback(done)
+    return resolved
+
+#提交一筆訂單到寫入佇列，回傳的future完成時為OID(失敗時為None)
+#送出的價格與資料庫不同或餐點已停售時不寫入，future的結果為與reprice_cart相同格式的比對結果
+#同時間送出的訂單會合併在同一個交易commit，每筆訂單各自使用SAVEPOINT，失敗時Order與OrderDetail一起rollback
+def queue_order(items: List[Dict[str, Any]], serving_method: str) -> Future:
+    if not items:
+        print("訂單沒有任何餐點，取消提交。")
+        future: Future = Future()
+        future.set_result(None)
+        return future
+    return _resolve_write(None, "提交訂單時發生錯誤，已全部rollback", 'submit_full_order',
+                          _order_operation, items, serving_method)
+
+#執行完整交易(等待寫入佇列commit)，回傳OID，價格變動時回傳比對結果(dict)，失敗時回傳None
+def submit_full_order(items: List[Dict[str, Any]], serving_method: str) -> Union[int, Dict[str, Any], None]:
+    return queue_order(items, serving_method).result()
+
+#一次提交多筆訂單(例如點餐機佇列)，全部在同一個交易中commit
+#每筆訂單各自使用SAVEPOINT，單筆失敗只會回傳None，不影響其他訂單
+def submit_orders_bulk(orders: List[Tuple[List[Dict[str, Any]], str]]) -> List[Optional[int]]:
+    results: List[Optional[int]] = []
+    events: List[OrderEvent] = []
+    try:
+        with write_transaction() as conn:
+            for items, serving_method in orders:
+                if not items:
+                    results.append(None)
+                    continue
+                conn.execute('SAVEPOINT bulk_order')
+                try:
+                    event = _insert_order(conn, items, serving_method)
+                    conn.execute('RELEASE bulk_order')
+                    events.append(event)
+                    results.append(event['order']['OID'])
+                except (ValueError, sqlite3.Error) as e:
+                    conn.execute('ROLLBACK TO bulk_order')
+                    conn.execute('RELEASE bulk_order')
+                    _log_error(f"批次訂單中有一筆寫入失敗: {e}")
+                    results.append(None)
+        for event in events:
+            order_bus.publish(event)
+        return results
+
+    except sqlite3.Error as e:
+        _log_error(f"批次提交訂單時發生錯誤，已全部rollback: {e}")
+        return [None] * len(orders)
 
 #查詢所有訂單(Order)
 def get_all_orders() -> List[Dict]:
-    conn = get_db_connection()
-    if conn is None: return []
-    
-    conn.row_factory = sqlite3.Row 
-    
     try:
-        #查詢Order所有欄位
-        query = """
-        SELECT OID, Time, TotalAmount, Status, ServingMethod 
-        FROM "Order" 
-        WHERE Status = 'Preparing'  --只顯示準備中的訂單
-        ORDER BY Time ASC           --依時間從舊到新排序
-        """
-        cursor = conn.execute(query)
-        return [dict(row) for row in cursor.fetchall()]
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row 
+            #查詢Order所有欄位
+            cursor = conn.execute(SQL_PENDING_ORDERS)
+            return [dict(row) for row in cursor.fetchall()]
         
     except sqlite3.Error as e:
-        print(f"查詢所有訂單時發生錯誤: {e}")
+        _log_error(f"查詢所有訂單時發生錯誤: {e}")
         return []
-        
-    finally:
-        if conn: 
-            conn.close()
+
+#分頁查詢訂單(預設為準備中的訂單，依時間從舊到新)，serving_method為'DineIn'/'TakeOut'(None為全部)
+def get_orders_page(sort_by: str = 'Time', descending: bool = False, after: Optional[List[Any]] = None,
+                    limit: int = 20, status: str = 'Preparing', serving_method: Optional[str] = None) -> Dict[str, Any]:
+    if sort_by not in ORDER_SORT_COLUMNS:
+        sort_by = 'OID'
+    conditions = ['Status = ?']
+    params: List[Any] = [status]
+    if serving_method:
+        conditions.append('ServingMethod = ?')
+        params.append(serving_method)
+    try:
+        with db_connection() as conn:
+            return _fetch_page(conn, SQL_ORDERS_PAGE, 'OID', sort_by, descending, conditions, params, after, limit)
+
+    except sqlite3.Error as e:
+        _log_error(f"分頁查詢訂單時發生錯誤: {e}")
+        return {'rows': [], 'next': None}
 
 #用OID查詢訂單詳細(OrderDetail)
 def get_order_details(oid: int) -> List[Dict]:
-    conn = get_db_connection()
-    if conn is None: return []
-    
-    conn.row_factory = sqlite3.Row
-    
     try:
-        query = """
-        SELECT 
-            OD.Quantity, OD.Total, OD.PriceAtOrder, 
-            M.Name AS MealName
-        FROM OrderDetail OD
-        JOIN Meal M ON OD.Meal_ID = M.MID
-        WHERE OD.Order_ID = ?
-        """
-        cursor = conn.execute(query, (oid,))
-        return [dict(row) for row in cursor.fetchall()]
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(SQL_ORDER_DETAILS, (oid,))
+            return [dict(row) for row in cursor.fetchall()]
         
     except sqlite3.Error as e:
-        print(f"查詢訂單明細 OID:{oid} 時發生錯誤: {e}")
+        _log_error(f"查詢訂單明細 OID:{oid} 時發生錯誤: {e}")
         return []
+
+#查詢所有準備中訂單的品項 [{OID, Time, Meal_ID, MealName, Quantity}, ...]，失敗時回傳None
+def get_pending_order_lines() -> Optional[List[Dict]]:
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(SQL_PENDING_ORDER_LINES)]
+
+    except sqlite3.Error as e:
+        _log_error(f"查詢準備中訂單品項時發生錯誤: {e}")
+        return None
+
+#一次查詢多筆訂單的明細，回傳 {OID: [明細, ...]}
+#OID很多時分批查詢，避免超過sqlite的參數數量上限
+DETAILS_BATCH_SIZE = 500
+
+def get_order_details_many(oids: List[int]) -> Dict[int, List[Dict]]:
+    oids = list(dict.fromkeys(oids))
+    grouped: Dict[int, List[Dict]] = {oid: [] for oid in oids}
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            for start in range(0, len(oids), DETAILS_BATCH_SIZE):
+                batch = oids[start:start + DETAILS_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                cursor = conn.execute(SQL_ORDER_DETAILS_MANY.format(placeholders=placeholders), batch)
+                for row in cursor:
+                    detail = dict(row)
+                    grouped[detail.pop('Order_ID')].append(detail)
+        return grouped
         
-    finally:
-        if conn: 
-            conn.close()
+    except sqlite3.Error as e:
+        _log_error(f"批次查詢訂單明細時發生錯誤: {e}")
+        return {}
 
-#更新指定OID的訂單狀態
-def update_order_status(oid: int, new_status: str) -> bool:
-    conn = get_db_connection()
-    if conn is None: return False
-    
+#提交訂單狀態更新到寫入佇列，回傳的future完成時為是否有變更
+def queue_order_status(oid: int, new_status: str) -> Future:
     #檢查狀態是否有效
     if new_status not in ['Preparing', 'Completed']:
         print(f"無效的訂單狀態: {new_status}")
+        future: Future = Future()
+        future.set_result(False)
+        return future
+    return _resolve_write(False, f"更新訂單 OID:{oid} 狀態時發生錯誤", 'update_order_status',
+                          _status_operation, oid, new_status)
+
+#更新指定OID的訂單狀態(等待寫入佇列commit)
+def update_order_status(oid: int, new_status: str) -> bool:
+    return queue_order_status(oid, new_status).result()
+
+#提交批次訂單狀態更新到寫入佇列，回傳的future完成時為實際變更的OID清單(失敗時為空清單)
+#所有訂單在同一個交易中更新，只發布一個訂單事件
+def queue_order_status_many(oids: List[int], new_status: str) -> Future:
+    oids = list(dict.fromkeys(oids))
+    if new_status not in ['Preparing', 'Completed'] or not oids:
+        if oids:
+            print(f"無效的訂單狀態: {new_status}")
+        future: Future = Future()
+        future.set_result([])
+        return future
+    return _resolve_write([], f"批次更新 {len(oids)} 筆訂單狀態時發生錯誤", 'update_order_status_many',
+                          _status_many_operation, oids, new_status)
+
+#批次更新多筆訂單的狀態(等待寫入佇列commit)，回傳實際變更的OID清單
+def update_order_status_many(oids: List[int], new_status: str) -> List[int]:
+    return queue_order_status_many(oids, new_status).result()
+
+#封存已完成的舊訂單
+#已完成且下單時間(Time)超過max_age_days天的訂單連同明細搬到OrderArchive/OrderDetailArchive(銷售統計不受影響)
+#訂單沒有記錄完成時間，以下單時間計算；一般訂單在下單當天就會完成
+#每批chunk_size筆在各自的短交易中搬移，不會長時間佔住寫入鎖；max_chunks為None時一直搬到沒有為止
+#回傳搬移的訂單數，失敗時回傳None
+ARCHIVE_CHUNK_SIZE = 500
+
+def archive_completed_orders(max_age_days: float, chunk_size: int = ARCHIVE_CHUNK_SIZE,
+                             max_chunks: Optional[int] = None) -> Optional[int]:
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    moved = 0
+    chunks = 0
+    try:
+        while max_chunks is None or chunks < max_chunks:
+            with write_transaction() as conn:
+                oids = [row[0] for row in conn.execute(SQL_ARCHIVABLE_ORDERS, (cutoff, chunk_size))]
+                if not oids:
+                    break
+                placeholders = ','.join('?' * len(oids))
+                conn.execute(f"""
+                INSERT INTO OrderArchive (OID, Time, TotalAmount, Status, ServingMethod)
+                SELECT OID, Time, TotalAmount, Status, ServingMethod FROM "Order" WHERE OID IN ({placeholders})
+                """, oids)
+                conn.execute(f"""
+                INSERT INTO OrderDetailArchive (ODID, Order_ID, Meal_ID, Quantity, PriceAtOrder, Total)
+                SELECT ODID, Order_ID, Meal_ID, Quantity, PriceAtOrder, Total FROM OrderDetail WHERE Order_ID IN ({placeholders})
+                """, oids)
+                conn.execute(f"DELETE FROM OrderDetail WHERE Order_ID IN ({placeholders})", oids)
+                conn.execute(f'DELETE FROM "Order" WHERE OID IN ({placeholders})', oids)
+            moved += len(oids)
+            chunks += 1
+            if len(oids) < chunk_size:
+                break
+        return moved
+
+    except sqlite3.Error as e:
+        _log_error(f"封存訂單時發生錯誤(已封存 {moved} 筆): {e}")
+        return None
+
+#查詢某段時間(start_time <= Time < end_time)的歷史訂單，現行與封存資料一起查詢，新的在前
+def get_order_history(start_time: str, end_time: str, limit: int = 200) -> List[Dict]:
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(SQL_ORDER_HISTORY, (start_time, end_time, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    except sqlite3.Error as e:
+        _log_error(f"查詢歷史訂單時發生錯誤: {e}")
+        return []
+
+#用OID查詢一筆訂單(不論是否已封存)，回傳訂單資料並附上'Details'明細，找不到時回傳None
+def get_history_order(oid: int) -> Optional[Dict]:
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(SQL_HISTORY_ORDER, (oid,)).fetchone()
+            if row is None:
+                return None
+            order = dict(row)
+            order['Details'] = [dict(detail) for detail in conn.execute(SQL_HISTORY_ORDER_DETAILS, (oid,))]
+            return order
+
+    except sqlite3.Error as e:
+        _log_error(f"查詢歷史訂單 OID:{oid} 時發生錯誤: {e}")
+        return None
+
+#搜尋餐點名稱(名稱中包含text的餐點，依MID排序)，失敗時回傳空清單
+def search_meals(text: str, limit: int = 20) -> List[Dict]:
+    text = text.strip()
+    if not text:
+        return []
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            if len(text) >= FTS_MIN_LENGTH and _has_meal_fts(conn):
+                cursor = conn.execute(SQL_SEARCH_MEALS_FTS, ('"' + text.replace('"', '""') + '"', limit))
+            else:
+                cursor = conn.execute(SQL_SEARCH_MEALS_LIKE, (_like_pattern(text), limit))
+            meals = [dict(row) for row in cursor.fetchall()]
+        for meal in meals:
+            meal['IsAvailable'] = bool(meal['IsAvailable'])
+        return meals
+
+    except sqlite3.Error as e:
+        _log_error(f"搜尋餐點時發生錯誤: {e}")
+        return []
+
+#依餐點搜尋訂單時最多使用幾個符合名稱的餐點
+SEARCH_MEAL_LIMIT = 20
+
+#符合的餐點在一張明細表中少於這個數量時，直接由餐點索引取出全部明細(最多讀這麼多列)；
+#否則餐點很常見，從最新的訂單往回找很快就會湊滿limit筆
+MEAL_LINES_SCAN_LIMIT = 5000
+
+#在一張訂單表中依餐點(與時間範圍)搜尋最新的limit筆訂單
+def _search_orders_by_meals(conn: sqlite3.Connection, orders: str, details: str, archived: int,
+                            meal_ids: List[int], start_time: str, end_time: str, limit: int) -> List[Dict]:
+    placeholders = ','.join('?' * len(meal_ids))
+    lines = conn.execute(SQL_COUNT_MEAL_LINES.format(details=details, placeholders=placeholders),
+                         (*meal_ids, MEAL_LINES_SCAN_LIMIT)).fetchone()[0]
+    if lines == 0:
+        return []
+    if lines < MEAL_LINES_SCAN_LIMIT:
+        cursor = conn.execute(SQL_SEARCH_ORDERS_BY_MEAL_LINES.format(orders=orders, details=details, archived=archived,
+                                                                     placeholders=placeholders),
+                              (*meal_ids, start_time, end_time, limit))
+    else:
+        cursor = conn.execute(SQL_SEARCH_ORDERS_BY_TIME_AND_MEALS.format(orders=orders, details=details,
+                                                                         archived=archived, placeholders=placeholders),
+                              (start_time, end_time, *meal_ids, limit))
+    return [dict(row) for row in cursor]
+
+#搜尋訂單(包含已封存的訂單)，條件可任意組合：
+#  oid: 訂單編號
+#  start_time/end_time: 時間範圍 [start_time, end_time)，格式 'YYYY-MM-DD HH:MM:SS'
+#  meal: 餐點名稱片段(訂單中有任一個名稱符合的餐點)
+#回傳最新的limit筆訂單(依時間從新到舊)，都以索引查詢，不會掃描整張訂單表；失敗時回傳空清單
+def search_orders(oid: Optional[int] = None, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                  meal: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    start_time = start_time or '0000-00-00 00:00:00'
+    end_time = end_time or '9999-99-99 99:99:99'
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    meal = (meal or '').strip()
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            meal_ids: List[int] = []
+            if meal:
+                condition, params = _meal_search_condition(conn, meal)
+                meal_ids = [row[0] for row in conn.execute(
+                    f"SELECT MID FROM Meal WHERE {condition} LIMIT ?", (*params, SEARCH_MEAL_LIMIT))]
+                if not meal_ids:
+                    return []
+
+            found: List[Dict] = []
+            for orders, details, archived in SEARCH_ORDER_TABLES:
+                if oid is not None:
+                    row = conn.execute(SQL_SEARCH_ORDERS_BY_ID.format(orders=orders, archived=archived,
+                                                                      placeholders='?'), (oid,)).fetchone()
+                    if row is None or not start_time <= row['Time'] < end_time:
+                        continue
+                    #以OID查詢時另外確認訂單中有符合的餐點
+                    if meal_ids and conn.execute(
+                            SQL_ORDER_HAS_MEALS.format(details=details, placeholders=','.join('?' * len(meal_ids))),
+                            (oid, *meal_ids)).fetchone() is None:
+                        continue
+                    found.append(dict(row))
+                elif meal_ids:
+                    found.extend(_search_orders_by_meals(conn, orders, details, archived, meal_ids,
+                                                         start_time, end_time, limit))
+                else:
+                    found.extend(dict(row) for row in conn.execute(
+                        SQL_SEARCH_ORDERS_BY_TIME.format(orders=orders, archived=archived),
+                        (start_time, end_time, limit)))
+
+            found.sort(key=lambda order: (order['Time'], order['OID']), reverse=True)
+            return found[:limit]
+
+    except sqlite3.Error as e:
+        _log_error(f"搜尋訂單時發生錯誤: {e}")
+        return []
+
+#銷售統計
+#統計表由觸發器維護(見_migration_3_sales_aggregates)，以下函式只讀取統計表
+
+#重建統計時讀取的來源(訂單, 含訂單時間的明細)
+#有封存表(版本4以後)時同時讀取封存資料，明細只與同一邊的訂單JOIN
+_SALES_LINES = """
+SELECT O.Time, OD.Meal_ID, OD.Quantity, OD.Total
+FROM {details} OD JOIN {orders} O ON O.OID = OD.Order_ID
+"""
+
+def _sales_sources(conn: sqlite3.Connection) -> Tuple[str, str]:
+    has_archive = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'OrderArchive'").fetchone()
+    lines = _SALES_LINES.format(details='OrderDetail', orders='"Order"')
+    if not has_archive:
+        return '"Order"', f'({lines})'
+    lines += 'UNION ALL' + _SALES_LINES.format(details='OrderDetailArchive', orders='OrderArchive')
+    return 'OrderHistory', f'({lines})'
+
+#清空並從訂單資料(含封存資料)重新計算所有統計表，在呼叫端的交易中執行、不自行commit
+def fill_sales_aggregates(conn: sqlite3.Connection):
+    orders, lines = _sales_sources(conn)
+    for table in ('SalesDaily', 'SalesHourly', 'SalesByMeal', 'SalesByServingMethod'):
+        conn.execute(f'DELETE FROM {table}')
+
+    conn.execute(f"""
+    INSERT INTO SalesDaily (Day, Orders, Revenue, Items)
+    SELECT O.Day, O.Orders, O.Revenue, COALESCE(D.Items, 0)
+    FROM (SELECT substr(Time, 1, 10) AS Day, COUNT(*) AS Orders, SUM(TotalAmount) AS Revenue
+          FROM {orders} GROUP BY Day) O
+    LEFT JOIN (SELECT substr(Time, 1, 10) AS Day, SUM(Quantity) AS Items
+               FROM {lines} GROUP BY Day) D
+    ON D.Day = O.Day
+    """)
+    conn.execute(f"""
+    INSERT INTO SalesHourly (Day, Hour, Orders, Revenue)
+    SELECT substr(Time, 1, 10), CAST(substr(Time, 12, 2) AS INTEGER), COUNT(*), SUM(TotalAmount)
+    FROM {orders} GROUP BY 1, 2
+    """)
+    conn.execute(f"""
+    INSERT INTO SalesByMeal (Day, Meal_ID, Quantity, Revenue)
+    SELECT substr(Time, 1, 10), Meal_ID, SUM(Quantity), SUM(Total)
+    FROM {lines} GROUP BY 1, 2
+    """)
+    conn.execute(f"""
+    INSERT INTO SalesByServingMethod (Day, ServingMethod, Orders, Revenue)
+    SELECT substr(Time, 1, 10), ServingMethod, COUNT(*), SUM(TotalAmount)
+    FROM {orders} GROUP BY 1, 2
+    """)
+
+#重建所有銷售統計表(例如匯入舊資料後)，回傳統計到的天數，失敗時回傳None
+def rebuild_sales_aggregates() -> Optional[int]:
+    try:
+        with write_transaction() as conn:
+            fill_sales_aggregates(conn)
+            return conn.execute("SELECT COUNT(*) FROM SalesDaily").fetchone()[0]
+
+    except sqlite3.Error as e:
+        _log_error(f"重建銷售統計時發生錯誤: {e}")
+        return None
+
+#查詢start_day~end_day(含，格式YYYY-MM-DD)的銷售報表
+#回傳 {'totals': {...}, 'daily': [...], 'hourly': [...], 'meals': [...], 'serving': [...]}，失敗時回傳{}
+def get_sales_report(start_day: str, end_day: str) -> Dict[str, Any]:
+    params = (start_day, end_day)
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            daily = [dict(row) for row in conn.execute(SQL_SALES_DAILY, params)]
+            hourly = [dict(row) for row in conn.execute(SQL_SALES_HOURLY, params)]
+            meals = [dict(row) for row in conn.execute(SQL_SALES_BY_MEAL, params)]
+            serving = [dict(row) for row in conn.execute(SQL_SALES_BY_SERVING_METHOD, params)]
+
+        orders = sum(day['Orders'] for day in daily)
+        revenue = sum(day['Revenue'] for day in daily)
+        return {
+            'start': start_day,
+            'end': end_day,
+            'totals': {
+                'Orders': orders,
+                'Revenue': revenue,
+                'Items': sum(day['Items'] for day in daily),
+                'AverageOrder': revenue / orders if orders else 0.0,
+            },
+            'daily': daily,
+            'hourly': hourly,
+            'meals': meals,
+            'serving': serving,
+        }
+
+    except sqlite3.Error as e:
+        _log_error(f"查詢銷售報表時發生錯誤: {e}")
+        return {}
+
+#跨程序變更通知(多worker模式)
+#把變更寫入ChangeLog(與資料變更在同一個交易中)，其他worker輪詢後重新發布訂單事件或清除快取
+def _log_change(conn: sqlite3.Connection, kind: str, payload: Optional[Dict[str, Any]] = None):
+    if CHANGE_LOG:
+        conn.execute(SQL_LOG_CHANGE, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), WORKER_ID, kind,
+                                      json.dumps(payload, ensure_ascii=False) if payload is not None else None))
+
+#目前最新的變更序號(worker啟動時從這裡開始輪詢)
+def get_change_seq() -> int:
+    try:
+        with db_connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(Seq), 0) FROM ChangeLog").fetchone()[0]
+
+    except sqlite3.Error as e:
+        _log_error(f"查詢變更序號時發生錯誤: {e}")
+        return 0
+
+#讀取序號大於after_seq的變更 [{Seq, Origin, Kind, Payload}, ...]
+def read_changes(after_seq: int, limit: int = 500) -> List[Dict]:
+    try:
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            changes = [dict(row) for row in conn.execute(SQL_READ_CHANGES, (after_seq, limit))]
+        for change in changes:
+            if change['Payload'] is not None:
+                change['Payload'] = json.loads(change['Payload'])
+        return changes
+
+    except sqlite3.Error as e:
+        _log_error(f"讀取變更紀錄時發生錯誤: {e}")
+        return []
+
+#刪除超過max_age_seconds秒的變更紀錄與過期的登入狀態，回傳刪除的變更筆數
+def prune_change_log(max_age_seconds: float) -> Optional[int]:
+    cutoff = (datetime.now() - timedelta(seconds=max_age_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with write_transaction() as conn:
+            deleted = conn.execute("DELETE FROM ChangeLog WHERE Time < ?", (cutoff,)).rowcount
+            conn.execute("DELETE FROM Session WHERE Created < ?", (_session_cutoff(),))
+        return deleted
+
+    except sqlite3.Error as e:
+        _log_error(f"清理變更紀錄時發生錯誤: {e}")
+        return None
+
+#登入狀態(Session)
+#以瀏覽器的session id為鍵存在資料庫，多個worker程序看到相同的登入狀態
+def _session_cutoff() -> str:
+    return (datetime.now() - timedelta(hours=SESSION_TTL_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+
+#登入cookie(app.storage.browser)的簽章金鑰
+#金鑰改變時瀏覽器會拿到新的session id，所有人都要重新登入，Session表中的資料也再也用不到，
+#因此未設定STORAGE_SECRET環境變數時，第一次啟動產生一個並存在資料庫旁的檔案，之後重新啟動(或自動重新載入)都沿用
+STORAGE_SECRET_FILE = 'storage_secret'
+
+def _storage_secret_path() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(DB)), STORAGE_SECRET_FILE)
+
+def get_storage_secret() -> str:
+    secret = os.environ.get('STORAGE_SECRET')
+    if secret:
+        return secret
+    path = _storage_secret_path()
+    try:
+        #O_EXCL：同時啟動的程序只有一個會建立檔案，其他的讀取同一個金鑰
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path, encoding='utf-8') as f:
+                secret = f.read().strip()
+            if secret:
+                return secret
+            time.sleep(0.01)   #另一個程序剛建立檔案、還沒寫完
+        raise RuntimeError(f'登入金鑰檔案 {path} 是空的，請刪除後重新啟動')
+    secret = secrets.token_hex(32)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(secret)
+    return secret
+
+#登入後建立(或取代)session
+def create_session(session_id: str, sid: int, account: str, staff_class: str) -> bool:
+    try:
+        with db_connection() as conn:
+            conn.execute("""
+            INSERT OR REPLACE INTO Session (SessionID, SID, Account, Class, Created)
+            VALUES (?, ?, ?, ?, ?)
+            """, (session_id, sid, account, staff_class, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            _log_change(conn, 'session', {'session': session_id})
+            conn.commit()
+            return True
+
+    except sqlite3.Error as e:
+        _log_error(f"建立登入狀態時發生錯誤: {e}")
         return False
-        
+
+#查詢session(含過期時間Expires)，不存在或已過期時回傳None
+def get_session(session_id: str) -> Optional[Dict]:
     try:
-        query = "UPDATE \"Order\" SET Status = ? WHERE OID = ?"
-        cursor = conn.execute(query, (new_status, oid))
-        conn.commit()
-        return cursor.rowcount > 0
-        
+        with db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(SQL_GET_SESSION, (session_id, _session_cutoff())).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        #session過期的時間(epoch秒)，快取登入狀態時不能超過這個時間
+        created = datetime.strptime(session['Created'], '%Y-%m-%d %H:%M:%S')
+        session['Expires'] = created.timestamp() + SESSION_TTL_HOURS * 3600
+        return session
+
+    except sqlite3.Error as e:
+        _log_error(f"查詢登入狀態時發生錯誤: {e}")
+        return None
+
+#登出
+def delete_session(session_id: str) -> bool:
+    try:
+        with db_connection() as conn:
+            cursor = conn.execute("DELETE FROM Session WHERE SessionID = ?", (session_id,))
+            _log_change(conn, 'session', {'session': session_id})
+            conn.commit()
+            return cursor.rowcount > 0
+
     except sqlite3.Error as e:
-        print(f"更新訂單 OID:{oid} 狀態時發生錯誤: {e}")
+        _log_error(f"刪除登入狀態時發生錯誤: {e}")
         return False
-        
-    finally:
-        if conn: conn.close()
 
 #插入預設的管理員帳號用
 def demo_manager():
@@ -475,7 +1962,43 @@ def demo_manager():
 
 #插入預設的餐點用
 def demo_meals():  
-    insert_meal('番茄肉醬義大利麵', 180.0, 'spaghetti.jpg', True)
-    insert_meal('冰紅茶', 45.0, 'iced_tea.png', True)
-    insert_meal('提拉米蘇', 95.0, 'tiramisu.jpg', True)
-    insert_meal('玉米濃湯', 40.0, 'corn_soup.png', False)
\ No newline at end of file
+    insert_meal('番茄肉醬義大利麵', 180.0, 'spaghetti.jpg', True, '主餐')
+    insert_meal('冰紅茶', 45.0, 'iced_tea.png', True, '飲料')
+    insert_meal('提拉米蘇', 95.0, 'tiramisu.jpg', True, '甜點')
+    insert_meal('玉米濃湯', 40.0, 'corn_soup.png', False, '湯品')
+
+#效能指標：包裝本模組的公開資料庫函式(延遲、呼叫次數、回傳筆數、錯誤次數、慢查詢)
+#連線池與schema管理的函式不包裝，async_db在import時取得的就是包裝後的版本
+#經過寫入佇列的寫入由_resolve_write在future完成時記錄(包含排隊與commit時間)，這裡不再包裝
+metrics.instrument_module(globals(), exclude={
+    'get_db_connection', 'get_pool', 'configure_pool', 'close_pool', 'get_pool_stats',
+    'get_writer', 'close_writer', 'get_writer_stats',
+    'queue_order', 'queue_order_status', 'queue_order_status_many',
+    'submit_full_order', 'update_order_status', 'update_order_status_many',
+    'db_connection', 'write_transaction', 'get_schema_version', 'migrate', 'create_tables',
+    'invalidate_menu_cache', 'get_menu_cache_stats', 'demo_manager', 'demo_meals',
+    'get_storage_secret',
+})
+
+#連線池與菜單快取的狀態也一併輸出到 /metrics
+def _pool_and_cache_metrics():
+    pool = get_pool_stats()
+    for name in ('in_use', 'idle', 'size'):
+        yield f'db_pool_{name}', 'gauge', f'連線池 {name}', {}, pool[name]
+    for name in ('checkouts', 'waits', 'timeouts'):
+        yield f'db_pool_{name}_total', 'counter', f'連線池 {name}', {}, pool[name]
+    yield 'db_pool_max_checkout_seconds', 'gauge', '借出連線的最長等待時間', {}, pool['max_checkout_ms'] / 1000
+    writer = get_writer_stats()
+    if writer:
+        yield 'db_writer_queued', 'gauge', '寫入佇列中等待的寫入數', {}, writer['queued']
+        yield 'db_writer_batches_total', 'counter', '寫入佇列commit的交易數', {}, writer['batches']
+        yield 'db_writer_operations_total', 'counter', '寫入佇列處理的寫入數', {}, writer['operations']
+        yield 'db_writer_errors_total', 'counter', '寫入佇列中失敗的寫入數', {}, writer['errors']
+        yield 'db_writer_largest_batch', 'gauge', '單一交易合併的最多寫入數', {}, writer['largest_batch']
+        yield 'db_writer_avg_commit_seconds', 'gauge', '寫入佇列每個交易的平均執行時間', {}, writer['avg_commit_ms'] / 1000
+        yield 'db_writer_max_commit_seconds', 'gauge', '寫入佇列單一交易的最長執行時間', {}, writer['max_commit_ms'] / 1000
+    cache = get_menu_cache_stats()
+    for name in ('hits', 'misses', 'invalidations'):
+        yield f'menu_cache_{name}_total', 'counter', f'菜單快取 {name}', {}, cache[name]
+
+metrics.register_collector(_pool_and_cache_metrics)
@@ -0,0 +1,47 @@
+import argparse
+import sys
+from typing import List, Optional
+
+import database
+
+#資料庫維護指令
+#  python db_admin.py migrate          升級資料庫到最新版本
+#  python db_admin.py rebuild-sales    從訂單資料重新計算銷售統計表
+#  python db_admin.py explain          顯示公開查詢的EXPLAIN QUERY PLAN
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    database.initialize_database()
+    return 0
+
+def cmd_rebuild_sales(args: argparse.Namespace) -> int:
+    database.initialize_database()
+    days = database.rebuild_sales_aggregates()
+    if days is None:
+        return 1
+    print(f'銷售統計已重建，共 {days} 天。')
+    return 0
+
+def cmd_explain(args: argparse.Namespace) -> int:
+    for name, plan in database.explain_query_plans().items():
+        print(f'{name}:')
+        for step in plan:
+            print(f'  {step}')
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='點餐系統資料庫維護')
+    parser.add_argument('--db', default=database.DB, help=f'資料庫檔案 (預設: {database.DB})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help='升級資料庫到最新版本').set_defaults(func=cmd_migrate)
+    commands.add_parser('rebuild-sales', help='從訂單資料重新計算銷售統計表').set_defaults(func=cmd_rebuild_sales)
+    commands.add_parser('explain', help='顯示公開查詢的EXPLAIN QUERY PLAN').set_defaults(func=cmd_explain)
+    args = parser.parse_args(argv)
+
+    database.configure_pool(args.db)
+    try:
+        return args.func(args)
+    finally:
+        database.close_pool()
+
+if __name__ == '__main__':
+    sys.exit(main())
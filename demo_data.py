@@ -1,4 +1,25 @@
+import argparse
+
 import database
+import data_generator
+
+#建立示範帳號與餐點；加上--orders時另外以data_generator產生大量歷史訂單
+#  python demo_data.py
+#  python demo_data.py --orders 1000000 --days 365 --seed 42
+parser = argparse.ArgumentParser(description='建立示範資料')
+parser.add_argument('--db', default=database.DB, help=f'資料庫檔案 (預設: {database.DB})')
+parser.add_argument('--orders', type=int, default=0, help='另外產生的歷史訂單筆數 (預設: 0)')
+parser.add_argument('--days', type=int, default=365, help='歷史訂單分布在最近幾天 (預設: 365)')
+parser.add_argument('--meals', type=int, default=40, help='產生訂單時至少要有幾種餐點 (預設: 40)')
+parser.add_argument('--seed', type=int, default=42, help='亂數種子 (預設: 42)')
+args = parser.parse_args()
+
+database.configure_pool(args.db)
 database.initialize_database()
 database.demo_manager()
-database.demo_meals()
\ No newline at end of file
+database.demo_meals()
+
+if args.orders > 0:
+    stats = data_generator.generate(args.db, args.orders, args.days, args.seed, meals=args.meals)
+    print(f"已產生 {stats['orders']:,} 筆訂單、{stats['details']:,} 筆明細，"
+          f"耗時 {stats['seconds']:.1f} 秒 ({stats['rows_per_second']:,.0f} 筆/秒)")
@@ -0,0 +1,246 @@
+import argparse
+import csv
+import heapq
+import io
+import os
+import pathlib
+import sqlite3
+import sys
+from datetime import date, timedelta
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import database
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+#訂單明細匯出(給會計使用)
+#每列是一筆訂單明細(含所屬訂單的欄位)，現行與封存的訂單都會匯出，依訂單時間排序
+#使用唯讀連線(mode=ro)與fetchmany分批讀取，一次只在記憶體中保留一批；WAL模式下讀取不會擋住寫入
+#CSV不需要額外套件，Parquet需要安裝pyarrow
+#
+#用法:
+#  python export.py --start 2025-01-01 --end 2025-12-31 --output orders.csv
+#  python export.py --start 2025-01-01 --end 2025-12-31 --format parquet --output orders.parquet
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '5000'))   #每批讀取/寫出的資料列數
+
+COLUMNS = ('OID', 'Time', 'Status', 'ServingMethod', 'TotalAmount',
+           'ODID', 'Meal_ID', 'MealName', 'Quantity', 'PriceAtOrder', 'Total', 'Archived')
+
+#Order與OrderDetail的明細列，兩邊的表各自依(Time, OID)走索引讀取，再合併成一個依時間排序的串流
+SQL_EXPORT_LINES = """
+SELECT O.OID, O.Time, O.Status, O.ServingMethod, O.TotalAmount,
+       OD.ODID, OD.Meal_ID, M.Name AS MealName, OD.Quantity, OD.PriceAtOrder, OD.Total, {archived} AS Archived
+FROM {orders} O
+JOIN {details} OD ON OD.Order_ID = O.OID
+LEFT JOIN Meal M ON M.MID = OD.Meal_ID
+WHERE O.Time >= ? AND O.Time < ?
+ORDER BY O.Time ASC, O.OID ASC
+"""
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+#是否可以匯出Parquet(有安裝pyarrow)
+def parquet_available() -> bool:
+    return pa is not None
+
+#開啟唯讀連線(不經過連線池，匯出時間再長也不會佔用一般查詢的連線)，失敗時回傳None
+def open_readonly_connection(db_path: Optional[str] = None) -> Optional[sqlite3.Connection]:
+    path = pathlib.Path(db_path or database.DB).absolute()
+    try:
+        conn = sqlite3.connect(f'{path.as_uri()}?mode=ro', uri=True,
+                               timeout=database.BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False)  #HTTP下載時在不同執行緒中讀取
+        conn.execute(f'PRAGMA busy_timeout={database.BUSY_TIMEOUT_MS}')
+        return conn
+
+    except sqlite3.Error as e:
+        print(f"開啟唯讀資料庫連線時發生錯誤: {e}")
+        return None
+
+#逐批讀取一個查詢的結果
+def _fetch_rows(cursor: sqlite3.Cursor, chunk_size: int) -> Iterator[tuple]:
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+#讀取時間範圍[start_time, end_time)內的所有訂單明細，每次產生最多chunk_size列的清單
+#整個匯出在同一個讀取交易中進行，期間封存工作搬移的訂單不會重複或遺漏
+def iter_order_lines(conn: sqlite3.Connection, start_time: str, end_time: str,
+                     chunk_size: int = EXPORT_CHUNK_ROWS) -> Iterator[List[tuple]]:
+    conn.execute('BEGIN')
+    try:
+        streams = [_fetch_rows(conn.execute(SQL_EXPORT_LINES.format(orders=orders, details=details, archived=archived),
+                                            (start_time, end_time)), chunk_size)
+                   for orders, details, archived in database.SEARCH_ORDER_TABLES]
+        chunk: List[tuple] = []
+        for row in heapq.merge(*streams, key=lambda row: (row[1], row[0])):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        conn.rollback()
+
+#CSV：每批轉成一段bytes(開頭加BOM，Excel開啟時才會以UTF-8讀取中文)
+def csv_chunks(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield ('\ufeff' + buffer.getvalue()).encode()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+
+#pyarrow寫出的資料先收在這裡，每寫完一個row group就取出來送出
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+def _parquet_schema():
+    return pa.schema([
+        ('OID', pa.int64()), ('Time', pa.string()), ('Status', pa.string()), ('ServingMethod', pa.string()),
+        ('TotalAmount', pa.int64()), ('ODID', pa.int64()), ('Meal_ID', pa.int64()), ('MealName', pa.string()),
+        ('Quantity', pa.int64()), ('PriceAtOrder', pa.int64()), ('Total', pa.int64()), ('Archived', pa.int8()),
+    ])
+
+#Parquet：每批寫成一個row group，產生寫出的bytes(需要pyarrow)
+def parquet_chunks(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    if pa is None:
+        raise RuntimeError('匯出Parquet需要安裝pyarrow')
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays([pa.array(values, type=field.type)
+                                                     for values, field in zip(columns, schema)], schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+#依格式把明細轉成bytes串流
+def export_stream(chunks: Iterable[List[tuple]], fmt: str = 'csv') -> Iterator[bytes]:
+    return parquet_chunks(chunks) if fmt == 'parquet' else csv_chunks(chunks)
+
+#匯出到檔案，回傳匯出的明細列數，失敗時回傳None
+def export_to_file(path: str, start_time: str, end_time: str, fmt: str = 'csv',
+                   db_path: Optional[str] = None, chunk_size: int = EXPORT_CHUNK_ROWS) -> Optional[int]:
+    conn = open_readonly_connection(db_path)
+    if conn is None:
+        return None
+    count = 0
+
+    def counted(chunks: Iterable[List[tuple]]) -> Iterator[List[tuple]]:
+        nonlocal count
+        for chunk in chunks:
+            count += len(chunk)
+            yield chunk
+
+    try:
+        with open(path, 'wb') as f:
+            for data in export_stream(counted(iter_order_lines(conn, start_time, end_time, chunk_size)), fmt):
+                f.write(data)
+        return count
+
+    except sqlite3.Error as e:
+        print(f"匯出訂單時發生錯誤: {e}")
+        return None
+    finally:
+        conn.close()
+
+#日期(YYYY-MM-DD，結束日期當天也包含在內)轉成查詢的時間範圍
+def date_range(start: date, end: date) -> Tuple[str, str]:
+    return f'{start.isoformat()} 00:00:00', f'{(end + timedelta(days=1)).isoformat()} 00:00:00'
+
+#管理者下載路由 /export/orders?start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|parquet
+def install(app: Any):
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse, StreamingResponse
+    from state import STATE, load_session_blocking
+
+    @app.get('/export/orders')
+    def export_orders(request: Request, start: date, end: date, format: str = 'csv'):
+        #路由在執行緒中執行，可以直接查詢登入狀態
+        load_session_blocking()
+        if not STATE['is_login'] or not STATE['is_manager']:
+            return PlainTextResponse('權限不足', status_code=403)
+        if format not in FORMATS or start > end:
+            return PlainTextResponse('參數錯誤', status_code=400)
+        if format == 'parquet' and not parquet_available():
+            return PlainTextResponse('伺服器沒有安裝pyarrow，無法匯出Parquet', status_code=400)
+        conn = open_readonly_connection()
+        if conn is None:
+            return PlainTextResponse('無法開啟資料庫', status_code=503)
+
+        start_time, end_time = date_range(start, end)
+
+        #StreamingResponse在執行緒中逐批讀取並送出，結束(或客戶端中斷)時關閉連線
+        def stream() -> Iterator[bytes]:
+            try:
+                yield from export_stream(iter_order_lines(conn, start_time, end_time), format)
+            except sqlite3.Error as e:
+                print(f"匯出訂單時發生錯誤: {e}")
+            finally:
+                conn.close()
+
+        media_type, ext = FORMATS[format]
+        filename = f'orders_{start.isoformat()}_{end.isoformat()}.{ext}'
+        return StreamingResponse(stream(), media_type=media_type,
+                                 headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='匯出訂單明細(CSV/Parquet)')
+    parser.add_argument('--db', default=database.DB, help=f'資料庫檔案 (預設: {database.DB})')
+    parser.add_argument('--start', type=date.fromisoformat, required=True, help='開始日期 YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, required=True, help='結束日期 YYYY-MM-DD (包含當天)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='檔案格式 (預設: csv)')
+    parser.add_argument('--output', required=True, help='輸出檔案')
+    parser.add_argument('--chunk', type=int, default=EXPORT_CHUNK_ROWS, help=f'每批的資料列數 (預設: {EXPORT_CHUNK_ROWS})')
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet' and not parquet_available():
+        print('匯出Parquet需要安裝pyarrow: pip install pyarrow')
+        return 1
+    start_time, end_time = date_range(args.start, args.end)
+    count = export_to_file(args.output, start_time, end_time, args.format, args.db, max(1, args.chunk))
+    if count is None:
+        return 1
+    print(f'已匯出 {count:,} 筆訂單明細到 {args.output}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
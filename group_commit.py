@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+#group commit寫入佇列
+#所有寫入交給單一寫入執行緒，它把佇列中等待的寫入合併成一個交易(最多max_batch筆，或等待max_delay秒)，
+#每筆寫入各自使用SAVEPOINT，單筆失敗只會rollback自己；整批只commit(fsync)一次
+#operation(conn, *args)回傳(結果, 事件或None)，事件在commit成功後才發布，之後才完成呼叫端的future
+
+Operation = Callable[..., Tuple[Any, Optional[Dict[str, Any]]]]
+
+class GroupCommitWriter:
+    def __init__(self, transaction: Callable[[], ContextManager[Any]], publish: Callable[[Dict[str, Any]], None],
+                 max_batch: int = 64, max_delay: float = 0.0, name: str = 'db-writer'):
+        self._transaction = transaction   #例如database.write_transaction
+        self._publish = publish           #例如order_bus.publish
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self.name = name
+        self._queue: 'queue.Queue[Optional[Tuple[Operation, tuple, Future]]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        #統計
+        self._batches = 0
+        self._operations = 0
+        self._errors = 0
+        self._largest_batch = 0
+        self._commit_total = 0.0
+        self._commit_max = 0.0
+
+    #把一筆寫入放進佇列，回傳的future會得到該筆寫入的結果或例外
+    def submit(self, operation: Operation, *args: Any) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_exception(RuntimeError('寫入佇列已關閉'))
+                return future
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._queue.put((operation, args, future))
+        return future
+
+    #停止接受新的寫入，等佇列中已有的寫入完成後結束寫入執行緒
+    def close(self, timeout: Optional[float] = None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            #收集同一批的寫入：已經在排隊的直接加入，最多再等待max_delay秒
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    #在單一交易中執行一批寫入
+    def _commit(self, batch: List[Tuple[Operation, tuple, Future]]):
+        #呼叫端已取消的寫入不執行
+        batch = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        events: List[Dict[str, Any]] = []
+        started = time.perf_counter()
+        try:
+            with self._transaction() as conn:
+                for operation, args, future in batch:
+                    conn.execute('SAVEPOINT group_write')
+                    try:
+                        result, event = operation(conn, *args)
+                        conn.execute('RELEASE group_write')
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO group_write')
+                        conn.execute('RELEASE group_write')
+                        outcomes.append((future, None, e))
+                        continue
+                    outcomes.append((future, result, None))
+                    if event is not None:
+                        events.append(event)
+
+        except Exception as e:
+            #整批交易失敗(例如取得寫入鎖逾時)，這批的每個呼叫端都收到同一個錯誤
+            self._record(len(batch), len(batch), time.perf_counter() - started)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self._record(len(batch), sum(1 for _, _, error in outcomes if error is not None),
+                     time.perf_counter() - started)
+        #commit成功後才通知訂閱者
+        for event in events:
+            try:
+                self._publish(event)
+            except Exception as e:
+                print(f"發布訂單事件時發生錯誤: {e}")
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _record(self, size: int, errors: int, elapsed: float):
+        with self._lock:
+            self._batches += 1
+            self._operations += size
+            self._errors += errors
+            self._largest_batch = max(self._largest_batch, size)
+            self._commit_total += elapsed
+            self._commit_max = max(self._commit_max, elapsed)
+
+    #回傳寫入佇列統計(批次大小、commit時間、排隊數量)
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'batches': self._batches,
+                'operations': self._operations,
+                'errors': self._errors,
+                'largest_batch': self._largest_batch,
+                'avg_batch': self._operations / self._batches if self._batches else 0.0,
+                'avg_commit_ms': (self._commit_total / self._batches * 1000) if self._batches else 0.0,
+                'max_commit_ms': self._commit_max * 1000,
+            }
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from nicegui import app
+
+#Pillow為選用套件，沒有安裝時直接提供原圖(仍有ETag與快取標頭)
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+#餐點圖片服務：產生並快取縮圖，以長效快取標頭與ETag提供給點餐頁
+PICTURE_FOLDER = 'picture'
+CACHE_FOLDER = os.path.join(PICTURE_FOLDER, '.cache')
+
+#縮圖尺寸(寬, 高)，對應菜單卡片的w-80 h-40，以及高解析度螢幕的兩倍大小
+VARIANTS: Dict[str, Tuple[int, int]] = {
+    'card': (320, 160),
+    'card2x': (640, 320),
+}
+
+#網址帶有來源檔案的版本(v=修改時間)，內容不會改變，因此可以快取一年
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+#依瀏覽器Accept標頭選擇格式(越前面越優先)
+_FORMATS = [
+    ('image/avif', 'AVIF', 'avif', {'quality': 55}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 75, 'method': 6}),
+]
+_JPEG = ('image/jpeg', 'JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True})
+
+_build_lock = threading.Lock()
+_etags: Dict[str, str] = {}
+
+#檢查Pillow是否支援某種格式
+def _supports(pil_format: str) -> bool:
+    if Image is None:
+        return False
+    if pil_format == 'JPEG':
+        return True
+    return bool(features.check(pil_format.lower()))
+
+#取得圖片原始檔路徑，檔名不合法或不存在時回傳None
+def _source_path(picname: str) -> Optional[str]:
+    if not picname or os.path.basename(picname) != picname or picname.startswith('.'):
+        return None
+    path = os.path.join(PICTURE_FOLDER, picname)
+    return path if os.path.isfile(path) else None
+
+#來源檔案的版本字串(修改時間+大小)，檔案被替換時會改變
+def _source_version(path: str) -> str:
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}{stat.st_size:x}'
+
+#計算檔案內容的ETag(依檔案版本快取，檔案被替換時重新計算)
+def _etag(path: str) -> str:
+    key = f'{path}:{_source_version(path)}'
+    etag = _etags.get(key)
+    if etag is None:
+        with open(path, 'rb') as f:
+            etag = '"' + hashlib.sha1(f.read()).hexdigest() + '"'
+        _etags[key] = etag
+    return etag
+
+#依Accept標頭選出瀏覽器支援且Pillow能輸出的格式
+def _choose_format(accept: str) -> Tuple[str, str, str, dict]:
+    for mime, pil_format, ext, options in _FORMATS:
+        if mime in accept and _supports(pil_format):
+            return mime, pil_format, ext, options
+    return _JPEG
+
+#刪除同一張圖片舊版本的縮圖
+def _purge_old_variants(picname: str, keep_version: str):
+    prefix = f'{picname}.'
+    for filename in os.listdir(CACHE_FOLDER):
+        if filename.startswith(prefix) and f'.{keep_version}.' not in filename:
+            path = os.path.join(CACHE_FOLDER, filename)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+#產生(或取得已快取的)縮圖，回傳檔案路徑
+def build_variant(picname: str, variant: str, pil_format: str, ext: str, options: dict) -> Optional[str]:
+    source = _source_path(picname)
+    if source is None or variant not in VARIANTS or Image is None:
+        return None
+
+    version = _source_version(source)
+    target = os.path.join(CACHE_FOLDER, f'{picname}.{variant}.{version}.{ext}')
+    if os.path.isfile(target):
+        return target
+
+    with _build_lock:
+        if os.path.isfile(target):
+            return target
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        _purge_old_variants(picname, version)
+
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            #與object-cover相同：等比縮放後裁切到卡片尺寸
+            image = ImageOps.fit(image.convert('RGB'), VARIANTS[variant], Image.LANCZOS)
+            temp = f'{target}.tmp'
+            image.save(temp, pil_format, **options)
+        os.replace(temp, target)
+        return target
+
+#預先產生一張圖片所有尺寸、所有格式的縮圖(餐點新增或修改圖片後呼叫)
+def prebuild(picname: str):
+    if not _source_path(picname):
+        return
+    for variant in VARIANTS:
+        for _, pil_format, ext, options in _FORMATS + [_JPEG]:
+            if _supports(pil_format):
+                try:
+                    build_variant(picname, variant, pil_format, ext, options)
+                except OSError as e:
+                    print(f"產生圖片 {picname} ({variant}) 縮圖時發生錯誤: {e}")
+
+#菜單卡片使用的圖片網址
+def image_url(picname: str, variant: str = 'card') -> Optional[str]:
+    source = _source_path(picname)
+    if source is None:
+        return None
+    return f'/img/{variant}/{picname}?v={_source_version(source)}'
+
+#提供給高解析度螢幕使用的srcset
+def image_srcset(picname: str) -> Optional[str]:
+    if _source_path(picname) is None:
+        return None
+    return ', '.join(f'{image_url(picname, variant)} {VARIANTS[variant][0]}w' for variant in VARIANTS)
+
+#回傳檔案，瀏覽器已有相同版本(If-None-Match)時回傳304
+def _cached_file_response(request: Request, path: str, media_type: Optional[str] = None) -> Response:
+    etag = _etag(path)
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept'}
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+#縮圖路由(同步函式，FastAPI會在執行緒中執行，縮圖不會卡住event loop)
+@app.get('/img/{variant}/{picname}')
+def serve_image(variant: str, picname: str, request: Request):
+    source = _source_path(picname)
+    if source is None or variant not in VARIANTS:
+        return Response(status_code=404)
+
+    mime, pil_format, ext, options = _choose_format(request.headers.get('accept', ''))
+    try:
+        path = build_variant(picname, variant, pil_format, ext, options)
+    except OSError as e:
+        print(f"產生圖片 {picname} ({variant}) 縮圖時發生錯誤: {e}")
+        path = None
+
+    if path is None:
+        #沒有Pillow或無法縮圖時直接提供原圖
+        return _cached_file_response(request, source)
+    return _cached_file_response(request, path, mime)
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import async_db
+from order_events import OrderEvent, order_bus
+
+#廚房的「待製作餐點」彙總：所有準備中訂單中每種餐點的總份數、訂單數與最久的等待時間
+#啟動(第一次開啟頁面)時查詢一次，之後由訂單事件增量維護，不需要每次重新GROUP BY OrderDetail
+#新增訂單時加上各品項份數，訂單完成時扣掉；每種餐點以OrderedDict記錄等待中的訂單(依時間從舊到新)，
+#最久等待的訂單就是第一個
+
+class KitchenBoard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock: Optional[asyncio.Lock] = None
+        #OID -> (訂單時間, [(Meal_ID, Quantity), ...])
+        self._orders: Dict[int, Tuple[str, List[Tuple[int, int]]]] = {}
+        #Meal_ID -> {'Meal_ID', 'MealName', 'Quantity', 'waiting': OrderedDict[OID, 訂單時間]}
+        self._meals: Dict[int, Dict[str, Any]] = {}
+        self._loaded = False
+        #載入期間收到的事件，載入完成後再套用
+        self._pending_events: Optional[List[OrderEvent]] = None
+        self.version = 0   #每次內容變更都會增加
+
+    #訂單事件處理(在發布事件的執行緒中呼叫，O(品項數))
+    def handle_event(self, event: OrderEvent):
+        with self._lock:
+            if self._pending_events is not None:
+                self._pending_events.append(event)
+            elif self._loaded:
+                self._apply(event)
+
+    def _apply(self, event: OrderEvent):
+        if event['type'] == 'created':
+            order = event['order']
+            if order['Status'] == 'Preparing':
+                self._add(order['OID'], order['Time'],
+                          [(item['Meal_ID'], item.get('MealName'), item['Quantity']) for item in event['details']])
+        elif event['type'] == 'status':
+            if event['status'] == 'Preparing':
+                #重新開啟的訂單事件中沒有明細，少見情況下次使用時重新載入
+                self._loaded = False
+            else:
+                for oid in event['oids']:
+                    self._remove(oid)
+        self.version += 1
+
+    def _add(self, oid: int, time: str, lines: List[Tuple[int, Optional[str], int]]):
+        if oid in self._orders:
+            return
+        self._orders[oid] = (time, [(meal_id, quantity) for meal_id, _, quantity in lines])
+        for meal_id, name, quantity in lines:
+            meal = self._meals.get(meal_id)
+            if meal is None:
+                meal = self._meals[meal_id] = {'Meal_ID': meal_id, 'MealName': name, 'Quantity': 0,
+                                               'waiting': OrderedDict()}
+            meal['Quantity'] += quantity
+            waiting = meal['waiting']
+            newest = next(reversed(waiting.values()), None) if waiting else None
+            waiting[oid] = time
+            #一般訂單依時間先後到達；比最新的還舊時(少見)重新排序
+            if newest is not None and time < newest:
+                meal['waiting'] = OrderedDict(sorted(waiting.items(), key=lambda entry: (entry[1], entry[0])))
+
+    def _remove(self, oid: int):
+        entry = self._orders.pop(oid, None)
+        if entry is None:
+            return
+        for meal_id, quantity in entry[1]:
+            meal = self._meals.get(meal_id)
+            if meal is None:
+                continue
+            meal['Quantity'] -= quantity
+            meal['waiting'].pop(oid, None)
+            if not meal['waiting']:
+                del self._meals[meal_id]
+
+    #確保已載入(第一次使用或需要重新同步時查詢資料庫)
+    async def ensure_loaded(self):
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            with self._lock:
+                self._pending_events = []
+            rows = await async_db.get_pending_order_lines()
+            with self._lock:
+                events, self._pending_events = self._pending_events, None
+                if rows is None:
+                    return
+                self._orders.clear()
+                self._meals.clear()
+                grouped: Dict[int, Tuple[str, List[Tuple[int, Optional[str], int]]]] = {}
+                for row in rows:
+                    grouped.setdefault(row['OID'], (row['Time'], []))[1].append(
+                        (row['Meal_ID'], row['MealName'], row['Quantity']))
+                for oid, (time, lines) in grouped.items():
+                    self._add(oid, time, lines)
+                self._loaded = True
+                for event in events:
+                    self._apply(event)
+                self.version += 1
+
+    #目前的彙總 [{Meal_ID, MealName, Quantity, Orders, Oldest, WaitMinutes}, ...]，等待最久的餐點在前
+    def snapshot(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        now = now or datetime.now()
+        with self._lock:
+            rows = []
+            for meal in self._meals.values():
+                oldest = next(iter(meal['waiting'].values()))
+                rows.append({
+                    'Meal_ID': meal['Meal_ID'],
+                    'MealName': meal['MealName'] or f"餐點 {meal['Meal_ID']}",
+                    'Quantity': meal['Quantity'],
+                    'Orders': len(meal['waiting']),
+                    'Oldest': oldest,
+                })
+        for row in rows:
+            try:
+                waited = now - datetime.strptime(row['Oldest'], '%Y-%m-%d %H:%M:%S')
+                row['WaitMinutes'] = max(0, int(waited.total_seconds() // 60))
+            except ValueError:
+                row['WaitMinutes'] = 0
+        rows.sort(key=lambda row: row['Oldest'])
+        return rows
+
+#全域的廚房彙總(所有廚房頁面共用)
+kitchen_board = KitchenBoard()
+order_bus.subscribe(kitchen_board.handle_event)
@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import zlib
+from typing import List, Optional, Tuple
+
+#簡單的TCP負載平衡器(多worker模式使用)
+#NiceGUI的頁面狀態存在產生頁面的worker程序中，頁面載入後的websocket必須連到同一個worker，
+#因此依用戶端IP的hash固定分配worker；該worker無法連線時依序改用下一個(登入狀態存在資料庫，不受影響)
+
+Backend = Tuple[str, int]
+
+BUFFER_SIZE = 65536
+
+#依用戶端IP選出第一個嘗試的worker
+def pick_backend(client_ip: str, count: int) -> int:
+    return zlib.crc32(client_ip.encode()) % count
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        #對方送完資料(半關閉)時轉送EOF，另一個方向仍可繼續傳送
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        writer.close()
+
+async def _connect(backends: List[Backend], first: int) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+    for i in range(len(backends)):
+        host, port = backends[(first + i) % len(backends)]
+        try:
+            return await asyncio.open_connection(host, port)
+        except OSError:
+            continue
+    return None
+
+async def _handle(backends: List[Backend], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    peer = writer.get_extra_info('peername')
+    client_ip = peer[0] if peer else ''
+    upstream = await _connect(backends, pick_backend(client_ip, len(backends)))
+    if upstream is None:
+        print(f"沒有可用的worker，拒絕來自 {client_ip} 的連線")
+        writer.close()
+        return
+    up_reader, up_writer = upstream
+    try:
+        await asyncio.gather(_pipe(reader, up_writer), _pipe(up_reader, writer))
+    finally:
+        for stream in (up_writer, writer):
+            stream.close()
+
+#在host:port接受連線並轉送到backends，直到被取消為止
+async def serve(host: str, port: int, backends: List[Backend]):
+    server = await asyncio.start_server(functools.partial(_handle, backends), host, port)
+    print(f"負載平衡器已啟動: {host}:{port} -> {', '.join(f'{h}:{p}' for h, p in backends)}")
+    async with server:
+        await server.serve_forever()
@@ -4,12 +4,13 @@ import sqlite3
 
 from nicegui import ui, Client
 from navigate import navigate_to
-from state import STATE, handle_login
+from state import STATE, load_session, handle_login
 import staff
 
 #登入頁面
 @ui.page('/login') 
-def login_page():
+async def login_page():
+    await load_session()
     # 頁面載入時檢查全域狀態
     if STATE['is_login']:
         #target_page = '/manager' if STATE['is_manager'] else '/work'
@@ -2,23 +2,19 @@ from nicegui import ui
 import asyncio
 
 from navigate import navigate_to
-from state import STATE, handle_logout
-from database import get_all_meals, insert_meal, update_meal, delete_meal
+from state import STATE, load_session, handle_logout
+import async_db
+import image_service
+from database import MEAL_CATEGORIES, DEFAULT_MEAL_CATEGORY
+from table_paging import KeysetPager
 from typing import Dict, Optional, Any, List
 
-#global表格物件
-meal_table = None
-
-#刷新餐點資料
-def refresh_meal_table():
-    global meal_table
-    meal_data = get_all_meals()
-    if meal_table:
-        meal_table.rows = meal_data
-        meal_table.update()
+#重新查詢目前頁面的餐點
+async def refresh_meal_table(meal_pager: KeysetPager):
+    await meal_pager.reload()
 
 #新增或編輯餐點的對話框
-def meal_dialog(meal_data: Optional[Dict[str, Any]] = None):
+def meal_dialog(meal_pager: KeysetPager, meal_data: Optional[Dict[str, Any]] = None):
     is_editing = meal_data is not None
     data = meal_data or {}
     
@@ -27,6 +23,7 @@ def meal_dialog(meal_data: Optional[Dict[str, Any]] = None):
     original_price = data.get('Price', 0.0)
     original_picname = data.get('PicName', '')
     original_is_available = data.get('IsAvailable', True) 
+    original_category = data.get('Category') or DEFAULT_MEAL_CATEGORY
 
     with ui.dialog() as dialog, ui.card().classes('w-96'):
         dialog.props('persistent') 
@@ -35,6 +32,10 @@ def meal_dialog(meal_data: Optional[Dict[str, Any]] = None):
         name_input = ui.input('餐點名稱*', value=original_name).classes('w-full')
         price_input = ui.number('價格*', value=original_price, min=1, precision=2).classes('w-full')
         picname_input = ui.input('圖片名稱 (Picname)', value=original_picname).classes('w-full')
+        #可以選擇既有的分類或輸入新的分類
+        category_options = list(dict.fromkeys([*MEAL_CATEGORIES, original_category]))
+        category_input = ui.select(category_options, label='分類', value=original_category,
+                                   with_input=True, new_value_mode='add-unique').classes('w-full')
         is_available_input = ui.select([True, False], 
                                  label='是否開放點餐', 
                                  value=original_is_available).classes('w-full')
@@ -44,6 +45,7 @@ def meal_dialog(meal_data: Optional[Dict[str, Any]] = None):
             price = price_input.value
             picname = picname_input.value.strip()
             is_available = is_available_input.value #獲取True/False
+            category = (category_input.value or '').strip() or DEFAULT_MEAL_CATEGORY
             
             if not name or price is None or price <= 0:
                 ui.notify('餐點名稱和有效價格為必填項。', color='warning')
@@ -53,18 +55,21 @@ def meal_dialog(meal_data: Optional[Dict[str, Any]] = None):
             
             if is_editing:
                 #編輯模式
-                success = update_meal(original_mid, name, price, picname, is_available)
+                success = await async_db.update_meal(original_mid, name, price, picname, is_available, category)
                 action = '更新'
             else:
                 #新增模式
-                insert_id = insert_meal(name, price, picname, is_available)
+                insert_id = await async_db.insert_meal(name, price, picname, is_available, category)
                 success = insert_id is not None
                 action = '新增'
 
             if success:
                 ui.notify(f'{action}餐點 "{name}" 成功。', color='positive')
+                #圖片名稱變更時先產生新圖片的縮圖，點餐頁第一次載入就不必等待
+                if picname and picname != original_picname:
+                    await async_db.run_db(image_service.prebuild, picname)
                 await asyncio.sleep(0.5) 
-                refresh_meal_table() 
+                await refresh_meal_table(meal_pager) 
                 dialog.close()
             else:
                 ui.notify(f'{action}餐點失敗，請檢查名稱是否重複或資料庫連線。', color='negative')
@@ -76,13 +81,13 @@ def meal_dialog(meal_data: Optional[Dict[str, Any]] = None):
     dialog.open()
 
 #刪除餐點確認的對話框
-def delete_meal_confirmation(meal_data: Dict):
+def delete_meal_confirmation(meal_pager: KeysetPager, meal_data: Dict):
     
     async def confirm_delete():
-        if delete_meal(meal_data['MID']):
+        if await async_db.delete_meal(meal_data['MID']):
             ui.notify(f"成功刪除餐點: {meal_data['Name']}", color='positive')
             await asyncio.sleep(0.5)
-            refresh_meal_table()
+            await refresh_meal_table(meal_pager)
             dialog.close()
         else:
             ui.notify('刪除失敗，請檢查資料庫連線。', color='negative')
@@ -110,9 +115,8 @@ def format_is_available(val: bool):
 
 #餐點管理主頁面
 @ui.page('/manage_meal')
-def manage_meal_page():
-    global meal_table
-    
+async def manage_meal_page():
+    await load_session()
     #檢查登入狀態
     if not STATE['is_login']:
         navigate_to('/login')
@@ -127,22 +131,28 @@ def manage_meal_page():
 
     with ui.column().classes('p-4 w-full items-start'):
         
-        #頂部新增餐點按鈕
-        ui.button('新增餐點', icon='add', on_click=lambda: meal_dialog()).classes('mb-4 bg-positive')
+        #頂部新增餐點按鈕與搜尋
+        with ui.row().classes('w-full items-center gap-4 mb-4'):
+            ui.button('新增餐點', icon='add', on_click=lambda: meal_dialog(meal_pager)).classes('bg-positive')
+            search_input = ui.input('搜尋餐點名稱').props('clearable debounce=300').classes('w-64')
+            available_only = ui.checkbox('只顯示販售中')
 
-        #定義表格header
+        #定義表格header(可排序的欄位由伺服器端排序)
         meal_columns: List[Dict[str, Any]] = [
-            {'name': 'mid', 'label': 'ID', 'field': 'MID', 'required': True, 'align': 'left'},
-            {'name': 'name', 'label': '名稱', 'field': 'Name', 'required': True, 'align': 'left', 'style': 'width: 25%'},
-            {'name': 'price', 'label': '價格', 'field': 'Price', 'required': True, 'align': 'left'},
+            {'name': 'mid', 'label': 'ID', 'field': 'MID', 'required': True, 'align': 'left', 'sortable': True},
+            {'name': 'name', 'label': '名稱', 'field': 'Name', 'required': True, 'align': 'left', 'style': 'width: 25%', 'sortable': True},
+            {'name': 'price', 'label': '價格', 'field': 'Price', 'required': True, 'align': 'left', 'sortable': True},
+            {'name': 'category', 'label': '分類', 'field': 'Category', 'required': True, 'align': 'left'},
             {'name': 'picname', 'label': '圖片名', 'field': 'PicName', 'required': False, 'align': 'left'},
             {'name': 'is_available', 'label': '上架狀態', 'field': 'IsAvailable', 'required': True, 'align': 'center'},
             {'name': 'actions', 'label': '操作', 'field': 'actions', 'align': 'center', 'style': 'width: 120px'}
         ]
 
-        #建立餐點表格
-        initial_meal_data = get_all_meals()
-        meal_table = ui.table(columns=meal_columns, rows=initial_meal_data, row_key='MID').classes('w-full')
+        #建立餐點表格(伺服器端分頁，只載入目前頁面)
+        meal_table = ui.table(columns=meal_columns, rows=[], row_key='MID',
+                              pagination={'rowsPerPage': 20, 'sortBy': 'mid', 'descending': False, 'page': 1}).classes('w-full')
+        meal_pager = KeysetPager(meal_table, 'MID', async_db.get_meals_page)
+        await meal_pager.load()
         
         #定義表格操作按鈕
         meal_table.add_slot('body-cell-actions', r"""
@@ -153,5 +163,9 @@ def manage_meal_page():
         """)
         
         #處理編輯/刪除
-        meal_table.on('edit', lambda e: meal_dialog(e.args))
-        meal_table.on('delete', lambda e: delete_meal_confirmation(e.args))
\ No newline at end of file
+        meal_table.on('edit', lambda e: meal_dialog(meal_pager, e.args))
+        meal_table.on('delete', lambda e: delete_meal_confirmation(meal_pager, e.args))
+
+        #搜尋條件改變時回到第一頁
+        search_input.on_value_change(lambda e: meal_pager.set_filters(search=(e.value or '').strip() or None))
+        available_only.on_value_change(lambda e: meal_pager.set_filters(available_only=e.value))
\ No newline at end of file
@@ -1,19 +1,94 @@
-from nicegui import ui
+from nicegui import ui, background_tasks
 
 from navigate import navigate_to
-from state import STATE, handle_logout
-from database import get_all_orders, get_order_details, update_order_status
-from typing import Dict, Optional, Any, List
+from state import STATE, load_session, handle_logout
+import async_db
+from order_events import order_bus
+from table_paging import KeysetPager
+from kitchen_board import kitchen_board
+import asyncio
+import threading
+from typing import Dict, Any, List
 
-#全域表格物件，用於後續刷新
-order_table = None
+#準備中訂單的明細快取(所有廚房頁面共用)
+#每次載入一頁訂單時一次查詢該頁所有訂單的明細，之後由訂單事件維持同步，開啟對話框不需要再查詢
+class PendingDetailsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        #OID -> 明細清單
+        self._details: Dict[int, List[Dict]] = {}
+        #正在查詢中的OID -> 該次查詢的future(結果為 {OID: 明細清單})，同一批查詢的OID共用一個future
+        self._loading: Dict[int, asyncio.Future] = {}
+
+    #訂單事件處理(在發布事件的執行緒中呼叫)
+    def handle_event(self, event: Dict[str, Any]):
+        with self._lock:
+            if event['type'] == 'created':
+                details = event['details']
+                #沒有餐點名稱的明細(例如批次匯入)等需要時再查詢
+                if all(item.get('MealName') for item in details):
+                    self._details[event['order']['OID']] = [{
+                        'Quantity': item['Quantity'],
+                        'Total': item['Total'],
+                        'PriceAtOrder': item['PriceAtOrder'],
+                        'MealName': item['MealName'],
+                    } for item in details]
+            elif event['type'] == 'status' and event['status'] != 'Preparing':
+                for oid in event['oids']:
+                    self._details.pop(oid, None)
+                    #查詢中的訂單完成了，查詢結果不再放進快取(等待中的對話框仍會拿到結果)
+                    self._loading.pop(oid, None)
+
+    #查詢一批訂單的明細並放進快取，回傳 {OID: 明細清單}
+    async def _load(self, oids: List[int]) -> Dict[int, List[Dict]]:
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            for oid in oids:
+                self._loading[oid] = future
+        loaded: Dict[int, List[Dict]] = {}
+        try:
+            loaded = await async_db.get_order_details_many(oids)
+            with self._lock:
+                for oid in oids:
+                    if self._loading.get(oid) is future and oid in loaded:
+                        self._details[oid] = loaded[oid]
+        finally:
+            with self._lock:
+                for oid in oids:
+                    if self._loading.get(oid) is future:
+                        del self._loading[oid]
+            future.set_result(loaded)
+        return loaded
+
+    #一次查詢快取中還沒有(也不在查詢中)的訂單明細
+    async def prefetch(self, oids: List[int]):
+        with self._lock:
+            missing = [oid for oid in dict.fromkeys(oids) if oid not in self._details and oid not in self._loading]
+        if missing:
+            await self._load(missing)
+
+    #取得單筆訂單明細：快取沒有時，正在查詢中就等待該次查詢，否則才查詢
+    async def get(self, oid: int) -> List[Dict]:
+        with self._lock:
+            details = self._details.get(oid)
+            loading = self._loading.get(oid)
+        if details is not None:
+            return details
+        if loading is not None:
+            loaded = await asyncio.shield(loading)
+        else:
+            loaded = await self._load([oid])
+        return loaded.get(oid) or []
+
+details_cache = PendingDetailsCache()
+order_bus.subscribe(details_cache.handle_event)
 
 #訂單明細與狀態更新對話框
-def detail_and_status_dialog(order_data: Dict):
+async def detail_and_status_dialog(order_data: Dict):
     oid = order_data['OID']
     
-    #獲取訂單明細
-    details = get_order_details(oid)
+    #獲取訂單明細(通常已預先載入)
+    details = await details_cache.get(oid)
     
     with ui.dialog() as dialog, ui.card().classes('w-full max-w-lg'):
         
@@ -44,12 +119,11 @@ def detail_and_status_dialog(order_data: Dict):
         ui.separator()
         
         #狀態更新並刷新介面
-        def set_status(new_status: str):
-            if update_order_status(oid, new_status):
+        async def set_status(new_status: str):
+            if await async_db.update_order_status(oid, new_status):
                 ui.notify(f"訂單 OID:{oid} 狀態更新為 {new_status} 成功！", color='positive')
-                #關閉對話框並刷新order_table
+                #關閉對話框，表格會透過訂單事件自動更新
                 dialog.close() 
-                refresh_order_table()
             else:
                 ui.notify('狀態更新失敗。', color='negative')
 
@@ -63,22 +137,72 @@ def detail_and_status_dialog(order_data: Dict):
 
     dialog.open()
 
-#重新載入訂單資料並更新表格
-def refresh_order_table():
-    global order_table
-    order_data = get_all_orders()
-    if order_table:
-        #直接更新表格的rows資料
-        order_table.rows = order_data
-        order_table.update()
+#重新查詢目前頁面的訂單
+async def refresh_order_table(order_pager: KeysetPager, notify: bool = True):
+    await order_pager.reload()
+    if notify:
         ui.notify('訂單列表已刷新', position='bottom-right', timeout=1000)
 
+#將訂單事件套用到此頁面目前顯示的那一頁(在event loop中執行)，一般情況不需要重新查詢
+def apply_order_event(order_pager: KeysetPager, event: Dict[str, Any]):
+    if event['type'] == 'created':
+        order = event['order']
+        serving_method = order_pager.filters.get('serving_method')
+        if order['Status'] == 'Preparing' and serving_method in (None, order['ServingMethod']):
+            order_pager.offer_row(order)
+
+    elif event['type'] == 'status':
+        if event['status'] == 'Preparing':
+            #重新開啟的訂單不在表格中，少見情況直接重新查詢
+            background_tasks.create(refresh_order_table(order_pager, notify=False))
+            return
+        order_pager.remove_rows(event['oids'])
+        #已完成的訂單也從勾選中移除
+        table = order_pager.table
+        if table.selected:
+            done = set(event['oids'])
+            table.selected = [row for row in table.selected if row['OID'] not in done]
+
+#一次完成表格中勾選的訂單(同一個交易更新，只發布一個訂單事件，表格由事件更新)
+async def complete_selected_orders(order_table: ui.table):
+    oids = [row['OID'] for row in order_table.selected]
+    if not oids:
+        ui.notify('請先勾選要完成的訂單。', color='warning')
+        return
+    changed = await async_db.update_order_status_many(oids, 'Completed')
+    order_table.selected = []
+    if changed:
+        ui.notify(f"已完成 {len(changed)} 筆訂單", color='positive')
+    else:
+        ui.notify('沒有訂單被更新(可能已由其他人完成)。', color='warning')
+
+#待製作餐點彙總的表格欄位
+KITCHEN_COLUMNS: List[Dict[str, Any]] = [
+    {'name': 'meal', 'label': '餐點', 'field': 'MealName', 'align': 'left'},
+    {'name': 'quantity', 'label': '總份數', 'field': 'Quantity', 'align': 'right'},
+    {'name': 'orders', 'label': '訂單數', 'field': 'Orders', 'align': 'right'},
+    {'name': 'wait', 'label': '最久等待(分鐘)', 'field': 'WaitMinutes', 'align': 'right'},
+]
+
+#用記憶體中的彙總更新待製作餐點表格(不查詢資料庫)
+async def refresh_kitchen_table(kitchen_table: ui.table):
+    await kitchen_board.ensure_loaded()
+    kitchen_table.rows = kitchen_board.snapshot()
+    kitchen_table.update()
+
+#訂閱訂單事件，頁面(client)關閉時自動取消訂閱
+def subscribe_order_events(handler):
+    token = order_bus.subscribe_loop(handler)
+    client = ui.context.client
+    #新版NiceGUI在client真正刪除時才觸發on_delete，舊版只有on_disconnect
+    on_close = getattr(client, 'on_delete', None) or client.on_disconnect
+    on_close(lambda: order_bus.unsubscribe(token))
+
 
 #訂單管理頁面
 @ui.page('/manage_order')
-def manage_order_page():
-    global order_table
-    
+async def manage_order_page():
+    await load_session()
     #防止直接輸入網址跳過登入
     if not STATE['is_login']:
         navigate_to('/login')
@@ -93,22 +217,33 @@ def manage_order_page():
 
     with ui.column().classes('p-4 w-full items-start'):
         
-        ui.label('待處理訂單列表').classes('text-3xl font-bold mb-4')
+        with ui.row().classes('w-full items-center gap-4 mb-4'):
+            ui.label('待處理訂單列表').classes('text-3xl font-bold')
+            method_select = ui.select({'': '全部取餐方式', 'DineIn': 'DineIn', 'TakeOut': 'TakeOut'},
+                                      value='', label='取餐方式').classes('w-40')
         
-        #定義表格Headers
+        #定義表格Headers(可排序的欄位由伺服器端排序)
         order_columns: List[Dict[str, Any]] = [
-            {'name': 'oid', 'label': '訂單號', 'field': 'OID', 'required': True, 'align': 'left', 'style': 'width: 80px'},
-            {'name': 'time', 'label': '時間', 'field': 'Time', 'required': True, 'align': 'left', 'style': 'width: 150px'},
-            {'name': 'total', 'label': '總金額(NT$)', 'field': 'TotalAmount', 'required': True, 'align': 'right'},
+            {'name': 'oid', 'label': '訂單號', 'field': 'OID', 'required': True, 'align': 'left', 'style': 'width: 80px', 'sortable': True},
+            {'name': 'time', 'label': '時間', 'field': 'Time', 'required': True, 'align': 'left', 'style': 'width: 150px', 'sortable': True},
+            {'name': 'total', 'label': '總金額(NT$)', 'field': 'TotalAmount', 'required': True, 'align': 'right', 'sortable': True},
             {'name': 'method', 'label': '取餐方式', 'field': 'ServingMethod', 'required': True, 'align': 'center'},
             {'name': 'status', 'label': '狀態', 'field': 'Status', 'required': True, 'align': 'center'},
             {'name': 'actions', 'label': '操作', 'field': 'actions', 'align': 'center', 'style': 'width: 100px'}
         ]
 
-        #建立訂單表格
-        initial_order_data = get_all_orders()
-        
-        order_table = ui.table(columns=order_columns, rows=initial_order_data, row_key='OID').classes('w-full')
+        #待製作餐點(所有準備中訂單的份數彙總，方便一次準備同一種餐點)
+        with ui.expansion('待製作餐點', icon='soup_kitchen', value=True).classes('w-full mb-4'):
+            kitchen_table = ui.table(columns=KITCHEN_COLUMNS, rows=[], row_key='Meal_ID').classes('w-full')
+        await refresh_kitchen_table(kitchen_table)
+
+        #建立訂單表格(伺服器端分頁，依時間從舊到新，只載入目前頁面)
+        order_table = ui.table(columns=order_columns, rows=[], row_key='OID', selection='multiple',
+                               pagination={'rowsPerPage': 20, 'sortBy': 'time', 'descending': False, 'page': 1}).classes('w-full')
+        #每載入一頁(換頁、排序、篩選、重新整理)就一次預先載入該頁訂單的明細
+        order_pager = KeysetPager(order_table, 'OID', async_db.get_orders_page,
+                                  on_load=lambda rows: details_cache.prefetch([row['OID'] for row in rows]))
+        await order_pager.load()
         
         #定義表格操作按鈕(用 row-template)
         
@@ -128,6 +263,18 @@ def manage_order_page():
         
         #當表格中的按鈕被點擊時，觸發show_details事件，並呼叫detail_and_status_dialog
         order_table.on('show_details', lambda e: detail_and_status_dialog(e.args))
+
+        #新訂單與完成的訂單由事件推送，不需要輪詢
+        subscribe_order_events(lambda event: apply_order_event(order_pager, event))
+        subscribe_order_events(lambda event: background_tasks.create(refresh_kitchen_table(kitchen_table)))
+        #等待時間每30秒更新一次
+        ui.timer(30, lambda: refresh_kitchen_table(kitchen_table))
+
+        method_select.on_value_change(lambda e: order_pager.set_filters(serving_method=e.value or None))
         
-        #額外的刷新按鈕
-        ui.button('手動刷新訂單', on_click=refresh_order_table, icon='refresh').classes('mt-4')
\ No newline at end of file
+        with ui.row().classes('mt-4 gap-4'):
+            #批次完成勾選的訂單
+            ui.button('完成選取的訂單', on_click=lambda: complete_selected_orders(order_table),
+                      icon='done_all', color='positive')
+            #額外的刷新按鈕
+            ui.button('手動刷新訂單', on_click=lambda: refresh_order_table(order_pager), icon='refresh')
\ No newline at end of file
@@ -2,23 +2,17 @@ from nicegui import ui
 import asyncio
 
 from navigate import navigate_to
-from state import STATE, handle_logout
-from database import get_all_staff, insert_staff, update_password, delete_staff 
+from state import STATE, load_session, handle_logout
+import async_db
+from table_paging import KeysetPager
 from typing import Dict, Optional, Any, List
 
-#global表格物件
-staff_table = None
-
-#刷新員工資料
-def refresh_staff_table():
-    global staff_table
-    staff_data = get_all_staff()
-    if staff_table:
-        staff_table.rows = staff_data
-        staff_table.update()
+#重新查詢目前頁面的員工
+async def refresh_staff_table(staff_pager: KeysetPager):
+    await staff_pager.reload()
         
 #新增或編輯員工的對話框
-def staff_dialog(staff_data: Optional[Dict[str, Any]] = None):
+def staff_dialog(staff_pager: KeysetPager, staff_data: Optional[Dict[str, Any]] = None):
     is_editing = staff_data is not None
     data = staff_data or {}
     
@@ -56,7 +50,7 @@ def staff_dialog(staff_data: Optional[Dict[str, Any]] = None):
             if is_editing:
                 #編輯模式(只能修改密碼)
                 if password:
-                    success = update_password(account, password)
+                    success = await async_db.update_password(account, password)
                     if success:
                         ui.notify(f'更新員工 "{account}" 密碼成功。', color='positive')
                     else:
@@ -73,7 +67,7 @@ def staff_dialog(staff_data: Optional[Dict[str, Any]] = None):
                     ui.notify('新增員工必須輸入密碼。', color='warning')
                     return
                 
-                insert_id = insert_staff(account, password, staff_class)
+                insert_id = await async_db.insert_staff(account, password, staff_class)
                 success = insert_id is not None
                 
                 if success:
@@ -84,7 +78,7 @@ def staff_dialog(staff_data: Optional[Dict[str, Any]] = None):
 
             #操作成功後延遲並刷新/關閉
             await asyncio.sleep(0.5) 
-            refresh_staff_table() 
+            await refresh_staff_table(staff_pager) 
             dialog.close()
 
         with ui.row().classes('justify-end w-full mt-4 gap-4'):
@@ -94,7 +88,7 @@ def staff_dialog(staff_data: Optional[Dict[str, Any]] = None):
     dialog.open()
 
 #刪除員工確認的對話框
-def delete_staff_confirmation(staff_data: Dict):
+def delete_staff_confirmation(staff_pager: KeysetPager, staff_data: Dict):
     account_to_delete = staff_data['Account']
 
     async def confirm_delete():
@@ -103,10 +97,10 @@ def delete_staff_confirmation(staff_data: Dict):
              dialog.close()
              return
 
-        if delete_staff(account_to_delete):
+        if await async_db.delete_staff(account_to_delete):
             ui.notify(f"成功刪除員工帳號: {account_to_delete}", color='positive')
             await asyncio.sleep(0.5)
-            refresh_staff_table() 
+            await refresh_staff_table(staff_pager) 
             dialog.close()
         else:
             ui.notify('刪除失敗，請檢查資料庫連線。', color='negative')
@@ -124,9 +118,8 @@ def delete_staff_confirmation(staff_data: Dict):
 
 #管理員主頁面
 @ui.page('/manager')
-def manager_management_page():
-    global staff_table
-    
+async def manager_management_page():
+    await load_session()
     #檢查登入狀態和權限
     if not STATE['is_login'] or not STATE['is_manager']:
         navigate_to('/login')
@@ -141,19 +134,25 @@ def manager_management_page():
 
     with ui.column().classes('p-4 w-full items-start'):
         
-        ui.button('新增員工', icon='person_add', on_click=lambda: staff_dialog()).classes('mb-4 bg-positive')
+        with ui.row().classes('w-full items-center gap-4 mb-4'):
+            ui.button('新增員工', icon='person_add', on_click=lambda: staff_dialog(staff_pager)).classes('bg-positive')
+            search_input = ui.input('搜尋帳號').props('clearable debounce=300').classes('w-64')
+            class_select = ui.select({'': '全部職位', 'Manager': 'Manager', 'Staff': 'Staff'},
+                                     value='', label='職位').classes('w-40')
         
-        #定義表格header
+        #定義表格header(可排序的欄位由伺服器端排序)
         staff_columns: List[Dict[str, Any]] = [
-            {'name': 'sid', 'label': 'ID', 'field': 'SID', 'required': True, 'align': 'left'},
-            {'name': 'account', 'label': '帳號', 'field': 'Account', 'required': True, 'align': 'left'},
-            {'name': 'class', 'label': '職位', 'field': 'Class', 'required': True, 'align': 'center'},
+            {'name': 'sid', 'label': 'ID', 'field': 'SID', 'required': True, 'align': 'left', 'sortable': True},
+            {'name': 'account', 'label': '帳號', 'field': 'Account', 'required': True, 'align': 'left', 'sortable': True},
+            {'name': 'class', 'label': '職位', 'field': 'Class', 'required': True, 'align': 'center', 'sortable': True},
             {'name': 'actions', 'label': '操作', 'field': 'actions', 'align': 'center', 'style': 'width: 120px'}
         ]
 
-        #建立員工表格
-        initial_staff_data = get_all_staff()
-        staff_table = ui.table(columns=staff_columns, rows=initial_staff_data).classes('w-full')
+        #建立員工表格(伺服器端分頁，只載入目前頁面)
+        staff_table = ui.table(columns=staff_columns, rows=[], row_key='SID',
+                               pagination={'rowsPerPage': 20, 'sortBy': 'sid', 'descending': False, 'page': 1}).classes('w-full')
+        staff_pager = KeysetPager(staff_table, 'SID', async_db.get_staff_page)
+        await staff_pager.load()
         
         #定義表格操作按鈕(使用row-template)
         staff_table.add_slot('body-cell-actions', r"""
@@ -164,5 +163,9 @@ def manager_management_page():
         """)
         
         #處理編輯/刪除
-        staff_table.on('edit', lambda e: staff_dialog(e.args))
-        staff_table.on('delete', lambda e: delete_staff_confirmation(e.args))
\ No newline at end of file
+        staff_table.on('edit', lambda e: staff_dialog(staff_pager, e.args))
+        staff_table.on('delete', lambda e: delete_staff_confirmation(staff_pager, e.args))
+
+        #搜尋條件改變時回到第一頁
+        search_input.on_value_change(lambda e: staff_pager.set_filters(search=(e.value or '').strip() or None))
+        class_select.on_value_change(lambda e: staff_pager.set_filters(staff_class=e.value or None))
\ No newline at end of file
@@ -0,0 +1,256 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+#效能指標：資料庫函式與頁面的延遲分布、呼叫次數、回傳筆數、錯誤次數，以及慢查詢紀錄
+#以Prometheus文字格式輸出(install()註冊 /metrics 路由)，可在執行中以set_enabled()開關
+#本模組不依賴database.py或NiceGUI，database.py在檔案最後呼叫instrument_module()包裝自己的公開函式
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'              #是否收集指標
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))        #超過此毫秒數的資料庫呼叫記入慢查詢
+SLOW_LOG_SIZE = int(os.environ.get('SLOW_LOG_SIZE', '200'))          #保留最近幾筆慢查詢
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')                      #設定後 /metrics 需要 ?token= 或 Bearer token
+
+#延遲分布的區間上限(秒)
+BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#指標名稱 -> (類型, 說明)
+_METRICS: Dict[str, Tuple[str, str]] = {
+    'db_call_duration_seconds': ('histogram', '資料庫函式執行時間'),
+    'db_calls_total': ('counter', '資料庫函式呼叫次數'),
+    'db_errors_total': ('counter', '資料庫函式發生錯誤的次數'),
+    'db_rows_returned_total': ('counter', '資料庫函式回傳的資料列數'),
+    'db_slow_calls_total': ('counter', '超過慢查詢門檻的資料庫呼叫次數'),
+    'http_request_duration_seconds': ('histogram', '頁面與HTTP請求處理時間'),
+    'http_requests_total': ('counter', '頁面與HTTP請求次數'),
+    'ui_event_duration_seconds': ('histogram', '頁面操作(點擊到送出畫面更新)的處理時間'),
+}
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   #最後一格為+Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_slow_log: Deque[Dict[str, Any]] = deque(maxlen=SLOW_LOG_SIZE)
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+#目前執行中的資料庫函式(每個執行緒各自一個堆疊)，record_error()用來判斷錯誤屬於哪個函式
+_local = threading.local()
+
+#開啟/關閉指標收集(關閉時包裝函式只多一次布林判斷)
+def set_enabled(enabled: bool):
+    global ENABLED
+    ENABLED = bool(enabled)
+
+def is_enabled() -> bool:
+    return ENABLED
+
+#設定慢查詢門檻(毫秒)
+def set_slow_query_ms(threshold_ms: float):
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = float(threshold_ms)
+
+def observe(name: str, labels: Dict[str, str], seconds: float):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+def inc(name: str, labels: Dict[str, str], amount: float = 1):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+#計算回傳值中的資料列數(list、{key: list}、分頁結果{'rows': [...]})，無法判斷時回傳None
+def _count_rows(result: Any) -> Optional[int]:
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        rows = result.get('rows')
+        if isinstance(rows, list):
+            return len(rows)
+        if result and all(isinstance(v, list) for v in result.values()):
+            return sum(len(v) for v in result.values())
+    return None
+
+#記錄目前資料庫函式的一次錯誤(database.py捕捉到sqlite3.Error時呼叫)
+def record_error(function: Optional[str] = None):
+    if not ENABLED:
+        return
+    if function is None:
+        stack = getattr(_local, 'stack', None)
+        function = stack[-1] if stack else 'unknown'
+    inc('db_errors_total', {'function': function})
+
+#記錄資料庫函式的一次呼叫：延遲、呼叫次數、錯誤、慢查詢與回傳筆數
+#instrument()的包裝函式與寫入佇列(呼叫端在future完成時才知道結果)共用
+def record_call(name: str, seconds: float, failed: bool = False, result: Any = None):
+    labels = {'function': name}
+    if failed:
+        inc('db_errors_total', labels)
+    observe('db_call_duration_seconds', labels, seconds)
+    inc('db_calls_total', labels)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        inc('db_slow_calls_total', labels)
+        _slow_log.append({'time': time.time(), 'function': name, 'ms': seconds * 1000,
+                          'thread': threading.current_thread().name})
+        print(f"[慢查詢] {name} 耗時 {seconds * 1000:.1f}ms")
+    rows = _count_rows(result)
+    if rows:
+        inc('db_rows_returned_total', labels, rows)
+
+#包裝一個資料庫函式：記錄延遲、呼叫次數、回傳筆數、拋出的例外與慢查詢
+def instrument(func: Callable[..., Any], name: Optional[str] = None) -> Callable[..., Any]:
+    name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not ENABLED:
+            return func(*args, **kwargs)
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            stack.pop()
+            record_call(name, time.perf_counter() - start, failed=True)
+            raise
+        stack.pop()
+        record_call(name, time.perf_counter() - start, result=result)
+        return result
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+#包裝模組中所有公開函式(不含類別、contextmanager與exclude中的名稱)
+def instrument_module(namespace: Dict[str, Any], exclude: Iterable[str] = ()):
+    module = namespace['__name__']
+    excluded = set(exclude)
+    for name, value in list(namespace.items()):
+        if (name.startswith('_') or name in excluded or not callable(value) or isinstance(value, type)
+                or getattr(value, '__module__', None) != module or hasattr(value, '__wrapped__')):
+            continue
+        namespace[name] = instrument(value, name)
+
+#註冊額外的指標來源，回傳 [(名稱, 類型, 說明, 標籤, 值), ...](例如連線池狀態)
+def register_collector(collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]):
+    _collectors.append(collector)
+
+#最近的慢查詢(新的在前)
+def get_slow_log(limit: int = 50) -> List[Dict[str, Any]]:
+    with _lock:
+        return list(reversed(_slow_log))[:limit]
+
+#清除所有已收集的指標
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _slow_log.clear()
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+#輸出Prometheus文字格式
+def render_prometheus() -> str:
+    with _lock:
+        histograms = [(key, list(h.counts), h.total, h.count) for key, h in _histograms.items()]
+        counters = list(_counters.items())
+
+    lines: List[str] = []
+    for metric, (kind, description) in _METRICS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        if kind == 'histogram':
+            for (name, labels), counts, total, count in sorted(histograms):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(BUCKETS) + [float('inf')], counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {repr(total)}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {count}')
+        else:
+            for (name, labels), value in sorted(counters):
+                if name == metric:
+                    lines.append(f'{metric}{_format_labels(labels)} {_format_value(value)}')
+
+    described = set()
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception as e:
+            print(f"收集指標時發生錯誤: {e}")
+            continue
+        for name, kind, description, labels, value in samples:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+
+    lines.append(f'# HELP metrics_enabled 是否正在收集指標')
+    lines.append(f'# TYPE metrics_enabled gauge')
+    lines.append(f'metrics_enabled {1 if ENABLED else 0}')
+    return '\n'.join(lines) + '\n'
+
+#在FastAPI/NiceGUI app上註冊頁面延遲的middleware與 /metrics 路由
+def install(app: Any):
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse, Response
+
+    @app.middleware('http')
+    async def measure_requests(request: Request, call_next):
+        path = request.url.path
+        #NiceGUI內部資源與指標本身不列入
+        if not ENABLED or path.startswith('/_nicegui') or path == '/metrics':
+            return await call_next(request)
+        start = time.perf_counter()
+        status = '500'
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            #以路由樣板(例如 /img/{variant}/{picname})當標籤，避免標籤數量無限增加
+            route = request.scope.get('route')
+            labels = {'path': getattr(route, 'path', None) or 'unmatched'}
+            observe('http_request_duration_seconds', labels, time.perf_counter() - start)
+            inc('http_requests_total', {**labels, 'status': status})
+
+    @app.get('/metrics')
+    def metrics_endpoint(request: Request):
+        if METRICS_TOKEN:
+            token = request.query_params.get('token') or \
+                request.headers.get('authorization', '').removeprefix('Bearer ').strip()
+            if token != METRICS_TOKEN:
+                return Response(status_code=401)
+        return PlainTextResponse(render_prometheus(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,154 +1,104 @@
 from nicegui import ui, app # 確保 app 模組被導入
-import asyncio
 
 from navigate import navigate_to
-from database import get_all_meals, submit_full_order
-from typing import Dict, List, Any, Optional
-
-#購物車(global)
-CART: Dict[int, Dict[str, Any]] = {}
+import async_db
+from image_service import image_url, image_srcset
+from cart_store import cart_store
+from cart_dialog import CartDialog
+from typing import Dict, Any
 
 #定義圖片資料夾路徑
 PICTURE_FOLDER = 'picture' 
-#註冊文件路徑
+#註冊文件路徑(原圖；菜單卡片使用image_service提供的縮圖 /img/...)
 app.add_static_files('/pictures', PICTURE_FOLDER) 
 
-#用於在對話框中刷新主頁面狀態提示的標籤
-cart_summary_label: Optional[ui.label] = None
+#購物車以頁面(client)的id區分，每位客人各自一台
+#calculate_total/update_summary_label直接使用購物車中即時維護的總金額與份數
 
 #計算購物車總金額
-def calculate_total() -> int:
-    return sum(item['total'] for item in CART.values())
+def calculate_total(cart_key: str) -> int:
+    return cart_store.get(cart_key).total
 
 #更新購物車總結標籤
-def update_summary_label(summary_label: ui.label):
-    total = calculate_total()
-    count = sum(item['quantity'] for item in CART.values())
-    summary_label.set_text(f"🛒 購物車總計: NT$ {total:.0f} (共 {count} 份餐點)")
-
-#在確認的對話框中修改餐點數量
-def update_cart_item(mid: int, new_quantity: int, dialog: ui.dialog):
-    global cart_summary_label
-    
-    #數量為0則刪除
-    if new_quantity <= 0 and mid in CART:
-        del CART[mid]
-        ui.notify('餐點已移除', color='negative', timeout=1000)
-    elif new_quantity > 0 and mid in CART:
-        item = CART[mid]
-        item['quantity'] = new_quantity
-        item['total'] = item['price'] * new_quantity
-        ui.notify(f"已更新 {item['name']} 數量為 {new_quantity}", color='info', timeout=1000)
-        
-    #重新打開確認對話框，更新內容
-    dialog.close()
-    if cart_summary_label:
-        update_summary_label(cart_summary_label) #更新頁面底部的總結
-        
-    #延遲後重新開啟對話框
-    ui.timer(0.1, lambda: confirm_order_dialog(), once=True)
+def update_summary_label(cart_key: str, summary_label: ui.label):
+    cart = cart_store.get(cart_key)
+    summary_label.set_text(f"🛒 購物車總計: NT$ {cart.total:.0f} (共 {cart.count} 份餐點)")
 
 #從主點餐頁面把餐點加入購物車
-def add_to_cart_from_menu(meal: Dict[str, Any], quantity_select: ui.select, summary_label: ui.label):
+def add_to_cart_from_menu(cart_key: str, meal: Dict[str, Any], quantity_select: ui.select, summary_label: ui.label):
     quantity = int(quantity_select.value)
     if quantity <= 0:
         ui.notify('請選擇數量。', color='warning')
         return
 
-    mid = meal['MID']
     price = int(round(meal['Price']))
     
-    if mid not in CART:
-        CART[mid] = {
-            'mid': mid,
-            'name': meal['Name'],
-            'price': price, 
-            'picname': meal['PicName'],
-            'quantity': 0,
-            'total': 0 
-        }
-    
-    #更新數量和總價格 (修改字典內部元素，不需要 global)
-    CART[mid]['quantity'] += quantity
-    CART[mid]['total'] = CART[mid]['quantity'] * price
+    #更新數量和總價格(購物車會同步更新總金額與份數)
+    cart_store.get(cart_key).add(meal['MID'], meal['Name'], price, quantity, meal['PicName'])
     
     ui.notify(f"已加入 {quantity} 份 {meal['Name']}", color='positive', icon='add_shopping_cart')
-    update_summary_label(summary_label)
+    update_summary_label(cart_key, summary_label)
     
     #重設下拉式選單為0
     quantity_select.set_value(0)
 
 
-#確認點餐清單對話框
-def confirm_order_dialog():
-    if not CART:
-        ui.notify('購物車是空的，請先點餐。', color='warning')
-        return
-
-    with ui.dialog() as dialog, ui.card().classes('w-full max-w-lg'):
-        ui.label('確認您的訂單清單').classes('text-2xl font-bold mb-4')
-        
-        #訂單明細
-        with ui.column().classes('w-full border p-3 rounded-lg bg-primary max-h-80 overflow-y-auto'):
-            
-            for mid, item in list(CART.items()): 
-                with ui.row().classes('w-full items-center justify-between py-2 border-b last:border-b-0'):
-                    
-                    #名稱
-                    ui.label(f"{item['name']}").classes('w-1/3 text-lg font-semibold')
-                    quantity_select = ui.select(list(range(0, 100)), 
-                                                 value=item['quantity'], 
-                                                 label='數量',
-                                                 on_change=lambda e, m=mid: update_cart_item(m, int(e.value), dialog)).classes('w-20')
-                    
-                    #顯示小計
-                    ui.label(f"NT$ {item['total']:.0f}").classes('text-lg font-bold w-1/4 text-right')
-
-        #底部總結與操作按鈕
-        total_amount = calculate_total()
-        ui.label(f"總計: NT$ {total_amount:.0f}").classes('text-2xl font-extrabold text-red-600 mt-4 w-full text-right')
-        
-        #取餐方式選擇
-        serving_method_select = ui.select(['DineIn', 'TakeOut'], 
-                                             value='DineIn', 
-                                             label='取餐方式').classes('w-32 mt-4')
-
-        with ui.row().classes('w-full justify-between mt-4'):
-            #繼續點餐按鈕
-            ui.button('繼續點餐', on_click=dialog.close).props('flat')
-            
-            #送出訂單按鈕
-            ui.button('送出訂單', icon='send', color='primary', 
-                      on_click=lambda: place_order(dialog, serving_method_select.value)).classes('bg-positive')
-    
-    dialog.open()
-
+#把重新計價的結果套用到購物車，並逐項通知客人
+def apply_price_check(cart_key: str, check: Dict[str, Any]):
+    cart = cart_store.get(cart_key)
+    for change in check['changes']:
+        cart.set_price(change['mid'], change['new_price'])
+        ui.notify(f"{change['name']} 價格已調整為 NT$ {change['new_price']} (原 NT$ {change['old_price']})",
+                  color='warning', timeout=5000)
+    for removed in check['removed']:
+        cart.set_quantity(removed['mid'], 0)
+        ui.notify(f"{removed['name']} 已停售，已從購物車移除", color='negative', timeout=5000)
+
+#價格變動時更新購物車與對話框(對話框中直接顯示新的價格)讓客人確認後再送出
+def show_price_check(cart_key: str, cart_dialog: CartDialog, check: Dict[str, Any], summary_label: ui.label):
+    apply_price_check(cart_key, check)
+    cart_dialog.sync()
+    update_summary_label(cart_key, summary_label)
+    if not cart_store.get(cart_key):
+        cart_dialog.close()
 
 #送出訂單處理
 #處理結帳跟提交訂單
-def place_order(dialog: ui.dialog, serving_method: str):
-    global CART, cart_summary_label
+async def place_order(cart_key: str, cart_dialog: CartDialog, serving_method: str, summary_label: ui.label):
+    cart = cart_store.get(cart_key)
     
-    if not CART:
+    if not cart:
         ui.notify('購物車是空的，無法結帳。', color='negative')
         return
 
     #items列表
-    items_to_submit = list(CART.values())
+    items_to_submit = cart.items()
+
+    #送出前依目前菜單重新計價，價格變動或停售時先更新購物車讓客人確認
+    check = await async_db.reprice_cart(items_to_submit)
+    if check['changes'] or check['removed']:
+        show_price_check(cart_key, cart_dialog, check, summary_label)
+        return
     
-    #提交訂單到資料庫
-    oid = submit_full_order(items_to_submit, serving_method)
+    #提交訂單到資料庫(伺服器會在交易中再次與資料庫價格比對)
+    result = await async_db.submit_full_order(items_to_submit, serving_method)
+
+    #菜單在這之間剛好改價或停售：訂單沒有寫入，回傳的是比對結果
+    if isinstance(result, dict):
+        show_price_check(cart_key, cart_dialog, result, summary_label)
+        return
+    oid = result
     
     if oid:
         ui.notify(f'訂單提交成功！訂單號: {oid}', color='positive', timeout=5000)
         
         #清空購物車
-        CART = {}
-        dialog.close()
+        cart.clear()
+        cart_dialog.sync()
+        cart_dialog.close()
         
         #更新主頁面總結標籤
-        if cart_summary_label:
-            update_summary_label(cart_summary_label) 
+        update_summary_label(cart_key, summary_label) 
             
         #顯示成功頁面
         success_dialog = ui.dialog()
@@ -162,12 +112,46 @@ def place_order(dialog: ui.dialog, serving_method: str):
     else:
         ui.notify('訂單提交失敗，請重試。', color='negative')
 
+#菜單中的一張餐點卡片
+def menu_card(cart_key: str, meal: Dict[str, Any], summary_label: ui.label):
+    with ui.card().classes('w-80 h-auto shadow-xl'):
+        
+        #圖片顯示(縮圖+高解析度版本，瀏覽器依螢幕選擇)
+        picname = meal.get('PicName')
+        img_src = image_url(picname) or 'https://picsum.photos/300/200'
+        image = ui.image(img_src).classes('rounded-t-lg h-40 w-full object-cover')
+        srcset = image_srcset(picname)
+        if srcset:
+            image.props(f'srcset="{srcset}" sizes="320px"')
+        
+        with ui.card_section():
+            ui.label(meal['Name']).classes('text-xl font-bold')
+            ui.label(f"NT$ {int(round(meal['Price'])):.0f}").classes('text-lg text-primary')
+            
+            #數量選擇(預設0, 最高10)
+            quantity_select = ui.select(list(range(0, 11)), 
+                                         value=0, 
+                                         label='數量').classes('w-24 mt-3')
+            
+            #加入購物車按鈕
+            ui.button('加入購物車', icon='add_shopping_cart', color='positive',
+                      on_click=lambda m=meal, q=quantity_select: add_to_cart_from_menu(cart_key, m, q, summary_label))
+
+#全部分類的分頁名稱
+ALL_CATEGORIES = '全部'
+
 #點餐主頁面
+#菜單依分類分頁，每次只建立目前這一頁的卡片(database.MENU_PAGE_SIZE張)，
+#菜單再大每位客人的頁面元件數量也固定，換頁時清掉舊卡片再建立新的
 @ui.page('/order')
-def customer_order_page():
-    global cart_summary_label 
-    
+async def customer_order_page():
     ui.add_head_html('<title>點餐</title>')
+
+    #此頁面專屬的購物車，頁面關閉時釋放
+    client = ui.context.client
+    cart_key = client.id
+    on_close = getattr(client, 'on_delete', None) or client.on_disconnect
+    on_close(lambda: cart_store.discard(cart_key))
     
     #頂部導航
     with ui.header().classes('items-center justify-between'):
@@ -177,35 +161,36 @@ def customer_order_page():
     #菜單列表
     with ui.column().classes('w-full p-4 items-center'):
         ui.label('今日菜單').classes('text-4xl font-bold mb-6 text-primary')
+
+        categories = await async_db.get_menu_categories()
+        with ui.tabs().classes('mb-4') as category_tabs:
+            ui.tab(ALL_CATEGORIES)
+            for category in categories:
+                ui.tab(category['Category'], label=f"{category['Category']} ({category['Count']})")
+        category_tabs.set_value(ALL_CATEGORIES)
+
         menu_container = ui.row().classes('w-full max-w-7xl gap-6 justify-center')
-        
-        meals = get_all_meals()
-        available_meals = [m for m in meals if m.get('IsAvailable', 0)] 
-        
+        menu_pagination = ui.pagination(1, 1, direction_links=True).classes('mt-6')
+
+    #顯示指定分類的某一頁(只建立這一頁的卡片)
+    shown = {'page': 1}
+    async def show_menu(page: int = 1):
+        category = None if category_tabs.value == ALL_CATEGORIES else category_tabs.value
+        result = await async_db.get_menu_page(category, page)
+        menu_container.clear()
         with menu_container:
-            if not available_meals:
+            if not result['meals']:
                 ui.label("目前沒有可供點選的餐點。").classes('text-2xl text-warning')
-            
-            for meal in available_meals:
-                with ui.card().classes('w-80 h-auto shadow-xl'):
-                    
-                    #圖片顯示
-                    picname = meal.get('PicName')
-                    img_src = f'/pictures/{picname}' if picname else 'https://picsum.photos/300/200'
-                    ui.image(img_src).classes('rounded-t-lg h-40 w-full object-cover')
-                    
-                    with ui.card_section():
-                        ui.label(meal['Name']).classes('text-xl font-bold')
-                        ui.label(f"NT$ {int(round(meal['Price'])):.0f}").classes('text-lg text-primary')
-                        
-                        #數量選擇(預設0, 最高10)
-                        quantity_select = ui.select(list(range(0, 11)), 
-                                                     value=0, 
-                                                     label='數量').classes('w-24 mt-3')
-                        
-                        #加入購物車按鈕
-                        ui.button('加入購物車', icon='add_shopping_cart', color='positive',
-                                  on_click=lambda m=meal, q=quantity_select: add_to_cart_from_menu(m, q, cart_summary_label))
+            for meal in result['meals']:
+                menu_card(cart_key, meal, cart_summary_label)
+        shown['page'] = result['page']
+        menu_pagination.props(f"max={result['pages']}")
+        menu_pagination.set_value(result['page'])
+        menu_pagination.set_visibility(result['pages'] > 1)
+
+    category_tabs.on_value_change(lambda: show_menu(1))
+    #只在客人換頁時重新建立(show_menu自己設定的頁碼已經顯示，不必再建立一次)
+    menu_pagination.on_value_change(lambda e: e.value != shown['page'] and show_menu(e.value))
                         
     #頁面最下方的確認點餐清單/總結
     with ui.footer().classes('bg-grey-200 p-4 shadow-xl border-t border-gray-400'):
@@ -216,8 +201,13 @@ def customer_order_page():
             
             #確認點餐按鈕
             ui.button('確認點餐清單', icon='list_alt', color='primary', 
-                      on_click=confirm_order_dialog)
+                      on_click=lambda: cart_dialog.open())
+
+    #確認點餐清單對話框(整個頁面共用一個，內容就地更新)
+    cart_dialog = CartDialog(cart_key,
+                             on_change=lambda: update_summary_label(cart_key, cart_summary_label),
+                             on_submit=lambda method: place_order(cart_key, cart_dialog, method, cart_summary_label))
             
-    #首次載入時更新總結
-    if cart_summary_label:
-        update_summary_label(cart_summary_label)
\ No newline at end of file
+    #首次載入時更新總結並顯示第一頁菜單
+    update_summary_label(cart_key, cart_summary_label)
+    await show_menu(1)
\ No newline at end of file
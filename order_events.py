@@ -0,0 +1,62 @@
+import asyncio
+import itertools
+import threading
+from typing import Any, Callable, Dict, Optional
+
+#訂單事件(publish/subscribe)
+#database.py在交易commit之後發布事件，開著的頁面訂閱後直接收到變更，不需要輪詢或重新查詢
+#
+#事件格式:
+#  新訂單: {'type': 'created', 'order': {OID, Time, TotalAmount, Status, ServingMethod},
+#           'details': [{Meal_ID, MealName, Quantity, PriceAtOrder, Total}, ...]}
+#  狀態變更: {'type': 'status', 'oids': [OID, ...], 'status': 'Completed'}
+OrderEvent = Dict[str, Any]
+
+class OrderEventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers: Dict[int, Callable[[OrderEvent], None]] = {}
+
+    #訂閱事件，回傳取消訂閱用的token
+    #callback會在發布事件的執行緒中被呼叫，必須很快結束(O(1))
+    def subscribe(self, callback: Callable[[OrderEvent], None]) -> int:
+        with self._lock:
+            token = next(self._ids)
+            self._subscribers[token] = callback
+        return token
+
+    #訂閱事件，handler會被排進指定的asyncio event loop中執行(給NiceGUI頁面使用)
+    #發布端只做一次call_soon_threadsafe，不會被UI更新拖慢
+    def subscribe_loop(self, handler: Callable[[OrderEvent], None],
+                       loop: Optional[asyncio.AbstractEventLoop] = None) -> int:
+        loop = loop or asyncio.get_running_loop()
+
+        def forward(event: OrderEvent):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(handler, event)
+
+        return self.subscribe(forward)
+
+    #取消訂閱
+    def unsubscribe(self, token: int):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    #發布事件給所有訂閱者
+    def publish(self, event: OrderEvent):
+        with self._lock:
+            callbacks = list(self._subscribers.values())
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"處理訂單事件時發生錯誤: {e}")
+
+    #目前的訂閱數量
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+#全域的訂單事件匯流排
+order_bus = OrderEventBus()
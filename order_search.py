@@ -0,0 +1,121 @@
+from nicegui import ui
+from datetime import date, timedelta
+
+from navigate import navigate_to
+from state import STATE, load_session, handle_logout
+import async_db
+from typing import Dict, Any, List, Optional
+
+#訂單查詢頁(包含已封存的訂單)
+#依訂單號、日期區間、餐點名稱搜尋，全部走索引(見database.search_orders)，不會掃描整張訂單表
+
+SEARCH_LIMIT = 100   #最多顯示幾筆
+
+#表格欄位
+SEARCH_COLUMNS: List[Dict[str, Any]] = [
+    {'name': 'oid', 'label': '訂單號', 'field': 'OID', 'align': 'left'},
+    {'name': 'time', 'label': '時間', 'field': 'Time', 'align': 'left'},
+    {'name': 'total', 'label': '總金額(NT$)', 'field': 'TotalAmount', 'align': 'right'},
+    {'name': 'method', 'label': '取餐方式', 'field': 'ServingMethod', 'align': 'center'},
+    {'name': 'status', 'label': '狀態', 'field': 'Status', 'align': 'center'},
+    {'name': 'archived', 'label': '已封存', 'field': 'Archived', 'align': 'center'},
+    {'name': 'actions', 'label': '操作', 'field': 'actions', 'align': 'center'},
+]
+
+#訂單明細對話框(只供查看)
+async def order_detail_dialog(oid: int):
+    order = await async_db.get_history_order(oid)
+    if order is None:
+        ui.notify(f'找不到訂單 OID:{oid}', color='warning')
+        return
+
+    with ui.dialog() as dialog, ui.card().classes('w-full max-w-lg'):
+        ui.label(f'訂單明細 - OID: {oid}').classes('text-2xl font-bold')
+        ui.label(f"時間: {order['Time']}　取餐方式: {order['ServingMethod']}　狀態: {order['Status']}").classes('text-base')
+        ui.separator()
+        with ui.column().classes('w-full max-h-64 overflow-y-auto'):
+            if not order['Details']:
+                ui.label("無明細數據").classes('text-warning')
+            for item in order['Details']:
+                with ui.row().classes('w-full justify-between items-center py-1 border-b border-gray-200'):
+                    ui.label(f"{item['MealName']}").classes('w-6/12')
+                    ui.label(f"x {item['Quantity']}").classes('w-2/12 text-center')
+                    ui.label(f"NT$ {item['Total']:.0f}").classes('w-3/12 text-right font-bold')
+        ui.label(f"總金額: NT$ {order['TotalAmount']:.0f}").classes('text-xl font-bold text-right w-full mt-2')
+        with ui.row().classes('justify-end w-full'):
+            ui.button('關閉', on_click=dialog.close).props('flat color=grey')
+
+    dialog.open()
+
+#把日期輸入框的值轉成search_orders的時間範圍(結束日期當天也包含在內)
+def date_range(start: Optional[str], end: Optional[str]) -> tuple:
+    start_time = f'{start} 00:00:00' if start else None
+    end_time = None
+    if end:
+        end_time = f'{(date.fromisoformat(end) + timedelta(days=1)).isoformat()} 00:00:00'
+    return start_time, end_time
+
+@ui.page('/order_search')
+async def order_search_page():
+    await load_session()
+    #防止直接輸入網址跳過登入
+    if not STATE['is_login']:
+        navigate_to('/login')
+        return
+
+    ui.add_head_html('<title>訂單查詢</title>')
+
+    with ui.header().classes('items-center justify-between'):
+        ui.label(f'訂單查詢 ({STATE["account"]})').classes('text-lg')
+        ui.button('回選擇頁', on_click=lambda: navigate_to('/staff'), icon='arrow_back').props('flat color=white')
+        ui.button('登出', on_click=lambda: handle_logout(), icon='logout').props('flat color=white')
+
+    with ui.column().classes('p-4 w-full items-start'):
+        #搜尋條件(空白的條件不限制)
+        with ui.row().classes('items-end gap-4'):
+            oid_input = ui.number('訂單號', min=1, format='%d').classes('w-32')
+            start_input = ui.input('開始日期').props('type=date clearable')
+            end_input = ui.input('結束日期').props('type=date clearable')
+            meal_input = ui.input('餐點名稱', autocomplete=[]).props('clearable debounce=300').classes('w-56')
+            ui.button('搜尋', icon='search', on_click=lambda: run_search())
+
+        result_label = ui.label().classes('text-base text-grey-7')
+        result_table = ui.table(columns=SEARCH_COLUMNS, rows=[], row_key='OID', pagination=20).classes('w-full')
+        result_table.add_slot('body-cell-archived', r'''
+            <q-td :props="props">
+                <q-icon v-if="props.value" name="inventory_2" color="grey" />
+            </q-td>
+        ''')
+        result_table.add_slot('body-cell-actions', r"""
+            <q-td :props="props">
+                <q-btn flat icon="visibility" color="primary" label="明細" @click="$parent.$emit('show_details', props.row)" />
+            </q-td>
+        """)
+        result_table.on('show_details', lambda e: order_detail_dialog(e.args['OID']))
+
+    #輸入餐點名稱時提示符合的餐點
+    async def suggest_meals():
+        text = (meal_input.value or '').strip()
+        meals = await async_db.search_meals(text) if text else []
+        meal_input.set_autocomplete([meal['Name'] for meal in meals])
+
+    async def run_search():
+        start, end = start_input.value or None, end_input.value or None
+        if start and end and start > end:
+            ui.notify('請選擇正確的日期區間。', color='warning')
+            return
+        start_time, end_time = date_range(start, end)
+        oid = int(oid_input.value) if oid_input.value else None
+        rows = await async_db.search_orders(oid=oid, start_time=start_time, end_time=end_time,
+                                            meal=meal_input.value or None, limit=SEARCH_LIMIT)
+        result_table.rows = rows
+        result_table.update()
+        more = f'(只顯示最新的 {SEARCH_LIMIT} 筆)' if len(rows) >= SEARCH_LIMIT else ''
+        result_label.set_text(f'找到 {len(rows)} 筆訂單 {more}')
+
+    meal_input.on_value_change(suggest_meals)
+    for element in (oid_input, start_input, end_input, meal_input):
+        element.on('keydown.enter', run_search)
+
+    #預設顯示最新的訂單
+    await run_search()
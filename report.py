@@ -0,0 +1,160 @@
+from nicegui import ui
+from datetime import date, datetime, timedelta
+
+from navigate import navigate_to
+from state import STATE, load_session, handle_logout
+import async_db
+import metrics
+import export
+from typing import Dict, Any, List
+
+#銷售報表頁(只讀取銷售統計表，不會掃描訂單資料)
+
+#表格欄位
+DAILY_COLUMNS: List[Dict[str, Any]] = [
+    {'name': 'day', 'label': '日期', 'field': 'Day', 'align': 'left', 'sortable': True},
+    {'name': 'orders', 'label': '訂單數', 'field': 'Orders', 'align': 'right', 'sortable': True},
+    {'name': 'items', 'label': '餐點份數', 'field': 'Items', 'align': 'right', 'sortable': True},
+    {'name': 'revenue', 'label': '營收(NT$)', 'field': 'Revenue', 'align': 'right', 'sortable': True},
+]
+MEAL_COLUMNS: List[Dict[str, Any]] = [
+    {'name': 'meal', 'label': '餐點', 'field': 'MealName', 'align': 'left'},
+    {'name': 'quantity', 'label': '份數', 'field': 'Quantity', 'align': 'right', 'sortable': True},
+    {'name': 'revenue', 'label': '營收(NT$)', 'field': 'Revenue', 'align': 'right', 'sortable': True},
+]
+SERVING_COLUMNS: List[Dict[str, Any]] = [
+    {'name': 'method', 'label': '取餐方式', 'field': 'ServingMethod', 'align': 'left'},
+    {'name': 'orders', 'label': '訂單數', 'field': 'Orders', 'align': 'right'},
+    {'name': 'revenue', 'label': '營收(NT$)', 'field': 'Revenue', 'align': 'right'},
+]
+SLOW_COLUMNS: List[Dict[str, Any]] = [
+    {'name': 'time', 'label': '時間', 'field': 'TimeText', 'align': 'left'},
+    {'name': 'function', 'label': '資料庫函式', 'field': 'function', 'align': 'left'},
+    {'name': 'ms', 'label': '耗時(ms)', 'field': 'MsText', 'align': 'right'},
+]
+
+#把每小時的統計補滿0~23點，給長條圖使用
+def hourly_series(hourly: List[Dict[str, Any]]) -> List[int]:
+    revenue = [0] * 24
+    for row in hourly:
+        revenue[row['Hour']] = row['Revenue']
+    return revenue
+
+@ui.page('/report')
+async def sales_report_page():
+    await load_session()
+    #檢查登入狀態和權限
+    if not STATE['is_login'] or not STATE['is_manager']:
+        navigate_to('/login')
+        return
+
+    ui.add_head_html('<title>銷售報表</title>')
+
+    with ui.header().classes('items-center justify-between'):
+        ui.label(f'銷售報表 ({STATE["account"]})').classes('text-lg')
+        ui.button('回選擇頁', on_click=lambda: navigate_to('/staff'), icon='arrow_back').props('flat color=white')
+        ui.button('登出', on_click=lambda: handle_logout(), icon='logout').props('flat color=white')
+
+    today = date.today()
+
+    with ui.column().classes('p-4 w-full items-start'):
+        #查詢區間
+        with ui.row().classes('items-end gap-4'):
+            start_input = ui.input('開始日期', value=(today - timedelta(days=6)).isoformat()).props('type=date')
+            end_input = ui.input('結束日期', value=today.isoformat()).props('type=date')
+            ui.button('查詢', icon='search', on_click=lambda: load_report())
+            ui.button('今天', on_click=lambda: set_range(0)).props('flat')
+            ui.button('近7天', on_click=lambda: set_range(6)).props('flat')
+            ui.button('近30天', on_click=lambda: set_range(29)).props('flat')
+
+        #匯出查詢區間內的訂單明細(含已封存的訂單)，由瀏覽器直接下載串流
+        with ui.row().classes('items-end gap-4'):
+            formats = ['csv', 'parquet'] if export.parquet_available() else ['csv']
+            format_select = ui.select(formats, value='csv', label='匯出格式').classes('w-32')
+            ui.button('匯出訂單明細', icon='download', on_click=lambda: download_orders()).props('outline')
+
+        #總計
+        with ui.row().classes('gap-8 mt-4'):
+            orders_label = ui.label().classes('text-2xl font-bold')
+            revenue_label = ui.label().classes('text-2xl font-bold text-positive')
+            items_label = ui.label().classes('text-2xl font-bold')
+            average_label = ui.label().classes('text-2xl font-bold')
+
+        ui.label('每小時營收').classes('text-xl font-bold mt-6')
+        hourly_chart = ui.echart({
+            'tooltip': {'trigger': 'axis'},
+            'xAxis': {'type': 'category', 'data': [f'{h:02d}' for h in range(24)]},
+            'yAxis': {'type': 'value'},
+            'series': [{'type': 'bar', 'name': '營收', 'data': [0] * 24}],
+        }).classes('w-full h-64')
+
+        with ui.row().classes('w-full gap-6 mt-6 items-start'):
+            with ui.column().classes('flex-1'):
+                ui.label('每日銷售').classes('text-xl font-bold')
+                daily_table = ui.table(columns=DAILY_COLUMNS, rows=[], row_key='Day',
+                                       pagination=10).classes('w-full')
+            with ui.column().classes('flex-1'):
+                ui.label('餐點排行').classes('text-xl font-bold')
+                meal_table = ui.table(columns=MEAL_COLUMNS, rows=[], row_key='Meal_ID',
+                                      pagination=10).classes('w-full')
+                ui.label('取餐方式').classes('text-xl font-bold mt-4')
+                serving_table = ui.table(columns=SERVING_COLUMNS, rows=[], row_key='ServingMethod').classes('w-full')
+
+        #效能指標設定(完整數據在 /metrics，這裡只顯示最近的慢查詢)
+        ui.label('效能指標').classes('text-xl font-bold mt-6')
+        with ui.row().classes('items-center gap-4'):
+            ui.switch('收集效能指標', value=metrics.is_enabled(),
+                      on_change=lambda e: metrics.set_enabled(e.value))
+            ui.number('慢查詢門檻(ms)', value=metrics.SLOW_QUERY_MS, min=1,
+                      on_change=lambda e: e.value and metrics.set_slow_query_ms(e.value)).classes('w-40')
+            ui.button('重新整理', icon='refresh', on_click=lambda: load_slow_log()).props('flat')
+        slow_table = ui.table(columns=SLOW_COLUMNS, rows=[], row_key='time', pagination=10).classes('w-full')
+
+    #最近的慢查詢
+    def load_slow_log():
+        slow_table.rows = [{**entry,
+                            'TimeText': datetime.fromtimestamp(entry['time']).strftime('%Y-%m-%d %H:%M:%S'),
+                            'MsText': f"{entry['ms']:.1f}"}
+                           for entry in metrics.get_slow_log()]
+        slow_table.update()
+
+    async def load_report():
+        start, end = start_input.value, end_input.value
+        if not start or not end or start > end:
+            ui.notify('請選擇正確的日期區間。', color='warning')
+            return
+        report = await async_db.get_sales_report(start, end)
+        if not report:
+            ui.notify('查詢報表失敗，請檢查資料庫。', color='negative')
+            return
+
+        totals = report['totals']
+        orders_label.set_text(f"訂單數: {totals['Orders']:,}")
+        revenue_label.set_text(f"營收: NT$ {totals['Revenue']:,}")
+        items_label.set_text(f"餐點份數: {totals['Items']:,}")
+        average_label.set_text(f"平均客單價: NT$ {totals['AverageOrder']:,.0f}")
+
+        hourly_chart.options['series'][0]['data'] = hourly_series(report['hourly'])
+        hourly_chart.update()
+
+        daily_table.rows = list(reversed(report['daily']))
+        daily_table.update()
+        meal_table.rows = report['meals']
+        meal_table.update()
+        serving_table.rows = report['serving']
+        serving_table.update()
+
+    def download_orders():
+        start, end = start_input.value, end_input.value
+        if not start or not end or start > end:
+            ui.notify('請選擇正確的日期區間。', color='warning')
+            return
+        ui.download(f'/export/orders?start={start}&end={end}&format={format_select.value}')
+
+    async def set_range(days: int):
+        start_input.set_value((today - timedelta(days=days)).isoformat())
+        end_input.set_value(today.isoformat())
+        await load_report()
+
+    load_slow_log()
+    await load_report()
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+from typing import List, Optional
+
+import database
+import lb
+
+#多worker模式
+#先初始化資料庫，再啟動數個app.py worker程序(各自的連接埠，共用同一個WAL模式的資料庫)，
+#最後由lb.py在對外的連接埠依用戶端IP分配連線；worker結束時自動重新啟動
+#
+#用法:
+#  python serve.py --workers 4 --port 8080
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+RESTART_DELAY = 1.0   #worker結束後等待幾秒再重新啟動
+
+def worker_env(index: int, port: int, secret: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        'WORKER_ID': str(index),
+        'PORT': str(port),
+        'STORAGE_SECRET': secret,   #所有worker必須使用相同的金鑰，登入cookie才能通用
+        'DB_CHANGE_LOG': '1',       #訂單/菜單/登入變更寫入ChangeLog通知其他worker
+    })
+    #封存工作只需要一個worker執行
+    if index > 0:
+        env['ARCHIVE_AFTER_DAYS'] = '0'
+    return env
+
+def start_worker(index: int, port: int, secret: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, 'app.py'], cwd=APP_DIR, env=worker_env(index, port, secret))
+
+#監看worker，結束時重新啟動
+async def supervise(workers: List[subprocess.Popen], ports: List[int], secret: str):
+    while True:
+        await asyncio.sleep(RESTART_DELAY)
+        for i, worker in enumerate(workers):
+            if worker.poll() is not None:
+                print(f"worker {i} 已結束 (結束碼 {worker.returncode})，重新啟動")
+                workers[i] = start_worker(i, ports[i], secret)
+
+async def run(host: str, port: int, ports: List[int], secret: str):
+    workers = [start_worker(i, worker_port, secret) for i, worker_port in enumerate(ports)]
+    try:
+        await asyncio.gather(lb.serve(host, port, [('127.0.0.1', p) for p in ports]),
+                             supervise(workers, ports, secret))
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='以多個worker程序啟動點餐系統')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='worker數量 (預設: CPU核心數)')
+    parser.add_argument('--host', default='0.0.0.0', help='對外的位址 (預設: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8080, help='對外的連接埠 (預設: 8080)')
+    parser.add_argument('--base-port', type=int, default=8100, help='第一個worker的連接埠 (預設: 8100)')
+    args = parser.parse_args(argv)
+
+    #只在這裡升級一次schema，worker啟動時已是最新版本
+    database.initialize_database()
+    secret = database.get_storage_secret()
+    ports = [args.base_port + i for i in range(max(1, args.workers))]
+    try:
+        asyncio.run(run(args.host, args.port, ports, secret))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
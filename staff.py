@@ -1,9 +1,10 @@
 from nicegui import ui
 from navigate import navigate_to
-from state import STATE, handle_logout 
+from state import STATE, load_session, handle_logout 
 
 @ui.page('/staff')
-def staff_selection_page():
+async def staff_selection_page():
+    await load_session()
     #防止直接輸入網址跳過登入。
     if not STATE['is_login']:
         navigate_to('/login')
@@ -31,13 +32,20 @@ def staff_selection_page():
             ui.button('處理訂單', 
                       on_click=lambda: navigate_to('/manage_order'),
                       icon='receipt').props('size=xl color=indigo-7 shadow=5').classes('w-60 h-40 text-xl')
-        ui.button('修改密碼',
-                  on_click=lambda: navigate_to('/update_password'),
-                  icon='lock_reset').props('size=md color=blue-7 shadow=5').classes('w-60 text-lg')
+            ui.button('銷售報表', 
+                      on_click=lambda: check_manager_access('/report'),
+                      icon='bar_chart').props('size=xl color=orange-7 shadow=5').classes('w-60 h-40 text-xl')
+        with ui.row().classes('gap-12'):
+            ui.button('查詢訂單',
+                      on_click=lambda: navigate_to('/order_search'),
+                      icon='manage_search').props('size=md color=teal-7 shadow=5').classes('w-60 text-lg')
+            ui.button('修改密碼',
+                      on_click=lambda: navigate_to('/update_password'),
+                      icon='lock_reset').props('size=md color=blue-7 shadow=5').classes('w-60 text-lg')
 
 #權限檢查
-def check_manager_access():
+def check_manager_access(target: str = '/manager'):
     if STATE['is_manager']:
-        navigate_to('/manager')
+        navigate_to(target)
     else:
-        ui.notify('權限不足！只有管理員可以管理員工。', color='negative', icon='lock')
\ No newline at end of file
+        ui.notify('權限不足！只有管理員可以使用此功能。', color='negative', icon='lock')
\ No newline at end of file
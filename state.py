@@ -1,26 +1,131 @@
-from nicegui import ui, Client
+import time
+
+from nicegui import ui, app
 from navigate import navigate_to
-from database import login
+import async_db
+import change_feed
+import database
 from typing import Optional, Dict, Any
-import sqlite3
 
-#登入狀態(直接使用全域變數，先不理會資安部分)
-STATE: Dict[str, Any] = {
+#登入狀態
+#存放在資料庫的Session表，以瀏覽器的session id(app.storage.browser['id'])為鍵，多個worker程序共用
+#STATE維持原本的用法(STATE['is_login']、STATE['account']、STATE['is_manager'])，讀到的是目前瀏覽器的登入狀態
+_ANONYMOUS: Dict[str, Any] = {
     'is_login': False,
     'is_manager': False,
     'account': None
 }
+
+#session快取 {session id: 登入狀態}，每個頁面開始時以load_session()非同步查詢一次，之後讀取STATE不會查詢資料庫
+#已登入的狀態保留到資料庫中的session過期為止；未登入的結果只保留ANONYMOUS_CACHE_SECONDS秒，避免未登入的瀏覽器每次開頁面都查詢
+#過期的項目每SESSION_PRUNE_INTERVAL秒全部清除一次，快取大小只與目前仍有效的session數有關
+#其他worker登入/登出時由change_feed清除對應的快取
+_sessions: Dict[str, Dict[str, Any]] = {}
+
+ANONYMOUS_CACHE_SECONDS = 5
+SESSION_PRUNE_INTERVAL = 60
+_last_prune = 0.0
+
+#目前瀏覽器的session id(不在頁面或事件處理中時為None)
+def _session_id() -> Optional[str]:
+    try:
+        return app.storage.browser.get('id')
+    except RuntimeError:
+        return None
+
+#快取中還沒過期的狀態，沒有時回傳None
+def _cached_session(session_id: str) -> Optional[Dict[str, Any]]:
+    state = _sessions.get(session_id)
+    if state is not None and state['expires'] < time.time():
+        del _sessions[session_id]
+        state = None
+    return state
+
+#清除快取中所有已過期的項目(新增項目時最多每SESSION_PRUNE_INTERVAL秒執行一次)
+def _prune_sessions(now: float):
+    global _last_prune
+    if now - _last_prune < SESSION_PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    for session_id, state in list(_sessions.items()):
+        if state['expires'] < now:
+            _sessions.pop(session_id, None)
+
+#把查詢結果(Session的資料列，None為未登入)放進快取
+def _store_session(session_id: str, row: Optional[Dict]) -> Dict[str, Any]:
+    now = time.time()
+    _prune_sessions(now)
+    if row is None:
+        state = {**_ANONYMOUS, 'expires': now + ANONYMOUS_CACHE_SECONDS}
+    else:
+        state = _logged_in(row['Account'], row['Class'], row['Expires'])
+    _sessions[session_id] = state
+    return state
+
+#頁面開始時呼叫：快取中沒有目前瀏覽器的登入狀態時查詢一次資料庫(主鍵查詢，不阻塞event loop)
+async def load_session():
+    session_id = _session_id()
+    if session_id and _cached_session(session_id) is None:
+        _store_session(session_id, await async_db.get_session(session_id))
+
+#load_session的同步版本，給在執行緒中執行的FastAPI路由(例如匯出訂單)使用
+def load_session_blocking():
+    session_id = _session_id()
+    if session_id and _cached_session(session_id) is None:
+        _store_session(session_id, database.get_session(session_id))
+
+#已登入的狀態(快取最多保留到session過期為止，expires為資料庫中session過期的時間)
+def _logged_in(account: str, staff_class: str, expires: float) -> Dict[str, Any]:
+    return {
+        'is_login': True,
+        'is_manager': staff_class == 'Manager',
+        'account': account,
+        'expires': expires,
+    }
+
+#只讀取快取，不查詢資料庫；快取中沒有(頁面沒有呼叫load_session，或狀態已過期、被清除)時視為未登入
+class SessionState:
+    def __getitem__(self, key: str) -> Any:
+        session_id = _session_id()
+        state = _cached_session(session_id) if session_id else None
+        return (state or _ANONYMOUS)[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+STATE = SessionState()
+
+#清除登入狀態快取(其他worker登入/登出或刪除帳號時)
+def forget_session(payload: Optional[Dict[str, Any]]):
+    if not payload:
+        return
+    if 'session' in payload:
+        _sessions.pop(payload['session'], None)
+    if 'account' in payload:
+        for session_id, state in list(_sessions.items()):
+            if state['account'] == payload['account']:
+                _sessions.pop(session_id, None)
+
+change_feed.register('session', forget_session)
+
 #處理登入
 async def handle_login(account: str, password: str):
-    global STATE
-    user_data = login(account, password)
-    if isinstance(user_data, tuple):
+    user_data = await async_db.login(account, password)
+    session_id = _session_id()
+    if isinstance(user_data, tuple) and session_id:
         #驗證成功
         #user_data(SID, account, class)
-        STATE['is_login'] = True
-        STATE['account'] = user_data[1]
-        STATE['is_manager'] = (user_data[2] == 'Manager')
-        
+        #session的Created記錄到秒，先取整數秒計算過期時間，快取不會比資料庫中的session晚過期
+        expires = int(time.time()) + database.SESSION_TTL_HOURS * 3600
+        if not await async_db.create_session(session_id, user_data[0], user_data[1], user_data[2]):
+            ui.notify('登入失敗，請稍後再試。', color='negative')
+            return
+        _prune_sessions(time.time())
+        _sessions[session_id] = _logged_in(user_data[1], user_data[2], expires)
+
         ui.notify(f"登入成功! 歡迎, {STATE['account']}", color='positive')
 
         #根據Class做頁面跳轉
@@ -33,10 +138,10 @@ async def handle_login(account: str, password: str):
 
 #處理登出
 async def handle_logout():
-    global STATE
-    STATE['is_login'] = False
-    STATE['is_manager'] = False
-    STATE['account'] = None
+    session_id = _session_id()
+    if session_id:
+        _sessions.pop(session_id, None)
+        await async_db.delete_session(session_id)
 
     ui.notify('已登出。', color='info')
-    navigate_to('/login')
\ No newline at end of file
+    navigate_to('/login')
@@ -0,0 +1,148 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from nicegui import ui, background_tasks
+
+#ui.table的伺服器端分頁(Quasar server-side pagination + database.py的keyset分頁查詢)
+#Quasar以頁碼送出request事件，這裡記住每一頁開頭的游標：上一頁/下一頁直接用游標查詢，
+#跳到還沒看過的頁面時才從已知的最後一頁往後逐頁前進；排序、每頁筆數或篩選條件改變時重新開始
+#fetch為async_db的分頁函式(get_orders_page/get_meals_page/get_staff_page)
+#on_load在每次載入頁面後以該頁的資料列呼叫(例如預先載入該頁訂單的明細)
+#表格一次只有一頁(最多rowsPerPage列)，而NiceGUI 3修改rows或pagination時本來就會重送整個表格元素，
+#所以不再依row_key只傳送新增/修改/刪除的列(原本的table_sync.py已移除)，事件更新時直接更新整頁
+
+#只顯示「第幾筆到第幾筆」，keyset分頁不計算總筆數
+_PAGINATION_LABEL = ':pagination-label="(first, end) => first + \'-\' + end"'
+
+class KeysetPager:
+    def __init__(self, table: ui.table, key: str, fetch: Callable[..., Awaitable[Dict[str, Any]]],
+                 on_load: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+                 **filters: Any):
+        self.table = table
+        self.key = key
+        self.fetch = fetch
+        self.on_load = on_load
+        self.filters = filters
+        #_cursors[i]為第i+1頁的起始游標(第1頁為None)
+        self._cursors: List[Optional[List[Any]]] = [None]
+        self._order: Optional[tuple] = None   #(排序欄位, 是否遞減, 每頁筆數)
+        self._has_more = False
+        self._request_id = 0
+        table.props(_PAGINATION_LABEL)
+        table.on('request', lambda e: self.load(e.args['pagination']))
+
+    #Quasar的sortBy是欄位的name，轉成資料欄位(field)
+    def _sort_field(self, name: Optional[str]) -> str:
+        for column in self.table.columns:
+            if column['name'] == name:
+                return column['field']
+        return self.key
+
+    #目前的排序方式(sort_field, descending)
+    def _current_order(self) -> tuple:
+        pagination = self.table.pagination
+        return self._sort_field(pagination.get('sortBy')), bool(pagination.get('descending'))
+
+    #載入指定的頁面(pagination為Quasar的分頁物件，None為重新載入目前頁面)
+    async def load(self, pagination: Optional[Dict[str, Any]] = None):
+        pagination = dict(pagination or self.table.pagination)
+        sort_field = self._sort_field(pagination.get('sortBy'))
+        descending = bool(pagination.get('descending'))
+        per_page = pagination.get('rowsPerPage') or 20
+        page = max(1, int(pagination.get('page') or 1))
+
+        if (sort_field, descending, per_page) != self._order:
+            self._order = (sort_field, descending, per_page)
+            self._cursors = [None]
+        self._request_id += 1
+        request_id = self._request_id
+
+        async def fetch_after(cursor: Optional[List[Any]]) -> Dict[str, Any]:
+            return await self.fetch(sort_by=sort_field, descending=descending, after=cursor,
+                                    limit=per_page, **self.filters)
+
+        #還不知道起始游標的頁面，從已知的最後一頁往後走
+        while len(self._cursors) < page:
+            result = await fetch_after(self._cursors[-1])
+            if not result['next']:
+                page = len(self._cursors)
+                break
+            self._cursors.append(result['next'])
+
+        result = await fetch_after(self._cursors[page - 1])
+        #資料被刪除後目前頁面可能已經空了，退回前一頁
+        while not result['rows'] and page > 1:
+            page -= 1
+            result = await fetch_after(self._cursors[page - 1])
+        if request_id != self._request_id:
+            return   #已經有更新的請求
+        del self._cursors[page:]
+        if result['next']:
+            self._cursors.append(result['next'])
+        self._has_more = result['next'] is not None
+
+        pagination.update(page=page, sortBy=pagination.get('sortBy'), descending=descending,
+                          rowsPerPage=per_page)
+        self.table.rows = result['rows']
+        self.table.pagination = pagination
+        self._update_rows_number()
+        self.table.update()
+        if self.on_load is not None:
+            await self.on_load(result['rows'])
+
+    #重新載入目前頁面
+    async def reload(self):
+        await self.load()
+
+    #改變篩選條件並回到第一頁
+    async def set_filters(self, **filters: Any):
+        self.filters.update(filters)
+        self._cursors = [None]
+        await self.load({**self.table.pagination, 'page': 1})
+
+    #Quasar依rowsNumber決定是否啟用「下一頁」，還有下一頁時多算一筆
+    def _update_rows_number(self):
+        pagination = self.table.pagination
+        per_page = pagination.get('rowsPerPage') or 20
+        shown = (pagination.get('page', 1) - 1) * per_page + len(self.table.rows)
+        pagination['rowsNumber'] = shown + (1 if self._has_more else 0)
+
+    #從目前頁面移除資料列(例如訂單已完成)，不重新查詢；頁面被清空時才重新載入
+    #每次只送出一頁的資料，因此直接更新整個表格
+    def remove_rows(self, keys: List[Any]):
+        removed = set(keys)
+        rows = self.table.rows
+        if not any(row[self.key] in removed for row in rows):
+            return
+        rows[:] = [row for row in rows if row[self.key] not in removed]
+        if not rows and (self._has_more or self.table.pagination.get('page', 1) > 1):
+            background_tasks.create(self.reload())
+            return
+        self._update_rows_number()
+        self.table.update()
+
+    #新增或修改的資料列(例如新訂單)：排在目前頁面最後一列之後時直接加到頁尾或標記還有下一頁，
+    #會插進目前頁面中間時才重新查詢
+    def offer_row(self, row: Dict[str, Any]):
+        sort_field, descending = self._current_order()
+        rows = self.table.rows
+        for i, shown in enumerate(rows):
+            if shown[self.key] == row[self.key]:
+                rows[i] = dict(row)
+                self.table.update()
+                return
+
+        def position(r: Dict[str, Any]) -> tuple:
+            return (r[sort_field], r[self.key])
+
+        if rows and (position(row) < position(rows[-1])) != descending:
+            background_tasks.create(self.reload())
+            return
+        per_page = self.table.pagination.get('rowsPerPage') or 20
+        if not self._has_more and len(rows) < per_page:
+            rows.append(dict(row))
+        elif not self._has_more:
+            self._has_more = True
+            #下一頁從目前頁面最後一列之後開始
+            self._cursors.append([rows[-1][sort_field], rows[-1][self.key]])
+        self._update_rows_number()
+        self.table.update()
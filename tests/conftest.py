@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+#測試直接匯入專案根目錄的模組(database、async_db...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+#每個測試使用自己的暫存資料庫(經過完整的版本遷移)，結束後換回原本的資料庫
+@pytest.fixture
+def db(tmp_path):
+    original = database.DB
+    database.configure_pool(str(tmp_path / 'test.db'))
+    with database.db_connection() as conn:
+        database.migrate(conn)
+    yield database
+    database.configure_pool(original)
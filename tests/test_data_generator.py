@@ -0,0 +1,18 @@
+from datetime import date, timedelta
+
+import data_generator
+
+
+#全部訂單都已封存後再產生資料，新的OID不能與封存的訂單重複
+def test_generated_oids_skip_archived_orders(db):
+    yesterday = date.today() - timedelta(days=1)
+    data_generator.generate(db.DB, orders=500, days=10, seed=1, meals=10, pending=0, end_day=yesterday)
+    db.configure_pool()
+    assert db.archive_completed_orders(0) == 500
+    data_generator.generate(db.DB, orders=500, days=10, seed=2, meals=10, pending=0, end_day=yesterday)
+    db.configure_pool()
+
+    with db.db_connection() as conn:
+        archived_max = conn.execute("SELECT MAX(OID) FROM OrderArchive").fetchone()[0]
+        assert conn.execute('SELECT MIN(OID) FROM "Order"').fetchone()[0] == archived_max + 1
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT OID) FROM OrderHistory").fetchone() == (1000, 1000)
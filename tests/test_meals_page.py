@@ -0,0 +1,12 @@
+#分頁查詢與搜尋回傳的餐點和get_all_meals一樣，IsAvailable為bool(餐點對話框的ui.select([True, False])需要)
+def test_meal_rows_use_bool_availability(db):
+    db.insert_meal('番茄義大利麵', 180, None, True)
+    db.insert_meal('停售濃湯', 60, None, False)
+    expected = {meal['Name']: meal['IsAvailable'] for meal in db.get_all_meals()}
+    assert expected == {'番茄義大利麵': True, '停售濃湯': False}
+
+    page = db.get_meals_page(limit=1)
+    rows = page['rows'] + db.get_meals_page(after=page['next'], limit=1)['rows']
+    assert {meal['Name']: meal['IsAvailable'] for meal in rows} == expected
+    assert all(type(meal['IsAvailable']) is bool for meal in rows)
+    assert db.search_meals('義大利')[0]['IsAvailable'] is True
@@ -0,0 +1,32 @@
+import database
+
+#本來就要回傳整張表的查詢，允許SCAN
+FULL_TABLE_QUERIES = {'get_all_staff', 'get_all_meals'}
+#訂單相關的大表(包含查詢中使用的別名)
+ORDER_TABLES = {'Order', 'OrderDetail', 'O', 'OD'}
+
+
+#計畫中整張掃描的資料表(不包含讀取子查詢結果的 SCAN (subquery-N))
+def _scanned_tables(plan):
+    return [line.split()[1] for line in plan if line.startswith('SCAN ') and not line.startswith('SCAN (')]
+
+
+def test_every_query_plan_is_checked(db):
+    plans = db.explain_query_plans()
+    assert set(plans) == set(database.QUERY_PLAN_CHECKS)
+
+
+def test_queries_search_with_an_index(db):
+    for name, plan in db.explain_query_plans().items():
+        if name in FULL_TABLE_QUERIES:
+            continue
+        searches = [line for line in plan if line.startswith('SEARCH ')]
+        assert searches, f'{name} 沒有使用索引: {plan}'
+        assert all(' USING ' in line for line in searches), f'{name} 沒有使用索引: {plan}'
+        assert not _scanned_tables(plan), f'{name} 有全表掃描: {plan}'
+
+
+def test_no_full_scan_of_order_tables(db):
+    for name, plan in db.explain_query_plans().items():
+        scanned = set(_scanned_tables(plan)) & ORDER_TABLES
+        assert not scanned, f'{name} 掃描了整張 {scanned}: {plan}'
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+import data_generator
+
+#暴力查詢：兩張訂單表直接依時間範圍與餐點比對，依時間從新到舊取limit筆
+BRUTE_FORCE = """
+SELECT OID, Time FROM (
+    SELECT OID, Time FROM "Order" O
+    WHERE Time >= ? AND Time < ? AND OID IN (SELECT Order_ID FROM OrderDetail WHERE Meal_ID IN ({placeholders}))
+    UNION ALL
+    SELECT OID, Time FROM OrderArchive O
+    WHERE Time >= ? AND Time < ? AND OID IN (SELECT Order_ID FROM OrderDetailArchive WHERE Meal_ID IN ({placeholders}))
+)
+ORDER BY Time DESC, OID DESC LIMIT ?
+"""
+
+
+#產生兩次資料：第二次的OID都比第一次大，但訂單時間分散在同一段期間(OID不依時間遞增)，再封存較舊的訂單
+@pytest.fixture
+def history(db):
+    data_generator.generate(db.DB, orders=3000, days=60, seed=1, meals=30, pending=0)
+    data_generator.generate(db.DB, orders=3000, days=60, seed=2, meals=30, pending=0)
+    db.configure_pool()
+    assert db.archive_completed_orders(30)
+    return db
+
+
+def _brute_force(db, meal, start_time, end_time, limit):
+    with db.db_connection() as conn:
+        meal_ids = [row[0] for row in conn.execute("SELECT MID FROM Meal WHERE Name LIKE ?", (f'%{meal}%',))]
+        placeholders = ','.join('?' * len(meal_ids))
+        rows = conn.execute(BRUTE_FORCE.format(placeholders=placeholders),
+                            (start_time, end_time, *meal_ids, start_time, end_time, *meal_ids, limit)).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def _random_searches(db, count, seed):
+    rng = random.Random(seed)
+    with db.db_connection() as conn:
+        names = [row[0] for row in conn.execute("SELECT Name FROM Meal")]
+        days = [row[0] for row in conn.execute(
+            "SELECT DISTINCT substr(Time, 1, 10) FROM OrderHistory ORDER BY 1")]
+    for _ in range(count):
+        start, end = sorted(rng.sample(days, 2))
+        yield rng.choice(names), f'{start} 00:00:00', f'{end} 00:00:00', rng.choice((5, 20, 50))
+
+
+@pytest.mark.parametrize('scan_limit', [1, 5000, 10 ** 9], ids=['by-time', 'default', 'by-meal-lines'])
+def test_meal_and_date_search_matches_brute_force(history, monkeypatch, scan_limit):
+    #涵蓋兩種查詢方式：從時間索引走訪，或由餐點索引取出全部明細
+    monkeypatch.setattr(history, 'MEAL_LINES_SCAN_LIMIT', scan_limit)
+    for meal, start_time, end_time, limit in _random_searches(history, 100, seed=scan_limit):
+        expected = _brute_force(history, meal, start_time, end_time, limit)
+        found = history.search_orders(start_time=start_time, end_time=end_time, meal=meal, limit=limit)
+        assert [(order['OID'], order['Time']) for order in found] == expected, (meal, start_time, end_time)
+
+
+def test_oid_search_checks_time_and_meal(history):
+    with history.db_connection() as conn:
+        oid, time = conn.execute("SELECT OID, Time FROM OrderArchive ORDER BY OID DESC LIMIT 1").fetchone()
+        meal = conn.execute("""
+        SELECT M.Name FROM OrderDetailArchive OD JOIN Meal M ON M.MID = OD.Meal_ID
+        WHERE OD.Order_ID = ? LIMIT 1
+        """, (oid,)).fetchone()[0]
+    assert [order['OID'] for order in history.search_orders(oid=oid, meal=meal)] == [oid]
+    assert history.search_orders(oid=oid, start_time=time[:10] + ' 23:59:59') == []
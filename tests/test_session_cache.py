@@ -0,0 +1,30 @@
+import time
+
+import state
+
+
+#快取的過期時間取自資料庫中的session，而不是放進快取的時間
+def test_cached_login_expires_with_session_row(db, monkeypatch):
+    monkeypatch.setattr(state, '_sessions', {})
+    db.create_session('browser', 1, 'demo', 'Manager')
+    row = db.get_session('browser')
+    with db.db_connection() as conn:
+        conn.execute("UPDATE Session SET Created = datetime('now', 'localtime', '-11 hours')")
+        conn.commit()
+    older = db.get_session('browser')
+    assert older['Expires'] < row['Expires'] - 10 * 3600
+    assert state._store_session('browser', older)['expires'] == older['Expires']
+
+
+#過期的項目(包含未登入的結果)會定期全部清除，不會一直累積
+def test_expired_entries_are_pruned(monkeypatch):
+    monkeypatch.setattr(state, '_sessions', {})
+    monkeypatch.setattr(state, '_last_prune', 0.0)
+    now = time.time()
+    for i in range(100):
+        state._store_session(f'anonymous-{i}', None)
+    assert len(state._sessions) == 100
+
+    monkeypatch.setattr(state.time, 'time', lambda: now + state.SESSION_PRUNE_INTERVAL + 1)
+    state._store_session('late', None)
+    assert list(state._sessions) == ['late']
@@ -0,0 +1,13 @@
+#未設定STORAGE_SECRET時，產生的金鑰存在資料庫旁，重新啟動後沿用同一個
+def test_generated_secret_is_persisted(db, monkeypatch, tmp_path):
+    monkeypatch.delenv('STORAGE_SECRET', raising=False)
+    secret = db.get_storage_secret()
+    assert len(secret) == 64
+    assert (tmp_path / db.STORAGE_SECRET_FILE).read_text(encoding='utf-8') == secret
+    assert db.get_storage_secret() == secret
+
+
+def test_environment_secret_wins(db, monkeypatch, tmp_path):
+    monkeypatch.setenv('STORAGE_SECRET', 'from-env')
+    assert db.get_storage_secret() == 'from-env'
+    assert not (tmp_path / db.STORAGE_SECRET_FILE).exists()
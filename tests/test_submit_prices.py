@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def menu(db):
+    db.insert_meal('牛肉麵', 150.0, 'noodles.jpg', True, '主餐')
+    db.insert_meal('冰紅茶', 45.0, 'iced_tea.png', True, '飲料')
+    return {meal['Name']: meal['MID'] for meal in db.get_all_meals()}
+
+
+def _item(mid, name, price, quantity=1):
+    return {'mid': mid, 'name': name, 'quantity': quantity, 'price': price, 'total': price * quantity}
+
+
+def _order_count(db):
+    with db.db_connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM "Order"').fetchone()[0]
+
+
+def test_order_with_current_prices_is_written(menu, db):
+    oid = db.submit_full_order([_item(menu['牛肉麵'], '牛肉麵', 150, 2)], 'DineIn')
+    assert isinstance(oid, int)
+    assert db.get_order_details(oid)[0]['PriceAtOrder'] == 150
+
+
+#送出後價格才變動：不寫入訂單，回傳與reprice_cart相同格式的逐項差異
+def test_changed_price_returns_diff_instead_of_repricing(menu, db):
+    with db.db_connection() as conn:
+        conn.execute('UPDATE Meal SET Price = 160 WHERE MID = ?', (menu['牛肉麵'],))
+        conn.execute('UPDATE Meal SET IsAvailable = 0 WHERE MID = ?', (menu['冰紅茶'],))
+        conn.commit()
+    db.invalidate_menu_cache()
+
+    items = [_item(menu['牛肉麵'], '牛肉麵', 150, 2), _item(menu['冰紅茶'], '冰紅茶', 45)]
+    result = db.submit_full_order(items, 'DineIn')
+
+    assert result == db.reprice_cart(items)
+    assert result['changes'] == [{'mid': menu['牛肉麵'], 'name': '牛肉麵', 'old_price': 150, 'new_price': 160}]
+    assert result['removed'] == [{'mid': menu['冰紅茶'], 'name': '冰紅茶'}]
+    assert result['total'] == 320
+    assert _order_count(db) == 0
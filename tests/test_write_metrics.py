@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def collected(db, monkeypatch):
+    monkeypatch.setattr(metrics, 'ENABLED', True)
+    metrics.reset()
+    yield db
+    metrics.reset()
+
+
+def _sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+#經過寫入佇列的寫入只記錄一次，名稱是呼叫端使用的函式，時間包含等待commit的時間
+def test_queued_writes_are_measured_until_resolved(collected, monkeypatch):
+    db = collected
+    assert db.insert_meal('牛肉麵', 150.0, 'noodles.jpg', True, '主餐')
+    mid = db.get_all_meals()[0]['MID']
+    operation = db._order_operation
+
+    def slow_operation(conn, *args):
+        time.sleep(0.05)
+        return operation(conn, *args)
+
+    monkeypatch.setattr(db, '_order_operation', slow_operation)
+    metrics.set_slow_query_ms(30)
+    try:
+        oid = db.submit_full_order([{'mid': mid, 'name': '牛肉麵', 'quantity': 2, 'price': 150}], 'DineIn')
+    finally:
+        metrics.set_slow_query_ms(100)
+    assert oid
+    assert db.update_order_status(oid, 'Completed')
+
+    text = metrics.render_prometheus()
+    assert _sample(text, 'db_calls_total{function="submit_full_order"}') == 1
+    assert _sample(text, 'db_call_duration_seconds_sum{function="submit_full_order"}') >= 0.05
+    assert _sample(text, 'db_calls_total{function="update_order_status"}') == 1
+    assert 'queue_order' not in text
+    assert [entry['function'] for entry in metrics.get_slow_log()] == ['submit_full_order']
+    if db.GROUP_COMMIT:
+        assert _sample(text, 'db_writer_max_commit_seconds') >= 0.05
+        assert _sample(text, 'db_writer_avg_commit_seconds') > 0
+
+
+#寫入在資料庫層失敗時記錄為該函式的錯誤
+def test_failed_queued_write_counts_as_error(collected, monkeypatch):
+    db = collected
+
+    def failing_operation(conn, *args):
+        raise db.sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(db, '_status_operation', failing_operation)
+    assert db.update_order_status(1, 'Completed') is False
+
+    text = metrics.render_prometheus()
+    assert _sample(text, 'db_errors_total{function="update_order_status"}') == 1
+    assert _sample(text, 'db_calls_total{function="update_order_status"}') == 1
@@ -1,11 +1,12 @@
 from nicegui import ui
 
 from navigate import navigate_to
-from state import STATE, handle_logout # 導入狀態和登出
-from database import update_password
+from state import STATE, load_session, handle_logout # 導入狀態和登出
+import async_db
 
 @ui.page('/update_password')
-def update_password_page():
+async def update_password_page():
+    await load_session()
     #檢查登入狀態
     if not STATE['is_login']:
         navigate_to('/login')
@@ -28,7 +29,7 @@ def update_password_page():
         new_password_ref = ui.input('新密碼', password=True).props('type=password toggle-password').classes('w-full')
         confirm_password_ref = ui.input('確認新密碼', password=True).props('type=password toggle-password').classes('w-full')
         
-        def save_new_password():
+        async def save_new_password():
             new_password = new_password_ref.value
             confirm_password = confirm_password_ref.value
             
@@ -40,7 +41,7 @@ def update_password_page():
                 ui.notify('兩次密碼輸入不一致。', color='negative')
                 return
             
-            is_update = update_password(current_account, new_password)        
+            is_update = await async_db.update_password(current_account, new_password)        
             if(is_update):
                 ui.notify(f'成功修改密碼。', color='positive')
             else: